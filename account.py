@@ -0,0 +1,109 @@
+import json
+import time
+from dataclasses import (dataclass, field)
+
+# Functionality surrounding Schwab accounts
+# Status:  Beta
+
+
+ACCOUNTS_FILE = "accounts.json"
+ALL_ACCOUNTS = "all"
+
+
+@dataclass
+class Position:
+    symbol: str
+    quantity: int           # positive if long, negative if short
+    average_price: float
+
+    @classmethod
+    def from_json(cls, position: dict) -> "Position":
+        return cls(position["instrument"]["symbol"],
+                   int(position["longQuantity"]) - int(position["shortQuantity"]),
+                   float(position["averageLongPrice"]) if "averageLongPrice" in position else float(
+                       position["averageShortPrice"]))
+
+
+@dataclass
+class AccountSnapshot:
+    """ Balances and positions of an account, as returned by one GET /accounts?fields=positions """
+    account_number: str
+    balances: dict                                                  # e.g. {"equity": 3471.31, ...}
+    positions: dict[str, Position] = field(default_factory=dict)    # symbol -> Position
+    fetched_at: float = field(default_factory=time.monotonic)
+    accounts: list["AccountSnapshot"] = field(default_factory=list)  # the accounts a combined snapshot was made from
+
+    @classmethod
+    def from_json(cls, account: dict) -> "AccountSnapshot":
+        securities_account: dict = account["securitiesAccount"]
+        positions: dict[str, Position] = {}
+        for position in securities_account.get("positions", []):
+            p = Position.from_json(position)
+            positions[p.symbol] = p
+        return cls(securities_account.get("accountNumber", ""), securities_account.get("currentBalances", {}),
+                   positions)
+
+    @property
+    def equity(self) -> float:
+        return self.balances["equity"]
+
+    def age(self) -> float:
+        """ Seconds since the snapshot was fetched """
+        return time.monotonic() - self.fetched_at
+
+
+def combine_snapshots(snapshots: list[AccountSnapshot]) -> AccountSnapshot:
+    """ Aggregate several accounts into one:  balances are summed, positions in the same symbol are merged """
+    balances: dict = {}
+    positions: dict[str, Position] = {}
+    for snapshot in snapshots:
+        for name, value in snapshot.balances.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                balances[name] = balances.get(name, 0) + value
+        for symbol, p in snapshot.positions.items():
+            combined: Position | None = positions.get(symbol)
+            if not combined:
+                positions[symbol] = Position(symbol, p.quantity, p.average_price)
+                continue
+            # Average price weighted by number of shares held in each account
+            shares: int = abs(combined.quantity) + abs(p.quantity)
+            if shares:
+                combined.average_price = (abs(combined.quantity) * combined.average_price +
+                                          abs(p.quantity) * p.average_price) / shares
+            combined.quantity += p.quantity
+    fetched_at: float = min((snapshot.fetched_at for snapshot in snapshots), default=time.monotonic())
+    return AccountSnapshot(ALL_ACCOUNTS, balances, positions, fetched_at, snapshots)
+
+
+class AccountRegistry:
+    """
+    Map of account number -> account hash (the hashValue the API uses in place of the account number), saved in
+    accounts.json so the lookup is done once rather than on every start.
+    """
+    def __init__(self, filename: str = ACCOUNTS_FILE):
+        self.filename: str = filename
+        self.accounts: dict[str, str] = {}     # account number -> hash, in the order the server lists them
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.filename, 'r') as f:
+                self.accounts = json.load(f).get("accounts", {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.accounts = {}
+
+    def update(self, account_numbers: list[dict]):
+        """ Replace the map from the response of GET /accounts/accountNumbers """
+        self.accounts = {account["accountNumber"]: account["hashValue"] for account in account_numbers}
+        with open(self.filename, 'w') as f:
+            json.dump({"accounts": self.accounts}, f, indent=4)
+
+    def primary_account_number(self) -> str | None:
+        return next(iter(self.accounts), None)
+
+    def find(self, account: str) -> str | None:
+        """ Return the account number matching `account`: a full account number, or its last digits """
+        if account in self.accounts:
+            return account
+        matches: list[str] = [number for number in self.accounts if number.endswith(account)]
+        return matches[0] if len(matches) == 1 else None
@@ -0,0 +1,261 @@
+import json
+import sys
+from dataclasses import (dataclass)
+from datetime import (datetime)
+
+import numpy as np
+
+from strategies import (parse_target_change, EXTREME_EXPIRATION_SECONDS, NO_EXTREME, NO_LIMIT, STOP_DELAY_SECONDS)
+from tick_recorder import (TickLog, TICK_FILE_EXTENSION)
+
+
+# Vectorized backtester for the buylow/sellhigh and breakout/oscillate strategies.  Applies the same rules as the live
+# loops in commands.py (hold extreme validation, target change, extreme expiration, stop placed after the fill) to
+# arrays of recorded prices, treating every tick as one pass of the live loop.
+#
+# The rules are evaluated a chunk of ticks at a time with NumPy running min/max, so millions of ticks take well under
+# a second; only the state (hold extreme, extreme and its time) is carried from one chunk to the next.
+# Status:  Beta
+
+
+CHUNK_SIZE = 1 << 16        # ticks evaluated per vectorized step; doubles while no event is found
+_NO_TIME = np.nan           # no time_extreme, i.e. the extreme can't expire
+_MAX_EXTREME = sys.float_info.max
+
+
+@dataclass
+class TickArrays:
+    """ Prices of one symbol in time order """
+    times: np.ndarray       # epoch seconds, float64
+    bid: np.ndarray
+    ask: np.ndarray
+    last: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+
+@dataclass
+class BacktestResult:
+    start_index: int
+    trigger_index: int | None       # tick at which the order was placed, None if the strategy never triggered
+    instruction: str | None         # 'b' or 's'
+    fill_price: float | None
+    stop_price: float | None
+    exit_index: int | None          # tick at which the stop filled, None if the position was held to the end
+    exit_price: float | None        # stop fill, or the last price the open position is marked at
+    pnl: float                      # profit (loss if negative) of numshares shares
+
+    def format(self, ticks: TickArrays) -> str:
+        if self.trigger_index is None:
+            return f"{_format_time(ticks.times[self.start_index])}: not triggered"
+        line: str = (f"{_format_time(ticks.times[self.trigger_index])}: {self.instruction} @ {self.fill_price:.2f}")
+        if self.stop_price is not None:
+            line += f"; stop {self.stop_price:.2f}"
+        if self.exit_index is not None:
+            line += f"; stopped out {_format_time(ticks.times[self.exit_index])} @ {self.exit_price:.2f}"
+        else:
+            line += f"; marked @ {self.exit_price:.2f}"
+        return f"{line}; P&L {self.pnl:.2f}"
+
+
+def load_tick_file(filename: str, symbol: str) -> TickArrays:
+    """ Load one symbol's ticks from a .ticks file (see tick_recorder.py) or a JSONL tick file (see quote_sources.py) """
+    if filename.endswith(TICK_FILE_EXTENSION):
+        records: np.ndarray = TickLog(filename).symbol_ticks(symbol)
+        return TickArrays(records["time"].copy(), records["bid"].copy(), records["ask"].copy(), records["last"].copy())
+    rows: list[tuple] = []
+    with open(filename, 'r') as f:
+        for line in f:
+            if line.strip():
+                tick: dict = json.loads(line)
+                if tick["symbol"].upper() == symbol:
+                    rows.append((tick["time"], tick["bid"], tick["ask"], tick["last"]))
+    data = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    data = data[np.argsort(data[:, 0], kind="stable")]
+    return TickArrays(data[:, 0].copy(), data[:, 1].copy(), data[:, 2].copy(), data[:, 3].copy())
+
+
+def backtest_buylow_sellhigh(ticks: TickArrays, islow: bool, numshares: int, change_or_percent_change: str,
+                             known_extreme: float = NO_EXTREME, limit: float = NO_LIMIT, start: int = 0,
+                             expiration_seconds: float = EXTREME_EXPIRATION_SECONDS,
+                             stop_offset: float | None = None) -> BacktestResult:
+    """
+    One run of buylow (islow) or sellhigh starting at tick `start`; arguments as for the buylow command.
+    With limit 0, the stop is placed stop_offset from the fill's bid; by default (as live), the target change.
+    """
+    n: int = len(ticks)
+    if start >= n:
+        return BacktestResult(start, None, None, None, None, None, None, 0.0)
+    target_change: float = parse_target_change(change_or_percent_change, float(ticks.last[start]))
+    instruction: str = 'b' if islow else 's'
+
+    if limit > 0:
+        # The live strategy only checks the limit on its first quote
+        is_limit_hit: bool = ticks.last[start] > limit if islow else ticks.last[start] < limit
+        if not is_limit_hit:
+            return BacktestResult(start, None, None, None, None, None, None, 0.0)
+        return _fill(ticks, start, start, instruction, numshares, None)
+
+    prices: np.ndarray = ticks.ask if islow else ticks.bid
+    hold_extreme: float = known_extreme if known_extreme != NO_EXTREME else np.nan
+    extreme: float = known_extreme if known_extreme != NO_EXTREME else _MAX_EXTREME if islow else 0.0
+    time_extreme: float = ticks.times[start] if known_extreme != NO_EXTREME else _NO_TIME
+    i: int = start
+    chunk_size: int = CHUNK_SIZE
+    while i < n:
+        end: int = min(n, i + chunk_size)
+        chunk_rules = _buylow_chunk if islow else _sellhigh_chunk
+        event, hold_extreme, extreme, time_extreme = chunk_rules(prices[i:end], ticks.times[i:end], hold_extreme,
+                                                                 extreme, time_extreme, target_change,
+                                                                 expiration_seconds)
+        if event is None:
+            i = end
+            chunk_size *= 2
+        elif event[1]:  # target hit
+            trigger: int = i + event[0]
+            stop: float | None = None
+            if limit == 0:
+                offset: float = target_change if stop_offset is None else stop_offset
+                stop = round(ticks.bid[trigger] - offset if islow else ticks.bid[trigger] + offset, 2)
+            return _fill(ticks, start, trigger, instruction, numshares, stop)
+        else:  # extreme expired; start over from the next tick as if no extreme was known
+            i += event[0] + 1
+            hold_extreme, extreme, time_extreme = np.nan, _MAX_EXTREME if islow else 0.0, _NO_TIME
+            chunk_size = CHUNK_SIZE
+    return BacktestResult(start, None, None, None, None, None, None, 0.0)
+
+
+def backtest_enter_position(ticks: TickArrays, numshares: int, low_target: float, high_target: float, breakout: bool,
+                            start: int = 0) -> BacktestResult:
+    """ One run of breakout (or oscillate, if not breakout) starting at tick `start` """
+    trigger: int | None = _find_first(lambda i, end: (ticks.last[i:end] < low_target) | (ticks.last[i:end] > high_target),
+                                      start, len(ticks))
+    if trigger is None:
+        return BacktestResult(start, None, None, None, None, None, None, 0.0)
+    above: bool = ticks.last[trigger] > high_target
+    instruction: str = ('b' if above else 's') if breakout else ('s' if above else 'b')
+    return _fill(ticks, start, trigger, instruction, numshares, None)
+
+
+def backtest_runs(ticks: TickArrays, run, **kwargs) -> list[BacktestResult]:
+    """
+    Run a strategy (backtest_buylow_sellhigh or backtest_enter_position, with its arguments) repeatedly over the
+    ticks:  each time a run is stopped out, the next run starts on the following tick.  known_extreme only applies
+    to the first run.
+    """
+    results: list[BacktestResult] = []
+    start: int = 0
+    while start < len(ticks):
+        result: BacktestResult = run(ticks, start=start, **kwargs)
+        results.append(result)
+        if result.exit_index is None:
+            break  # never triggered, or held to the end
+        start = result.exit_index + 1
+        kwargs.pop("known_extreme", None)
+    return results
+
+
+#####
+
+
+def _buylow_chunk(ask: np.ndarray, times: np.ndarray, hold_extreme: float, extreme: float, time_extreme: float,
+                  target_change: float, expiration_seconds: float):
+    """
+    Apply the buylow rules to a chunk of ticks.  Returns (event, hold_extreme, extreme, time_extreme):  event is
+    None, or (index, True) for the first tick at which the target is hit, or (index, False) for the first tick at
+    which the extreme expires; the state is as of the end of the chunk (only meaningful if there was no event).
+
+    The live loop keeps hold_extreme at the lowest ask seen.  A tick whose ask is at or above the previous
+    hold_extreme validates it:  extreme becomes that hold_extreme, and time_extreme the tick's time.
+    """
+    # held[i] = hold_extreme before tick i; no hold_extreme (nan) validates nothing
+    held: np.ndarray = np.minimum.accumulate(
+        np.concatenate(([np.inf if np.isnan(hold_extreme) else hold_extreme], ask)))
+    validated: np.ndarray = ask >= held[:-1]
+    last_validated: np.ndarray = _last_validated(validated)
+    extremes: np.ndarray = np.where(last_validated >= 0, held[np.maximum(last_validated, 0)], extreme)
+    time_extremes: np.ndarray = _time_extremes(last_validated, times, time_extreme)
+    event = _first_event(ask > extremes + target_change, times, time_extremes, expiration_seconds)
+    return event, float(held[-1]), float(extremes[-1]), float(time_extremes[-1])
+
+
+def _sellhigh_chunk(bid: np.ndarray, times: np.ndarray, hold_extreme: float, extreme: float, time_extreme: float,
+                    target_change: float, expiration_seconds: float):
+    """
+    Apply the sellhigh rules to a chunk of ticks; returns as _buylow_chunk().
+
+    In the live loop, hold_extreme after a tick is max(extreme, bid), so a tick validates when its bid is at or above
+    both the previous bid and the extreme; extreme then becomes the larger of the two.
+    """
+    previous: np.ndarray = np.concatenate(([hold_extreme], bid[:-1]))     # nan:  no hold_extreme before the chunk
+    # A rise from the previous bid raises extreme to that previous bid (a no-op unless the previous bid is above the
+    # extreme), so extreme is a running max of those previous bids
+    raised: np.ndarray = np.where(bid >= previous, previous, -np.inf)
+    extremes: np.ndarray = np.maximum.accumulate(np.concatenate(([extreme], raised)))
+    held: np.ndarray = np.maximum(extremes[:-1], previous)
+    held[0] = previous[0]
+    validated: np.ndarray = bid >= held     # false where held is nan
+    time_extremes: np.ndarray = _time_extremes(_last_validated(validated), times, time_extreme)
+    extremes = extremes[1:]
+    event = _first_event(bid < extremes - target_change, times, time_extremes, expiration_seconds)
+    return event, float(max(extremes[-1], bid[-1])), float(extremes[-1]), float(time_extremes[-1])
+
+
+def _last_validated(validated: np.ndarray) -> np.ndarray:
+    """ Index of the last validating tick at or before each tick, -1 if none """
+    return np.maximum.accumulate(np.where(validated, np.arange(len(validated)), -1))
+
+
+def _time_extremes(last_validated: np.ndarray, times: np.ndarray, time_extreme: float) -> np.ndarray:
+    return np.where(last_validated >= 0, times[np.maximum(last_validated, 0)], time_extreme)
+
+
+def _first_event(hits: np.ndarray, times: np.ndarray, time_extremes: np.ndarray,
+                 expiration_seconds: float) -> tuple[int, bool] | None:
+    """ The live loop checks the target before expiring the extreme, so a hit wins a tie """
+    # nan time_extremes compare false, so never expire
+    expirations: np.ndarray = (times - time_extremes) > expiration_seconds
+    first_hit: int | None = int(np.argmax(hits)) if hits.any() else None
+    first_expiration: int | None = int(np.argmax(expirations)) if expirations.any() else None
+    if first_hit is not None and (first_expiration is None or first_hit <= first_expiration):
+        return first_hit, True
+    if first_expiration is not None:
+        return first_expiration, False
+    return None
+
+
+def _fill(ticks: TickArrays, start: int, trigger: int, instruction: str, numshares: int,
+          stop: float | None) -> BacktestResult:
+    """ Fill a market order at the trigger tick, then follow its stop (if any) to the exit or the end of the ticks """
+    is_long: bool = instruction == 'b'
+    fill_price: float = float(ticks.ask[trigger] if is_long else ticks.bid[trigger])
+    exit_index: int | None = None
+    if stop is not None:
+        active: int = int(np.searchsorted(ticks.times, ticks.times[trigger] + STOP_DELAY_SECONDS, side="left"))
+        active = max(active, trigger + 1)
+        # A sell stop fills at the bid once the bid falls to it; a buy stop at the ask once the ask rises to it
+        exit_index = _find_first(lambda i, end: ticks.bid[i:end] <= stop if is_long else ticks.ask[i:end] >= stop,
+                                 active, len(ticks))
+    mark_index: int = exit_index if exit_index is not None else len(ticks) - 1
+    exit_price: float = float(ticks.bid[mark_index] if is_long else ticks.ask[mark_index])
+    pnl: float = (exit_price - fill_price) * numshares * (1 if is_long else -1)
+    return BacktestResult(start, trigger, instruction, fill_price, stop, exit_index, exit_price, pnl)
+
+
+def _find_first(condition, start: int, end: int) -> int | None:
+    """ Index of the first tick in [start, end) for which condition(i, j) (a bool array for ticks i..j) is true """
+    i: int = start
+    chunk_size: int = CHUNK_SIZE
+    while i < end:
+        j: int = min(end, i + chunk_size)
+        found: np.ndarray = condition(i, j)
+        if found.any():
+            return i + int(np.argmax(found))
+        i = j
+        chunk_size *= 2
+    return None
+
+
+def _format_time(epoch_seconds: float) -> str:
+    return datetime.fromtimestamp(epoch_seconds).strftime('%m/%d %H:%M:%S')
@@ -0,0 +1,229 @@
+import argparse
+import contextlib
+import io
+import json
+import locale
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import (asdict, dataclass)
+from datetime import (datetime, timedelta)
+
+import numpy as np
+
+from mock_schwab_server import (add_config_arguments, parse_config, MockConfig, MockSchwabServer)
+
+
+# End-to-end latency benchmarks of the commands' hot paths, run against mock_schwab_server.py.  Each command is run
+# several times (after a warm-up run) with the quote and account caches cleared, and the p50/p95/p99 wall time and
+# the number of requests the server received are reported.  Save a run's results with --save, and compare a later
+# run against them with --compare to catch regressions (the exit status is 1 if any are found).
+#   python benchmark.py --runs 50 --latency 30 --save baseline.json
+#   python benchmark.py --runs 50 --latency 30 --compare baseline.json
+# --startup instead times one-shot runs of 'python schwab_cli.py quote AAPL', in a new process each time, and fails
+# (exit status 1) if the p50 is over the startup budget or importing schwab_cli imports any of the slow LAZY_MODULES.
+#   python benchmark.py --startup --runs 20 --budget 400
+# Status:  Beta
+
+
+DEFAULT_RUNS = 30
+DEFAULT_THRESHOLD = 0.2     # a p95 this much (20%) slower than the baseline is a regression
+QUOTE_SYMBOLS_MANY = ",".join(f"SYM{i:04}" for i in range(600))  # more than one quote request's worth
+
+# name -> command line
+BENCHMARKS = {
+    "quote": "quote AAPL,MSFT,NVDA",
+    "quote-600": f"quote {QUOTE_SYMBOLS_MANY}",
+    "bal": "bal",
+    "pos": "pos",
+    "pos-symbols": "pos AAPL,MSFT,NVDA",
+    "order": "order b AAPL 10 100.00",
+    "order-bid": "order b MSFT 10 bid",
+    "trans": "trans AAPL,MSFT",
+    "flatten": "flatten",
+}
+
+STARTUP_COMMAND = "quote AAPL"
+DEFAULT_STARTUP_BUDGET = 400    # ms, p50 of a one-shot STARTUP_COMMAND, including the interpreter's own startup
+# Imported only by the commands that need them, not when schwab_cli starts
+LAZY_MODULES = ("numpy", "asyncio", "websockets", "dateutil", "dotenv", "tzlocal", "http.server")
+
+_SCRIPT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    runs: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    requests: float     # mean per run
+    errors: int
+    first_error: str = ""
+
+
+def run_benchmarks(config: MockConfig, runs: int, names: list[str], warm: bool = False) -> list[BenchmarkResult]:
+    """ Run each named benchmark against a mock server, in a scratch directory (auth.json, accounts.json...) """
+    server = MockSchwabServer(config).start()
+    os.environ["SCHWAB_API_ROOT"] = server.url
+    # Imported only now, as they read SCHWAB_API_ROOT when imported
+    import commands
+    import schwab_api
+    from schwab_auth import (SchwabAuth)
+    from schwab_http import (configure_http_client)
+
+    original_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            _write_auth_file()
+            configure_http_client(requests_per_minute=1_000_000, burst=1_000)  # measure our code, not the quota
+            schwab_auth = SchwabAuth("mock-app-key", "mock-app-secret")
+            results: list[BenchmarkResult] = []
+            for name in names:
+                parts: list[str] = BENCHMARKS[name].split(' ')
+                times: list[float] = []
+                requests: list[int] = []
+                errors: list[str] = []
+                for run in range(runs + 1):  # the first run warms up connections and the account registry
+                    if not warm:
+                        schwab_api.get_quote_cache().clear()
+                        schwab_api.invalidate_account_snapshot()
+                    server.reset_counts()
+                    start: float = time.perf_counter()
+                    error: str | None = None
+                    try:
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            commands.exec_command(parts[0], parts, schwab_auth)
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                    elapsed: float = time.perf_counter() - start
+                    if run:
+                        times.append(elapsed * 1000)
+                        requests.append(server.total_requests())
+                        if error:
+                            errors.append(error)
+                p50, p95, p99 = np.percentile(times, [50, 95, 99])
+                results.append(BenchmarkResult(name, runs, float(p50), float(p95), float(p99), float(np.mean(requests)),
+                                               len(errors), errors[0] if errors else ""))
+        finally:
+            os.chdir(original_directory)
+            server.stop()
+    return results
+
+
+def run_startup_benchmark(config: MockConfig, runs: int) -> BenchmarkResult:
+    """ Time one-shot runs of schwab_cli.py STARTUP_COMMAND, each in a new process, against a mock server """
+    server = MockSchwabServer(config).start()
+    env: dict[str, str] = dict(os.environ, SCHWAB_API_ROOT=server.url, SCHWAB_APP_KEY="mock-app-key",
+                               SCHWAB_APP_SECRET="mock-app-secret")
+    command: list[str] = [sys.executable, os.path.join(_SCRIPT_DIRECTORY, "schwab_cli.py")] + STARTUP_COMMAND.split(' ')
+    original_directory: str = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            _write_auth_file()
+            times: list[float] = []
+            requests: list[int] = []
+            errors: list[str] = []
+            for run in range(runs + 1):  # the first run warms up the OS's file cache
+                server.reset_counts()
+                start: float = time.perf_counter()
+                completed = subprocess.run(command, env=env, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+                elapsed: float = time.perf_counter() - start
+                if run:
+                    times.append(elapsed * 1000)
+                    requests.append(server.total_requests())
+                    if completed.returncode or "Error" in completed.stdout:
+                        errors.append((completed.stderr or completed.stdout).strip().splitlines()[-1])
+        finally:
+            os.chdir(original_directory)
+            server.stop()
+    p50, p95, p99 = np.percentile(times, [50, 95, 99])
+    return BenchmarkResult("startup", runs, float(p50), float(p95), float(p99), float(np.mean(requests)),
+                           len(errors), errors[0] if errors else "")
+
+
+def eager_imports() -> list[str]:
+    """ The LAZY_MODULES that importing schwab_cli imports """
+    code: str = f"import sys, schwab_cli; print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    completed = subprocess.run([sys.executable, "-c", code], cwd=_SCRIPT_DIRECTORY,
+                               capture_output=True, text=True, check=True)
+    return completed.stdout.split()
+
+
+def print_results(results: list[BenchmarkResult], baseline: dict[str, dict] | None = None,
+                  threshold: float = DEFAULT_THRESHOLD) -> int:
+    """ Print a table of the results, compared to the baseline if given; returns the number of regressions """
+    regressions: int = 0
+    print(f"{'command':<12} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'requests':>9} {'errors':>7}")
+    for result in results:
+        line: str = (f"{result.name:<12} {result.runs:>5} {result.p50_ms:>9.1f} {result.p95_ms:>9.1f} "
+                     f"{result.p99_ms:>9.1f} {result.requests:>9.1f} {result.errors:>7}")
+        base: dict | None = baseline.get(result.name) if baseline else None
+        if base:
+            change: float = (result.p95_ms - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+            line += f"   p95 {change:+.0%}, requests {result.requests - base['requests']:+.1f}"
+            if change > threshold or result.requests > base["requests"]:
+                line += "  REGRESSION"
+                regressions += 1
+        print(line)
+        if result.first_error:
+            print(f"  first error: {result.first_error}")
+    return regressions
+
+
+def _write_auth_file():
+    """ An access token that won't expire during the run; the refresh token is good for a week """
+    now: datetime = datetime.now()
+    with open('auth.json', 'w') as f:
+        json.dump({"access_token": "mock-access-token", "token_type": "Bearer", "expires_in": 1800,
+                   "refresh_token": "mock-refresh-token", "scope": "api", "expiration_origin_time": str(now),
+                   "refresh_token_expected_expiration_time": str(now + timedelta(days=7))}, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark commands against a local mock Schwab API")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="timed runs per command")
+    parser.add_argument("--commands", default=",".join(BENCHMARKS), help=f"comma separated, from: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--warm", action="store_true", help="don't clear the quote and account caches between runs")
+    parser.add_argument("--save", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="compare with results saved by --save")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="p95 slowdown that is a regression")
+    parser.add_argument("--startup", action="store_true", help=f"time one-shot runs of 'schwab_cli.py {STARTUP_COMMAND}'")
+    parser.add_argument("--budget", type=float, default=DEFAULT_STARTUP_BUDGET, help="startup budget (p50 ms)")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.startup:
+        try:
+            locale.setlocale(locale.LC_ALL, "en_US")  # as 'trans' does, for its currency amounts
+        except locale.Error:
+            print("Warning:  The en_US locale is not installed, so 'trans' will fail")
+
+    startup_failed: bool = False
+    if args.startup:
+        benchmark_results: list[BenchmarkResult] = [run_startup_benchmark(parse_config(args), args.runs)]
+    else:
+        benchmark_results: list[BenchmarkResult] = run_benchmarks(parse_config(args), args.runs,
+                                                                  args.commands.split(','), args.warm)
+    baseline_results: dict[str, dict] | None = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline_results = json.load(f)
+    num_regressions: int = print_results(benchmark_results, baseline_results, args.threshold)
+    if args.startup:
+        over_budget: bool = benchmark_results[0].p50_ms > args.budget
+        print(f"Startup p50 {benchmark_results[0].p50_ms:.1f} ms; budget {args.budget:g} ms"
+              f"{'  OVER BUDGET' if over_budget else ''}")
+        eager: list[str] = eager_imports()
+        if eager:
+            print(f"Importing schwab_cli imports {', '.join(eager)}, which should be imported only when needed")
+        startup_failed = over_budget or bool(eager) or benchmark_results[0].errors > 0
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({result.name: asdict(result) for result in benchmark_results}, f, indent=4)
+    sys.exit(1 if num_regressions or startup_failed else 0)
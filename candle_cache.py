@@ -0,0 +1,203 @@
+import os
+import threading
+from dataclasses import (dataclass)
+from datetime import (date, datetime, timedelta)
+from typing import (Callable)
+from zoneinfo import (ZoneInfo)
+
+import numpy as np
+
+
+# Local columnar cache of price history candles.  Each symbol/frequency is partitioned by day (by year for daily and
+# longer candles) into .npy files of a (6, n) array -- time, open, high, low, close, volume -- that are memory-mapped
+# when read.  Only the missing partitions are fetched.  A partition that is not complete yet (today's, or this year's)
+# is saved as <name>.open.npy and topped up from its last candle, which may itself have changed, on the next read.
+# Empty partitions are not saved, except weekend days of minute candles:  a weekday may be empty only for now, e.g.
+# outside Schwab's retention window for minute candles.
+# Status:  Beta
+
+
+CANDLES_DIRECTORY = "candles"
+MARKET_TZ = ZoneInfo("America/New_York")    # partitions are market days
+
+# frequency name -> (Schwab frequencyType, frequency)
+FREQUENCIES = {
+    "1min": ("minute", 1),
+    "5min": ("minute", 5),
+    "10min": ("minute", 10),
+    "15min": ("minute", 15),
+    "30min": ("minute", 30),
+    "daily": ("daily", 1),
+    "weekly": ("weekly", 1),
+    "monthly": ("monthly", 1),
+}
+MAX_DAYS_PER_REQUEST = {"minute": 31, "daily": 366 * 5, "weekly": 366 * 20, "monthly": 366 * 20}
+
+# Fetches the candles of a symbol/frequency between two datetimes, as returned by the pricehistory endpoint:
+# [{"datetime": <epoch ms>, "open": ..., "high": ..., "low": ..., "close": ..., "volume": ...}], or None on error
+CandleFetcher = Callable[[str, str, datetime, datetime], list | None]
+
+
+@dataclass
+class Candles:
+    times: np.ndarray       # epoch milliseconds (float64, exact for any realistic date)
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "Candles":
+        return cls(*array)
+
+    @classmethod
+    def from_json(cls, candles: list) -> "Candles":
+        return cls.from_array(_to_array(candles))
+
+
+class CandleCache:
+    def __init__(self, directory: str = CANDLES_DIRECTORY):
+        self.directory: str = directory
+        self.partitions_read: int = 0
+        self.partitions_fetched: int = 0
+        self._lock = threading.Lock()
+
+    def get(self, symbol: str, frequency: str, start: date, end: date, fetch: CandleFetcher) -> Candles | None:
+        """ Candles of symbol at frequency (a FREQUENCIES name) from start to end inclusive, or None on error """
+        frequency_type: str = FREQUENCIES[frequency][0]
+        keys: list[date] = _partition_keys(frequency_type, start, end)
+        today: date = datetime.now(MARKET_TZ).date()
+        arrays: dict[date, np.ndarray] = {}
+        missing: list[date] = []
+        open_keys: list[date] = []  # saved before they were complete
+        with self._lock:
+            for key in keys:
+                array: np.ndarray | None = self._load(symbol, frequency, key, complete=True)
+                if array is not None:
+                    arrays[key] = array
+                    self.partitions_read += 1
+                    continue
+                array = self._load(symbol, frequency, key, complete=False)
+                if array is not None and array.shape[1]:
+                    arrays[key] = array
+                    open_keys.append(key)
+                else:
+                    missing.append(key)
+
+        for key in open_keys:
+            old: np.ndarray = arrays[key]
+            since_ms: float = float(old[0, -1])
+            range_end = datetime.combine(_partition_end(frequency_type, key), datetime.max.time(), MARKET_TZ)
+            candles: list | None = fetch(symbol, frequency, datetime.fromtimestamp(since_ms / 1000, MARKET_TZ), range_end)
+            if candles is None:
+                return None
+            new: np.ndarray = _to_array(candles)
+            new = new[:, new[0] >= since_ms]
+            # The last saved candle may have been in progress, so the fetched one replaces it
+            array = np.concatenate([old[:, old[0] < since_ms], new], axis=1) if new.shape[1] else np.array(old)
+            with self._lock:
+                arrays[key] = array
+                self.partitions_fetched += 1
+                self._store(symbol, frequency, key, array, today)
+
+        for first, last in _ranges(missing, frequency_type):
+            range_start = datetime.combine(first, datetime.min.time(), MARKET_TZ)
+            range_end = datetime.combine(_partition_end(frequency_type, last), datetime.max.time(), MARKET_TZ)
+            candles: list | None = fetch(symbol, frequency, range_start, range_end)
+            if candles is None:
+                return None
+            fetched: dict[date, np.ndarray] = _partition(_to_array(candles), frequency_type)
+            with self._lock:
+                for key in _partition_keys(frequency_type, first, last):
+                    array = fetched.get(key, np.empty((6, 0)))
+                    arrays[key] = array
+                    self.partitions_fetched += 1
+                    if array.shape[1] or (frequency_type == "minute" and key.weekday() >= 5):
+                        self._store(symbol, frequency, key, array, today)
+
+        combined: np.ndarray = np.concatenate([arrays[key] for key in keys], axis=1) if keys else np.empty((6, 0))
+        start_ms: float = datetime.combine(start, datetime.min.time(), MARKET_TZ).timestamp() * 1000
+        end_ms: float = datetime.combine(end, datetime.max.time(), MARKET_TZ).timestamp() * 1000
+        in_range: np.ndarray = (combined[0] >= start_ms) & (combined[0] <= end_ms)
+        return Candles.from_array(combined[:, in_range])
+
+    #####
+
+    def _filename(self, symbol: str, frequency: str, key: date, complete: bool) -> str:
+        name: str = key.isoformat() if FREQUENCIES[frequency][0] == "minute" else str(key.year)
+        return os.path.join(self.directory, symbol, frequency, f"{name}.npy" if complete else f"{name}.open.npy")
+
+    def _load(self, symbol: str, frequency: str, key: date, complete: bool) -> np.ndarray | None:
+        try:
+            return np.load(self._filename(symbol, frequency, key, complete), mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _store(self, symbol: str, frequency: str, key: date, array: np.ndarray, today: date):
+        """ Save a fetched partition:  as complete once it is in the past, else as open (still being added to) """
+        complete: bool = _partition_end(FREQUENCIES[frequency][0], key) < today
+        self._save(symbol, frequency, key, array, complete)
+        if complete:
+            try:
+                os.remove(self._filename(symbol, frequency, key, complete=False))
+            except FileNotFoundError:
+                pass
+
+    def _save(self, symbol: str, frequency: str, key: date, array: np.ndarray, complete: bool):
+        filename: str = self._filename(symbol, frequency, key, complete)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        temp_filename: str = f"{filename}.tmp.npy"
+        np.save(temp_filename, array)
+        os.replace(temp_filename, filename)  # readers never see a partly written partition
+
+
+def _to_array(candles: list) -> np.ndarray:
+    return np.array([[candle["datetime"], candle["open"], candle["high"], candle["low"], candle["close"],
+                      candle["volume"]] for candle in candles], dtype=np.float64).reshape(-1, 6).T
+
+
+def _partition_key(frequency_type: str, day: date) -> date:
+    return day if frequency_type == "minute" else date(day.year, 1, 1)
+
+
+def _partition_end(frequency_type: str, key: date) -> date:
+    return key if frequency_type == "minute" else date(key.year, 12, 31)
+
+
+def _partition_keys(frequency_type: str, start: date, end: date) -> list[date]:
+    if frequency_type == "minute":
+        return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    return [date(year, 1, 1) for year in range(start.year, end.year + 1)]
+
+
+def _partition(array: np.ndarray, frequency_type: str) -> dict[date, np.ndarray]:
+    """ Split candles (sorted by time) into partitions """
+    keys: list[date] = [_partition_key(frequency_type, datetime.fromtimestamp(ms / 1000, MARKET_TZ).date())
+                        for ms in array[0]]
+    partitions: dict[date, np.ndarray] = {}
+    begin: int = 0
+    for i in range(1, len(keys) + 1):
+        if i == len(keys) or keys[i] != keys[begin]:
+            partitions[keys[begin]] = np.ascontiguousarray(array[:, begin:i])
+            begin = i
+    return partitions
+
+
+def _ranges(keys: list[date], frequency_type: str) -> list[tuple[date, date]]:
+    """ Group consecutive missing partitions into ranges, each small enough for one request """
+    step: timedelta = timedelta(days=1)
+    max_days: int = MAX_DAYS_PER_REQUEST[frequency_type]
+    ranges: list[tuple[date, date]] = []
+    for key in keys:
+        if ranges:
+            first, last = ranges[-1]
+            consecutive: bool = (_partition_end(frequency_type, last) + step) == key
+            if consecutive and (_partition_end(frequency_type, key) - first).days < max_days:
+                ranges[-1] = (first, key)
+                continue
+        ranges.append((key, key))
+    return ranges
@@ -1,21 +1,44 @@
+import contextvars
 import json
 import locale
 import sys
 import time
-from datetime import (datetime, timedelta)
+from datetime import (date, datetime, timedelta)
+from typing import (TYPE_CHECKING, Callable)
 
 import requests
-from tzlocal import (get_localzone)
 
-from schwab_api import (get_account_balance, place_order, get_quotes, get_account_positions, get_transactions,
-                        show_working_orders)
+from account import (AccountRegistry, AccountSnapshot, Position, ALL_ACCOUNTS)
+from jobs import (get_active_scheduler, get_job_scheduler, Job, JobScheduler)
+from metrics import (get_metrics, get_metrics_file, get_metrics_server, start_metrics_file, start_metrics_server,
+                     EndpointStats, METRICS_FILE, METRICS_PORT)
+from profiler import (profile_command, CPROFILE, SAMPLE)
+from quote_sources import (PollingQuoteSource, QuoteSource, ReplayFinished, ReplayQuoteSource, StreamingQuoteSource)
+from schwab_api import (get_account_balance, get_account_positions, get_account_registry, get_account_snapshot,
+                        get_price_history, get_quote_cache, get_selected_account, place_order, get_quotes,
+                        get_quotes_batch, get_streamer_info, get_transactions, local_timezone, normalize_symbols,
+                        select_account, show_working_orders, OrderResult, QuoteBatch)
 from schwab_auth import (SchwabAuth)
-from transactions import (find_transaction_groups, dump_transaction_groups)
+from strategies import (parse_target_change, EXTREME_EXPIRATION_SECONDS, NO_EXTREME, NO_LIMIT, STOP_DELAY_SECONDS)
+from strategy_engine import (get_active_engine, get_strategy_engine, BuyLowSellHigh, EnterPosition, Strategy,
+                             StrategyEngine)
+from tick_recorder import (get_tick_recorder, start_recording, stop_recording, TickRecorder, TICKS_DIRECTORY)
+from tracing import (get_tracer, span, start_tracing, stop_tracing, Tracer, TRACES_FILENAME)
 
+# Modules that are slow to import (NumPy, asyncio, websockets) are imported by the commands that use them, when first
+# run, so one-shot commands like 'quote' start quickly
+if TYPE_CHECKING:
+    from backtest import (BacktestResult, TickArrays)
+    from candle_cache import (Candles)
+    from schwab_streamer import (SchwabStreamer)
+    from sweep import (Dataset, SweepParams, SweepResult)
 
-NO_EXTREME = -1
-NO_LIMIT = -1
-EXTREME_EXPIRATION_SECONDS = 60 * 30  # 30 minutes
+
+HIST_MAX_CANDLES_SHOWN = 40
+
+# Set while a 'replay' command runs; per context, so a replay in one daemon client (see daemon.py) doesn't affect others
+_replay_source: contextvars.ContextVar[ReplayQuoteSource|None] = contextvars.ContextVar("replay_source", default=None)
+_locale_set: bool = False  # the locale is set by the commands that format currency, when first run
 
 
 _advanced_commands = [
@@ -43,6 +66,48 @@ _advanced_commands = [
         "help": "Show positions for specified symbols (if none, show all holdings), optionally repeating",
         "function": lambda parts, schwab_auth: _do_pos(parts, schwab_auth)
     },
+    {
+        "name": "acct",
+        "prompt": "acct <account number | last digits of account number | all | refresh>",
+        "help": "Show accounts, or select the account (or all accounts) that commands use",
+        "function": lambda parts, schwab_auth: _do_acct(parts, schwab_auth),
+    },
+    {
+        "name": "hist",
+        "prompt": "hist [symbol] <days> <1min | 5min | 10min | 15min | 30min | daily | weekly | monthly>",
+        "help": "Show price history (default: 30 days of daily candles); candles are cached locally, so only new days are downloaded",
+        "function": lambda parts, schwab_auth: _do_hist(parts, schwab_auth),
+    },
+    {
+        "name": "stream",
+        "prompt": "stream <on | off>",
+        "help": "Turn streaming quotes on or off:  trend, buylow/sellhigh and breakout/oscillate then react to each price change instead of polling",
+        "function": lambda parts, schwab_auth: _do_stream(parts, schwab_auth),
+    },
+    {
+        "name": "record",
+        "prompt": "record <on | off> <directory>",
+        "help": "Turn recording of every quote (polled or streamed) on or off; each day's ticks go to <directory>/<date>.ticks (default directory: ticks), for 'replay', 'backtest' and 'sweep'",
+        "function": lambda parts, schwab_auth: _do_record(parts),
+    },
+    {
+        "name": "replay",
+        "prompt": "replay [tick file] [speed | max] [trend | buylow | sellhigh | breakout | oscillate command...]",
+        "help": "Run a strategy against recorded ticks at speed times real time (max: as fast as possible), simulating its orders",
+        "function": lambda parts, schwab_auth: _do_replay(parts, schwab_auth),
+    },
+    {
+        "name": "backtest",
+        "prompt": "backtest [tick file] [buylow | sellhigh | breakout | oscillate command...]",
+        "help": "Backtest a strategy over recorded ticks, showing each run's trigger time, fill price and P&L",
+        "function": lambda parts, schwab_auth: _do_backtest(parts, schwab_auth),
+    },
+    {
+        "name": "sweep",
+        "prompt": "sweep [tick file] [buylow | sellhigh] [symbol1,symbol2,...] [num shares] [change1,change2,...] <extreme expiration minutes1,...> <stop offset1,... | none | default>",
+        "help": "Backtest every combination of the parameters on every symbol and day (using all CPU cores), saving the results to sweep_results.csv and showing the best",
+        "function": lambda parts, schwab_auth: _do_sweep(parts, schwab_auth),
+    },
     {
         "name": "trend",
         "prompt": "trend [symbol] <ref_price>",
@@ -71,6 +136,48 @@ _advanced_commands = [
         "prompt": "",  # breakout's prompt is used for oscillate also
         "function": lambda parts, schwab_auth: _do_oscillate(parts, schwab_auth)
     },
+    {
+        "name": "strat",
+        "prompt": "strat <add [buylow | sellhigh | breakout | oscillate command...] | list | cancel [id | all]>",
+        "help": "Run many buylow/sellhigh/breakout/oscillate instances in the background, sharing one quote request per second; list them, or cancel one or all",
+        "function": lambda parts, schwab_auth: _do_strat(parts, schwab_auth)
+    },
+    {
+        "name": "every",
+        "prompt": "every [seconds] [quote | bal | pos | refport | trend command...]",
+        "help": "Repeat a command every so many seconds as a background job, leaving the prompt free",
+        "function": lambda parts, schwab_auth: _do_every(parts, schwab_auth)
+    },
+    {
+        "name": "jobs",
+        "prompt": "jobs",
+        "help": "List background jobs (started by 'every', or by bal, pos and refport with a refresh interval)",
+        "function": lambda parts, schwab_auth: _do_jobs(parts)
+    },
+    {
+        "name": "kill",
+        "prompt": "kill [job id | all]",
+        "help": "Stop a background job, or all of them",
+        "function": lambda parts, schwab_auth: _do_kill(parts)
+    },
+    {
+        "name": "stats",
+        "prompt": "stats <reset | file [filename] | serve [port]>",
+        "help": "Show the latency, sizes and statuses of the API requests made, per endpoint; reset them, or export them in the Prometheus text format to a file (rewritten every 15 seconds) or from http://localhost:[port]/metrics",
+        "function": lambda parts, schwab_auth: _do_stats(parts)
+    },
+    {
+        "name": "profile",
+        "prompt": "profile <sample> <iterations> [command...]",
+        "help": "Profile one run of a command (with cProfile, or by sampling its stack, which is cheap enough for long loops), or only the first <iterations> of a trend/buylow/sellhigh/breakout/oscillate loop; reports go to the profiles directory",
+        "function": lambda parts, schwab_auth: _do_profile(parts, schwab_auth)
+    },
+    {
+        "name": "trace",
+        "prompt": "trace <on [filename] [otlp] | off>",
+        "help": "Turn tracing on or off:  each command's auth, HTTP, parse and format steps are timed as nested spans and appended to a JSON-lines file (default: traces.jsonl), optionally in the OTLP/JSON format",
+        "function": lambda parts, schwab_auth: _do_trace(parts)
+    },
     {
         "name": "trans",
         "prompt": "trans [symbol1,symbol2,...] <days ago> <-- EXPERIMENTAL",
@@ -121,7 +228,8 @@ def exec_command(cmd_name: str, parts: list[str], schwab_auth: SchwabAuth):
     if not cmd:
         print(f"Error:  Invalid command: {cmd_name}")
         return
-    cmd["function"](parts, schwab_auth)
+    with span(f"command {cmd_name}", command=' '.join(parts)):
+        cmd["function"](parts, schwab_auth)
 
 def get_command_prompt(cmd_name: str = None) -> str|None:
     cmd: dict = next((command for command in _advanced_commands if command["name"] == cmd_name), None)
@@ -143,13 +251,14 @@ def _do_quote(parts: list[str], schwab_auth: SchwabAuth):
         if not quotes:
             print("Error getting quotes")
         else:
-            prices: list = []
-            for symbol, q in quotes.items():
-                quote = q.get("quote")
-                if quote:
-                    prices.append({"symbol": symbol, "last": quote["lastPrice"], "ask": quote["askPrice"],
-                                   "bid": quote["bidPrice"]})
-            print(*prices, sep='\n')
+            with span("format", lines=len(quotes)):
+                prices: list = []
+                for symbol, q in quotes.items():
+                    quote = q.get("quote")
+                    if quote:
+                        prices.append({"symbol": symbol, "last": quote["lastPrice"], "ask": quote["askPrice"],
+                                       "bid": quote["bidPrice"]})
+                print(*prices, sep='\n')
 
 def do_order(parts: list[str], schwab_auth: SchwabAuth):
     if len(parts) == 1:
@@ -169,23 +278,121 @@ def do_order(parts: list[str], schwab_auth: SchwabAuth):
     shares = int(parts[3])
     limit_price = parts[4] if len(parts) > 4 else None
     resp: requests.Response = place_order(schwab_auth, instruction, symbol, shares, limit_price)
-    result: str = resp.text if resp.text else "OK" if resp.ok else "Something went wrong"
-    print(result)
+    with span("format"):
+        result: str = resp.text if resp.text else "OK" if resp.ok else "Something went wrong"
+        print(result)
     return
 
 def _do_bal(parts: list[str], schwab_auth: SchwabAuth):
     seconds: int = int(parts[1]) if len(parts) > 1 else 0
-    while True:
-        try:
-            account_balance: float = get_account_balance(schwab_auth)
-            if not seconds:
-                print(f"Account balance: ${account_balance:,}")
-                break
-            now = datetime.now()
-            print(f'{now.strftime("%X")}: ${account_balance:,}')
-            time.sleep(seconds)
-        except KeyboardInterrupt:
-            break
+    if seconds:
+        _start_job(seconds, ["bal"], schwab_auth)
+    else:
+        _show_bal(schwab_auth, brief=False)
+
+def _show_bal(schwab_auth: SchwabAuth, brief: bool):
+    snapshot: AccountSnapshot|None = get_account_snapshot(schwab_auth)
+    if not snapshot:
+        print("Error getting account balance")
+        return
+    account_balance: float = snapshot.equity
+    with span("format"):
+        if brief:
+            print(f"${account_balance:,}")
+            return
+        for account in snapshot.accounts:  # all accounts are selected
+            print(f"  {account.account_number}: ${account.equity:,}")
+        print(f"Account balance: ${account_balance:,}")
+
+def _do_acct(parts: list[str], schwab_auth: SchwabAuth):
+    if len(parts) > 1 and parts[1] != "refresh":
+        account_number: str|None = select_account(schwab_auth, parts[1])
+        if not account_number:
+            print(f"Error:  No such account: {parts[1]}")
+            return
+
+    registry: AccountRegistry = get_account_registry(schwab_auth, refresh=len(parts) > 1 and parts[1] == "refresh")
+    if not registry.accounts:
+        print("Error getting accounts")
+        return
+    selected: str|None = get_selected_account() or registry.primary_account_number()
+    for account_number in registry.accounts:
+        print(f"{'*' if selected in (account_number, ALL_ACCOUNTS) else ' '} {account_number}")
+    if selected == ALL_ACCOUNTS:
+        print(f"Balances and positions are combined across all accounts; orders are placed in {registry.primary_account_number()}")
+
+def _do_hist(parts: list[str], schwab_auth: SchwabAuth):
+    from candle_cache import (FREQUENCIES)
+    symbol: str = parts[1].upper()
+    days: int = int(parts[2]) if len(parts) > 2 else 30
+    frequency: str = parts[3] if len(parts) > 3 else "daily"
+    if frequency not in FREQUENCIES:
+        print(f"Error:  Invalid frequency: {frequency}")
+        return
+    end: date = datetime.now(local_timezone()).date()
+    candles: "Candles|None" = get_price_history(symbol, schwab_auth, frequency, end - timedelta(days=days), end)
+    if candles is None:
+        print("Error getting price history")
+        return
+    if not len(candles):
+        print(f"No {frequency} candles for {symbol} in the last {days} days")
+        return
+    shown: int = min(len(candles), HIST_MAX_CANDLES_SHOWN)
+    if shown < len(candles):
+        print(f"... {len(candles) - shown} earlier candles not shown")
+    for i in range(len(candles) - shown, len(candles)):
+        candle_time = datetime.fromtimestamp(candles.times[i] / 1000)
+        print(f"{candle_time.strftime('%a %m/%d/%y %H:%M' if frequency.endswith('min') else '%a %m/%d/%y')}: "
+              f"open {candles.open[i]:.2f}  high {candles.high[i]:.2f}  low {candles.low[i]:.2f}  "
+              f"close {candles.close[i]:.2f}  volume {candles.volume[i]:,.0f}")
+    change: float = candles.close[-1] - candles.open[0]
+    print(f"{symbol}: {len(candles)} candles; high {candles.high.max():.2f}; low {candles.low.min():.2f}; "
+          f"change {change:+.2f} ({change / candles.open[0] * 100:+.2f}%)")
+
+def _do_stream(parts: list[str], schwab_auth: SchwabAuth):
+    from schwab_streamer import (get_active_streamer, get_streamer, stop_streamer)
+    if len(parts) > 1 and parts[1] == "on":
+        if not get_streamer(schwab_auth, get_streamer_info):
+            print("Error getting streamer info")
+            return
+    elif len(parts) > 1 and parts[1] == "off":
+        stop_streamer()
+    streamer: "SchwabStreamer|None" = get_active_streamer()
+    if not streamer:
+        print("Streaming quotes: off")
+    else:
+        print(f"Streaming quotes: on ({'connected' if streamer.connected else 'connecting'}; {streamer.url})")
+
+def _do_record(parts: list[str]):
+    if len(parts) > 1 and parts[1] == "on":
+        start_recording(parts[2] if len(parts) > 2 else TICKS_DIRECTORY)
+    elif len(parts) > 1 and parts[1] == "off":
+        stop_recording()
+    recorder: TickRecorder|None = get_tick_recorder()
+    if not recorder:
+        print("Recording quotes: off")
+    else:
+        print(f"Recording quotes: on ({recorder.records} recorded to {recorder.directory})")
+
+def _do_replay(parts: list[str], schwab_auth: SchwabAuth):
+    filename: str = parts[1]
+    speed: float|None = None if parts[2] == "max" else float(parts[2])
+    try:
+        replay_source: ReplayQuoteSource = ReplayQuoteSource.from_file(filename, speed)
+    except FileNotFoundError:
+        print(f"Error: The file '{filename}' was not found.")
+        return
+    print(f"Replaying {len(replay_source.ticks)} ticks from {filename} at {parts[2]}{'' if parts[2] == 'max' else 'x'} speed")
+    token: contextvars.Token = _replay_source.set(replay_source)
+    try:
+        exec_command(parts[3], parts[3:], schwab_auth)
+    except ReplayFinished:
+        print("End of replay")
+    finally:
+        _replay_source.reset(token)
+    print(f"Simulated orders: {len(replay_source.orders)}")
+    for order in replay_source.orders:
+        print(f"  {order}")
 
 def _do_pos(parts: list[str], schwab_auth: SchwabAuth):
     """
@@ -205,25 +412,76 @@ def _do_pos(parts: list[str], schwab_auth: SchwabAuth):
             symbols_str: str = parts[1].strip().upper()
             if len(parts) > 2:
                 seconds = int(parts[2])
-    while True:
-        try:
-            if seconds:
-                now = datetime.now()
-                print(f"{now.hour:02}:{now.minute:02}:{now.second:02}")
-            show_pos(symbols_str, schwab_auth)
-            if not seconds:
-                break
-            time.sleep(seconds)
-        except KeyboardInterrupt:
-            break
+    if seconds:
+        _start_job(seconds, ["pos", symbols_str] if symbols_str else ["pos"], schwab_auth)
+    else:
+        show_pos(symbols_str, schwab_auth)
 
-def _do_trend(parts: list[str], schwab_auth: SchwabAuth):
+def _do_backtest(parts: list[str], schwab_auth: SchwabAuth):
+    from backtest import (backtest_buylow_sellhigh, backtest_enter_position, backtest_runs, load_tick_file)
+    filename: str = parts[1]
+    strategy: str = parts[2]
+    symbol: str = parts[3].upper()
+    numshares: int = int(parts[4])
+    try:
+        ticks: "TickArrays" = load_tick_file(filename, symbol)
+    except FileNotFoundError:
+        print(f"Error: The file '{filename}' was not found.")
+        return
+    start_time: float = time.perf_counter()
+    if strategy in ("buylow", "sellhigh"):
+        results: "list[BacktestResult]" = backtest_runs(
+            ticks, backtest_buylow_sellhigh, islow=strategy == "buylow", numshares=numshares,
+            change_or_percent_change=parts[5], known_extreme=float(parts[6]) if len(parts) > 6 else NO_EXTREME,
+            limit=float(parts[7]) if len(parts) > 7 else NO_LIMIT)
+    elif strategy in ("breakout", "oscillate"):
+        results: "list[BacktestResult]" = backtest_runs(
+            ticks, backtest_enter_position, numshares=numshares, low_target=float(parts[5]),
+            high_target=float(parts[6]), breakout=strategy == "breakout")
+    else:
+        print(f"Error:  Can't backtest {strategy}")
+        return
+    elapsed: float = time.perf_counter() - start_time
+    for run, result in enumerate(results, 1):
+        print(f"{run}: {result.format(ticks)}")
+    _set_locale()
+    print(f"Total P&L: {locale.currency(sum(result.pnl for result in results), grouping=True)}")
+    print(f"{len(ticks)} ticks in {elapsed:.3f} seconds")
+
+def _do_sweep(parts: list[str], schwab_auth: SchwabAuth):
+    import tempfile
+    from sweep import (best_params, make_grid, prepare_datasets, run_sweep, DEFAULT_STOP, RESULTS_FILE)
+    filename: str = parts[1]
+    islow: bool = parts[2] == "buylow"
+    symbols: list[str] = parts[3].upper().split(',')
+    numshares: int = int(parts[4])
+    changes: list[str] = parts[5].split(',')
+    expiration_minutes: list[float] = [float(minutes) for minutes in parts[6].split(',')] if len(parts) > 6 else [
+        EXTREME_EXPIRATION_SECONDS / 60]
+    stop_offsets: list[str] = parts[7].split(',') if len(parts) > 7 else [DEFAULT_STOP]
+    grid: "list[SweepParams]" = make_grid(changes, expiration_minutes, stop_offsets)
+    start_time: float = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            datasets: "list[Dataset]" = prepare_datasets(filename, symbols, directory)
+        except FileNotFoundError:
+            print(f"Error: The file '{filename}' was not found.")
+            return
+        print(f"Sweeping {len(grid)} parameter combinations over {len(datasets)} symbol days...")
+        totals: "dict[SweepParams, SweepResult]" = run_sweep(datasets, grid, islow, numshares)
+    _set_locale()
+    print(f"Done in {time.perf_counter() - start_time:.1f} seconds; results saved in {RESULTS_FILE}")
+    for rank, total in enumerate(best_params(totals), 1):
+        print(f"{rank}: {total.params}: {total.trades} trades; P&L {locale.currency(total.pnl, grouping=True)}")
+
+def _do_trend(parts: list[str], schwab_auth: SchwabAuth, quote_source: QuoteSource|None = None):
     """Computes the trend of a single symbol compared to a reference price in units of 0.01%"""
+    quote_source = quote_source if quote_source else _get_quote_source(schwab_auth)
     symbol = parts[1]
     ref_price = float(parts[2]) if len(parts) > 2 else None
     symbol = symbol.upper()
     accum: float = 0.0  # negative if falling, positive if rising, 0 if even
-    start_time = datetime.now()
+    start_time = quote_source.now()
     if ref_price:
         print(
             f"{start_time.hour:02}:{start_time.minute:02}:{start_time.second:02}: Computing trend for {symbol}; ref price: {ref_price}; updates every 30 seconds; press ^C to stop")
@@ -231,28 +489,31 @@ def _do_trend(parts: list[str], schwab_auth: SchwabAuth):
         print(
             f"{start_time.hour:02}:{start_time.minute:02}:{start_time.second:02}: Computing trend for {symbol}; updates every 30 seconds; press ^C to stop")
     while True:
-        now = datetime.now()
+        now = quote_source.now()
         try:
-            quotes: dict|None = get_quotes(symbol, schwab_auth)
-            if not quotes:
-                print("Error getting quote, will keep trying")
-            else:
-                reading: float = float(quotes[symbol]['quote']['lastPrice'])
-                if ref_price:
-                    diff: float = ((reading - ref_price) / reading) * 10000
-                    accum += diff
-                    print(
-                        f"{now.hour:02}:{now.minute:02}:{now.second:02}: {symbol}: {reading} ({diff:.2f}); Summary: {accum:.2f}")
-                else:
-                    print(f"{now.hour:02}:{now.minute:02}:{now.second:02}: {symbol}: {reading}")
-
-                # Setup next loop
-                ref_price = reading
-            time.sleep(30)
-        except KeyboardInterrupt:
+            ref_price, accum = _update_trend(quote_source, symbol, ref_price, accum)
+            quote_source.sleep(30)
+        except (KeyboardInterrupt, ReplayFinished):
             break
     print(f"{now.hour:02}:{now.minute:02}:{now.second:02}:  {symbol} Final summary: {accum:.2f}")
 
+def _update_trend(quote_source: QuoteSource, symbol: str, ref_price: float|None, accum: float) -> tuple[float|None, float]:
+    """ Show the latest price relative to ref_price; returns the next reference price and the updated summary """
+    now = quote_source.now()
+    quotes: dict|None = quote_source.get_quotes(symbol)
+    if not quotes:
+        print("Error getting quote, will keep trying")
+        return ref_price, accum
+    reading: float = float(quotes[symbol]['quote']['lastPrice'])
+    if ref_price:
+        diff: float = ((reading - ref_price) / reading) * 10000
+        accum += diff
+        print(
+            f"{now.hour:02}:{now.minute:02}:{now.second:02}: {symbol}: {reading} ({diff:.2f}); Summary: {accum:.2f}")
+    else:
+        print(f"{now.hour:02}:{now.minute:02}:{now.second:02}: {symbol}: {reading}")
+    return reading, accum
+
 def _do_buylow(parts: list[str], schwab_auth: SchwabAuth):
     symbol = parts[1]
     numshares = int(parts[2])
@@ -260,7 +521,7 @@ def _do_buylow(parts: list[str], schwab_auth: SchwabAuth):
     extreme = float(parts[4]) if len(parts) > 4 else NO_EXTREME
     limit = float(parts[5]) if len(parts) > 5 else NO_LIMIT
     try:
-        _buylow_sellhigh(schwab_auth, True, symbol, numshares, change_or_percent_change, extreme, limit)
+        _buylow_sellhigh(schwab_auth, _get_quote_source(schwab_auth), True, symbol, numshares, change_or_percent_change, extreme, limit)
     except Exception as e:
         print(e)
 
@@ -271,7 +532,7 @@ def _do_sellhigh(parts: list[str], schwab_auth: SchwabAuth):
     extreme = float(parts[4]) if len(parts) > 4 else NO_EXTREME
     limit = float(parts[5]) if len(parts) > 5 else NO_LIMIT
     try:
-        _buylow_sellhigh(schwab_auth, False, symbol, numshares, change_or_percent_change, extreme, limit)
+        _buylow_sellhigh(schwab_auth, _get_quote_source(schwab_auth), False, symbol, numshares, change_or_percent_change, extreme, limit)
     except Exception as e:
         print(e)
 
@@ -281,7 +542,7 @@ def _do_breakout(parts: list[str], schwab_auth: SchwabAuth):
         numshares = int(parts[2])
         low_target = float(parts[3])
         high_target = float(parts[4])
-        enter_position(schwab_auth, symbol, numshares, low_target, high_target, breakout=True)
+        enter_position(schwab_auth, _get_quote_source(schwab_auth), symbol, numshares, low_target, high_target, breakout=True)
     except Exception as e:
         print(e)
 
@@ -291,18 +552,178 @@ def _do_oscillate(parts: list[str], schwab_auth: SchwabAuth):
         numshares = int(parts[2])
         low_target = float(parts[3])
         high_target = float(parts[4])
-        enter_position(schwab_auth, symbol, numshares, low_target, high_target, breakout=False)
+        enter_position(schwab_auth, _get_quote_source(schwab_auth), symbol, numshares, low_target, high_target, breakout=False)
     except Exception as e:
         print(e)
 
+def _do_strat(parts: list[str], schwab_auth: SchwabAuth):
+    action: str = parts[1] if len(parts) > 1 else "list"
+    if action == "add":
+        try:
+            strategy: Strategy|None = _make_strategy(parts[2:])
+        except (IndexError, ValueError):
+            print(f"Error:  Invalid strategy: {' '.join(parts[2:])}")
+            return
+        if not strategy:
+            print(f"Error:  Can't run {parts[2]} in the strategy engine")
+            return
+        get_strategy_engine(_get_quote_source(schwab_auth)).add(strategy)
+        print(f"[{strategy.id}] {strategy.describe()}")
+        return
+
+    engine: StrategyEngine|None = get_active_engine()
+    if action == "cancel":
+        if not engine:
+            print("Error:  No strategies are running")
+            return
+        ids: list[int] = [strategy.id for strategy in engine.strategies()] if parts[2] == "all" else [int(parts[2])]
+        for strategy_id in ids:
+            if not engine.cancel(strategy_id):
+                print(f"Error:  No such strategy: {strategy_id}")
+    if not engine or not engine.strategies():
+        print("No strategies")
+        return
+    for strategy in engine.strategies():
+        last: str = f"{strategy.last:.2f}" if strategy.last is not None else "-"
+        print(f"[{strategy.id}] {strategy.state}: {strategy.describe()}; last {last}; {strategy.quotes} quotes")
+    print(f"{engine.quote_requests} quote requests ({engine.quote_errors} failed)")
+
+def _make_strategy(args: list[str]) -> Strategy|None:
+    """ Strategy instance from a buylow/sellhigh/breakout/oscillate command line """
+    name: str = args[0]
+    if name in ("buylow", "sellhigh"):
+        return BuyLowSellHigh(name == "buylow", args[1], int(args[2]), args[3],
+                              float(args[4]) if len(args) > 4 else NO_EXTREME,
+                              float(args[5]) if len(args) > 5 else NO_LIMIT)
+    if name in ("breakout", "oscillate"):
+        return EnterPosition(args[1], int(args[2]), float(args[3]), float(args[4]), breakout=name == "breakout")
+    return None
+
+def _do_every(parts: list[str], schwab_auth: SchwabAuth):
+    _start_job(float(parts[1]), parts[2:], schwab_auth)
+
+def _do_jobs(parts: list[str]):
+    scheduler: JobScheduler|None = get_active_scheduler()
+    if not scheduler or not scheduler.jobs():
+        print("No jobs")
+        return
+    for job in scheduler.jobs():
+        last_run: str = job.last_run.strftime('%X') if job.last_run else "not yet"
+        print(f"[{job.id}] every {job.interval:g}s: {job.command}; {job.runs} runs ({job.errors} failed); last run {last_run}")
+
+def _do_kill(parts: list[str]):
+    scheduler: JobScheduler|None = get_active_scheduler()
+    if not scheduler:
+        print("Error:  No jobs are running")
+        return
+    job_ids: list[int] = [job.id for job in scheduler.jobs()] if parts[1] == "all" else [int(parts[1])]
+    for job_id in job_ids:
+        job: Job|None = scheduler.kill(job_id)
+        print(f"[{job_id}] killed: {job.command}" if job else f"Error:  No such job: {job_id}")
+
+def _do_stats(parts: list[str]):
+    option: str = parts[1] if len(parts) > 1 else ""
+    if option == "reset":
+        get_metrics().reset()
+        get_quote_cache().reset_stats()
+    elif option == "file":
+        start_metrics_file(parts[2] if len(parts) > 2 else METRICS_FILE)
+    elif option == "serve":
+        start_metrics_server(int(parts[2]) if len(parts) > 2 else METRICS_PORT)
+    elif option:
+        print(f"Error:  Unknown option: {option}")
+        return
+
+    endpoints: dict[str, EndpointStats] = get_metrics().endpoints()
+    print(f"Requests since {datetime.fromtimestamp(get_metrics().started_at).strftime('%X')}:")
+    print(f"  {'endpoint':<60} {'count':>6} {'errors':>6} {'mean ms':>8} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} "
+          f"{'KB sent':>8} {'KB recv':>8}  statuses")
+    for endpoint, stats in endpoints.items():
+        statuses: str = ", ".join(f"{status}: {count}" for status, count in sorted(stats.statuses.items()))
+        print(f"  {endpoint:<60} {stats.count:>6} {stats.errors:>6} {stats.total_seconds / stats.count * 1000:>8.1f} "
+              f"{stats.quantile(0.5) * 1000:>7.1f} {stats.quantile(0.95) * 1000:>7.1f} {stats.quantile(0.99) * 1000:>7.1f} "
+              f"{stats.bytes_sent / 1024:>8.1f} {stats.bytes_received / 1024:>8.1f}  {statuses}")
+    if not endpoints:
+        print("  none")
+    cache: dict = get_quote_cache().stats()
+    print(f"Quote cache: {cache['size']} quotes; {cache['hits']} hits, {cache['misses']} misses "
+          f"({cache['coalesced']} coalesced), {cache['evictions']} evictions")
+    if get_metrics_file():
+        print(f"Writing metrics to: {get_metrics_file()}")
+    if get_metrics_server():
+        host, port = get_metrics_server().server_address[:2]
+        print(f"Serving metrics at: http://{host}:{port}/metrics")
+
+def _do_profile(parts: list[str], schwab_auth: SchwabAuth):
+    command: list[str] = parts[1:]
+    mode: str = CPROFILE
+    if command and command[0] == SAMPLE:
+        mode = SAMPLE
+        command = command[1:]
+    iterations: int|None = None
+    if command and command[0].isdigit():
+        iterations = int(command[0])
+        command = command[1:]
+    if not command:
+        print("Error:  No command to profile")
+        return
+    profile_command(lambda: exec_command(command[0], command, schwab_auth), command[0], mode, iterations)
+
+def _do_trace(parts: list[str]):
+    if len(parts) > 1 and parts[1] == "on":
+        options: list[str] = parts[2:]
+        otlp: bool = "otlp" in options
+        filenames: list[str] = [option for option in options if option != "otlp"]
+        start_tracing(filenames[0] if filenames else TRACES_FILENAME, otlp)
+    elif len(parts) > 1 and parts[1] == "off":
+        stop_tracing()
+    tracer: Tracer|None = get_tracer()
+    if not tracer:
+        print("Tracing: off")
+    else:
+        print(f"Tracing: on ({tracer.traces} traces written to {tracer.filename}{' in OTLP/JSON' if tracer.otlp else ''})")
+
+def _start_job(seconds: float, parts: list[str], schwab_auth: SchwabAuth):
+    """ Run the command in parts every `seconds` as a background job """
+    job_function: tuple[Callable[[], None], list[str]]|None = _job_function(parts, schwab_auth)
+    if not job_function:
+        print(f"Error:  Can't repeat {' '.join(parts)}")
+        return
+    function, symbols = job_function
+    job: Job = get_job_scheduler(schwab_auth).add(' '.join(parts), seconds, function, symbols)
+    print(f"[{job.id}] every {seconds:g}s: {job.command}; 'kill {job.id}' stops it")
+
+def _job_function(parts: list[str], schwab_auth: SchwabAuth) -> tuple[Callable[[], None], list[str]]|None:
+    """ Function running the command once, and the symbols it quotes (fetched together with other due jobs' symbols) """
+    cmd_name: str = parts[0] if parts else ""
+    if cmd_name == "quote":
+        return (lambda: _do_quote(parts, schwab_auth)), normalize_symbols(' '.join(parts[1:]))
+    if cmd_name == "bal":
+        return (lambda: _show_bal(schwab_auth, brief=True)), []
+    if cmd_name == "pos":
+        symbols_str: str = parts[1].strip().upper() if len(parts) > 1 else ""
+        return (lambda: show_pos(symbols_str, schwab_auth)), normalize_symbols(symbols_str)
+    if cmd_name == "refport":
+        return (lambda: _show_reference_port(schwab_auth)), list(_reference_portfolio)
+    if cmd_name == "trend":
+        symbol: str = parts[1].upper()
+        trend: dict = {"ref_price": float(parts[2]) if len(parts) > 2 else None, "accum": 0.0}
+        def update_trend():
+            trend["ref_price"], trend["accum"] = _update_trend(_get_quote_source(schwab_auth), symbol,
+                                                               trend["ref_price"], trend["accum"])
+        return update_trend, [symbol]
+    return None
+
 def _do_trans(parts: list[str], schwab_auth: SchwabAuth):
     """"
     Show transactions for specified symbols occurring with specified day.
     Show transactions formed into groups denoted when position was entered and exited.
     """
+    from transactions import (find_transaction_groups, dump_transaction_groups)
+    _set_locale()
     symbols: list[str] = parts[1].strip().upper().split(',')
     days_ago: int = int(parts[2]) if len(parts) > 2 else 0
-    start_date = datetime.now(get_localzone()).replace(hour=0, minute=0, second=0) - timedelta(days=days_ago)
+    start_date = datetime.now(local_timezone()).replace(hour=0, minute=0, second=0) - timedelta(days=days_ago)
     end_date = start_date.replace(hour=23, minute=59, second=59)
     print(f"{"/".join(symbols)}:  {start_date.strftime('%a %m/%d/%y')} - {end_date.strftime('%a %m/%d/%y')}")
     print("")
@@ -318,10 +739,29 @@ def _do_trans(parts: list[str], schwab_auth: SchwabAuth):
 
 #####
 
-def _buylow_sellhigh(schwab_auth, islow: bool, symbol: str, numshares: int, change_or_percent_change: str,
-                    known_extreme: float, limit: float) -> None:
+def _set_locale():
+    """ Set the locale for currency formatting """
+    global _locale_set
+    if not _locale_set:
+        locale.setlocale(locale.LC_ALL, "en_US")
+        _locale_set = True
+
+def _get_quote_source(schwab_auth: SchwabAuth) -> QuoteSource:
+    """ The replay being run, else streaming quotes if turned on, else polling """
+    from schwab_streamer import (get_active_streamer)
+    replay_source: ReplayQuoteSource|None = _replay_source.get()
+    if replay_source:
+        return replay_source
+    streamer: "SchwabStreamer|None" = get_active_streamer()
+    if streamer:
+        return StreamingQuoteSource(schwab_auth, streamer)
+    return PollingQuoteSource(schwab_auth)
+
+def _buylow_sellhigh(schwab_auth, quote_source: QuoteSource, islow: bool, symbol: str, numshares: int,
+                     change_or_percent_change: str, known_extreme: float, limit: float) -> None:
     """
     :param schwab_auth:
+    :param quote_source: Where prices come from (and where orders go), e.g. live polling or a replay
     :param islow: True if buying low, False if selling high
     :param symbol: Symbol to buy or sell
     :param numshares: Number of shares to buy or sell
@@ -331,71 +771,25 @@ def _buylow_sellhigh(schwab_auth, islow: bool, symbol: str, numshares: int, chan
     :return:
     """
 
-    def mock_quoter(mock_symbol: str):
-        """Return the next test quote each time.  Throws StopIteration when no more quotes."""
-        test_quotes = [
-            (0, 78.22),
-            (78.22, 78.23),
-            (78.23, 78.24),
-            (78.23, 78.23),
-            (78.23, 78.25),
-            (78.25, 78.26),
-            (78.26, 78.26),
-            (78.26, 78.2),
-        ]
-        test_quotes_down = [
-            (0, 78.22),
-            (78.22, 78.23),
-            (78.23, 78.23),
-            (78.23, 78.22),
-            (78.23, 78.22),
-            (78.23, 78.22),
-            (78.22, 78.22),
-            (78.22, 78.22),
-        ]
-
-        for quote in test_quotes_down:
-            yield {
-                mock_symbol: {
-                    'quote': {
-                        'extremePrice': quote[0],
-
-                        'lastPrice': quote[1],
-                        'askPrice': quote[1],
-                        'bidPrice': quote[1],
-                    }
-                }
-            }
-
     symbol = symbol.upper()
     hold_extreme = known_extreme if known_extreme != NO_EXTREME else None
     extreme = hold_extreme if hold_extreme else sys.float_info.max if islow else 0
-    time_extreme = datetime.now() if hold_extreme else None
+    time_extreme = quote_source.now() if hold_extreme else None
     target_change: float | None = None if change_or_percent_change.endswith('%') else float(change_or_percent_change)
     print_count = 1
-    mock: bool = False  # set to True if using mock_quoter
 
     if islow:
         print(f'Buying low {symbol} {numshares} (limit={limit})')
     else:
         print(f'Selling high {symbol} {numshares} (limit={limit})')
 
-    if mock:
-        mock_quoter = mock_quoter(symbol)
-
     while True:
         # Get current price
-        if mock:
-            try:
-                quotes: dict = next(mock_quoter)
-            except StopIteration:
-                break
-        else:
-            quotes: dict|None = get_quotes(symbol, schwab_auth)
+        quotes: dict|None = quote_source.get_quotes(symbol)
 
         if not quotes:
             print("Error getting quote, retrying...")
-            time.sleep(2)
+            quote_source.sleep(2)
             continue
 
         q = quotes[symbol]['quote']
@@ -409,11 +803,10 @@ def _buylow_sellhigh(schwab_auth, islow: bool, symbol: str, numshares: int, chan
 
         # Init target_change now that we have a quote and can calculate from desired percentage
         if not target_change:
-            target_change_percent: float = float(change_or_percent_change[:-1])
-            target_change = last * target_change_percent
+            target_change = parse_target_change(change_or_percent_change, last)
 
         # Update extremes if current price exceeds
-        now = datetime.now()
+        now = quote_source.now()
         if hold_extreme:
             if islow:
                 if ask >= hold_extreme:  # current price validates hold_extreme (it isn't a one-off)
@@ -448,16 +841,16 @@ def _buylow_sellhigh(schwab_auth, islow: bool, symbol: str, numshares: int, chan
                 line = f'{instruction} {symbol} {numshares}'
                 print(line)
                 # process_line(line, schwab_auth)
-                resp: requests.Response = place_order(schwab_auth, instruction, symbol, numshares)
+                result: OrderResult = quote_source.place_order(instruction, symbol, numshares)
+                resp: requests.Response = result.response
                 print(resp.text if resp.text else "OK" if resp.ok else "Error placing buy order")
+                if result.timings:
+                    print(f"Order timings: {result.format_timings()}")
             return
 
-        if mock:
-            assert not extreme or q['extremePrice'] == extreme
-
         # Compute if target price is hit
         target = extreme + target_change if islow else extreme - target_change
-        now = datetime.now()
+        now = quote_source.now()
         if islow:
             print(
                 f'{print_count}: {now.hour:02}:{now.minute:02}:{now.second:02}: {symbol}; Hold extreme: {hold_extreme:.2f}; Extreme ASK: {extreme:.2f}; Ask: {ask}; '
@@ -477,8 +870,11 @@ def _buylow_sellhigh(schwab_auth, islow: bool, symbol: str, numshares: int, chan
                     # line = f'b {symbol} {numshares} {bid}'
                     line = f'b {symbol} {numshares}'
                     print(line)
-                    resp: requests.Response = place_order(schwab_auth, 'b', symbol, numshares, None)
+                    result: OrderResult = quote_source.place_order('b', symbol, numshares, None)
+                    resp: requests.Response = result.response
                     print(resp.text if resp.text else "OK" if resp.ok else "Error placing buy order")
+                    if result.timings:
+                        print(f"Order timings: {result.format_timings()}")
                     if resp.ok and not resp.text:
                         # Stock has been bought, set Stop
                         limit = bid - target_change if limit == 0 else limit
@@ -486,18 +882,21 @@ def _buylow_sellhigh(schwab_auth, islow: bool, symbol: str, numshares: int, chan
                             limit = round(limit, 2)
                             line = f'ss {symbol} {numshares} {limit}'
 
-                            time.sleep(5)
+                            quote_source.sleep(STOP_DELAY_SECONDS)
                             print(line)
 
-                            resp: requests.Response = place_order(schwab_auth, 'ss', symbol, numshares, limit)
+                            resp: requests.Response = quote_source.place_order('ss', symbol, numshares, limit).response
                             print(resp.text if resp.text else "OK" if resp.ok else "Error placing sell stop order")
                 else:
                     # Sell the stock
                     # line = f's {symbol} {numshares} {bid}'
                     line = f's {symbol} {numshares}'
                     print(line)
-                    resp: requests.Response = place_order(schwab_auth, 's', symbol, numshares, None)
+                    result: OrderResult = quote_source.place_order('s', symbol, numshares, None)
+                    resp: requests.Response = result.response
                     print(resp.text if resp.text else "OK" if resp.ok else "Error placing sell order")
+                    if result.timings:
+                        print(f"Order timings: {result.format_timings()}")
                     if resp.ok and not resp.text:
                         # Stock has been sold, set Stop
                         limit = bid + target_change if limit == 0 else limit
@@ -505,10 +904,10 @@ def _buylow_sellhigh(schwab_auth, islow: bool, symbol: str, numshares: int, chan
                             limit = round(limit, 2)
                             line = f'bs {symbol} {numshares} {limit}'
 
-                            time.sleep(5)
+                            quote_source.sleep(STOP_DELAY_SECONDS)
                             print(line)
 
-                            resp: requests.Response = place_order(schwab_auth, 'bs', symbol, numshares, limit)
+                            resp: requests.Response = quote_source.place_order('bs', symbol, numshares, limit).response
                             print(resp.text if resp.text else "OK" if resp.ok else "Error placing buy stop order")
             except Exception as e:
                 print(e)
@@ -520,19 +919,20 @@ def _buylow_sellhigh(schwab_auth, islow: bool, symbol: str, numshares: int, chan
             extreme = sys.float_info.max if islow else 0
 
         print_count += 1
-        time.sleep(1)
+        quote_source.wait_for_price_change(symbol, 1)
 
 
-def enter_position(schwab_auth, symbol: str, numshares: int, low_target: float, high_target: float, breakout: bool):
+def enter_position(schwab_auth, quote_source: QuoteSource, symbol: str, numshares: int, low_target: float,
+                   high_target: float, breakout: bool):
     symbol = symbol.upper()
-    start_time = datetime.now()
+    start_time = quote_source.now()
     print(
         f"{start_time.hour:02}:{start_time.minute:02}:{start_time.second:02}: Waiting to enter position for {symbol} {numshares}")
     print_count = 1
     target_hit: bool = False
     while not target_hit:
-        now = datetime.now()
-        quotes: dict|None = get_quotes(symbol, schwab_auth)
+        now = quote_source.now()
+        quotes: dict|None = quote_source.get_quotes(symbol)
         if not quotes:
             print("Error getting quote, retrying...")
         else:
@@ -549,81 +949,93 @@ def enter_position(schwab_auth, symbol: str, numshares: int, low_target: float,
 
                 print(
                     f'{"Breakout" if breakout else "Oscillate"} target met; placing order with instruction: {instruction}...')
-                resp: requests.Response = place_order(schwab_auth, instruction, symbol, numshares)
+                result: OrderResult = quote_source.place_order(instruction, symbol, numshares)
+                resp: requests.Response = result.response
                 print(
                     resp.text if resp.text else "OK" if resp.ok else f"Error placing order with instruction: {instruction}")
+                if result.timings:
+                    print(f"Order timings: {result.format_timings()}")
             print_count += 1
-        time.sleep(1)
+        if not target_hit:
+            quote_source.wait_for_price_change(symbol, 1)
 
 def show_pos(symbols_str: str, schwab_auth: SchwabAuth):
-    resp: requests.Response = get_account_positions(schwab_auth)
-    if not resp.ok:
+    batch: QuoteBatch|None = None
+    if symbols_str:
+        # Symbols are known up front, so fetch positions and quotes concurrently
+        import asyncio
+        import schwab_api_async
+        snapshot, batch = asyncio.run(schwab_api_async.gather(schwab_api_async.get_account_snapshot(schwab_auth),
+                                                              schwab_api_async.get_quotes_batch(symbols_str, schwab_auth)))
+    else:
+        snapshot: AccountSnapshot|None = get_account_snapshot(schwab_auth)
+    if not snapshot:
         print(f"Error getting positions")
         return
-    account_positions = json.loads(resp.text)
-    positions: list = account_positions[0]["securitiesAccount"].get("positions")
+    positions: dict[str, Position] = snapshot.positions
     if not positions:
         print(f"No open positions")
         return
 
     if not symbols_str:  # fill with all account positions
-        symbols_str = ','.join([p["instrument"]["symbol"] for p in positions])
+        symbols_str = ','.join(positions.keys())
+        batch = get_quotes_batch(symbols_str, schwab_auth)
 
-    quotes: dict = {}
-    if symbols_str:
-        quotes = get_quotes(symbols_str, schwab_auth)
-        if not quotes:
-            print("Error getting quotes")
-            return
-
-    total_gain_loss: float = 0.0
-    symbols: list[str] = symbols_str.split(',') if symbols_str else []
-    num_printed: int = 0
-
-    for p in positions:
-        symbol = p["instrument"]["symbol"]
-        quantity: int = int(p["longQuantity"]) - int(p["shortQuantity"])
-        average_price: float = float(p["averageLongPrice"]) if "averageLongPrice" in p else float(
-            p["averageShortPrice"])
-        if symbols:  # specific stocks specified
-            if symbol in symbols and quantity != 0:
-                # Try to show quote for specified stock
-                quote = quotes.get(symbol)
-                if quote:
-                    last_price: float = quote["quote"]["lastPrice"]
-                    gain_loss = float(quantity * (last_price - average_price))
-                    total_gain_loss += gain_loss
-                    print(f"{symbol}: {quantity} @ {average_price} ({last_price}); gain/loss: {gain_loss:.2f}")
-                    num_printed += 1
-                else:
-                    print(f"{symbol}:  Unable to retrieve quote (is symbol misspelled?)")
-                    num_printed += 1
-        else:  # no specific stocks specified ==> show all stocks which have positions
-            # Show position only
-            print(f"{symbol}: {quantity} @ {average_price}")
-            num_printed += 1
-    if num_printed > 1 and abs(total_gain_loss) > 0.0:
-        print("----")
-        print(f"Total gain/loss: {total_gain_loss:,.2f}")
-        print()
-    elif num_printed == 0:
-        print(f"No open positions")
-        print()
+    if not batch:
+        print("Error getting quotes")
+        return
+    quotes: dict = batch.quotes
+
+    with span("format", lines=len(positions)):
+        total_gain_loss: float = 0.0
+        symbols: list[str] = symbols_str.split(',') if symbols_str else []
+        num_printed: int = 0
+
+        for p in positions.values():
+            symbol = p.symbol
+            quantity: int = p.quantity
+            average_price: float = p.average_price
+            if symbols:  # specific stocks specified
+                if symbol in symbols and quantity != 0:
+                    # Try to show quote for specified stock
+                    quote = quotes.get(symbol)
+                    if quote:
+                        last_price: float = quote["quote"]["lastPrice"]
+                        gain_loss = float(quantity * (last_price - average_price))
+                        total_gain_loss += gain_loss
+                        print(f"{symbol}: {quantity} @ {average_price} ({last_price}); gain/loss: {gain_loss:.2f}")
+                        num_printed += 1
+                    else:
+                        print(f"{symbol}:  Unable to retrieve quote (is symbol misspelled?)")
+                        num_printed += 1
+            else:  # no specific stocks specified ==> show all stocks which have positions
+                # Show position only
+                print(f"{symbol}: {quantity} @ {average_price}")
+                num_printed += 1
+        if num_printed > 1 and abs(total_gain_loss) > 0.0:
+            print("----")
+            print(f"Total gain/loss: {total_gain_loss:,.2f}")
+            print()
+        elif num_printed == 0:
+            print(f"No open positions")
+            print()
 
 
 #####
 
 def _do_flatten(parts: list[str], schwab_auth: SchwabAuth):
-    resp: requests.Response = get_account_positions(schwab_auth)
-    if not resp.ok:
+    if get_selected_account() == ALL_ACCOUNTS:
+        print("Error:  flatten places orders in a single account; select one with 'acct' first")
+        return
+    # Always fresh:  fills we didn't cause (e.g. stops) change the quantities to sell or cover
+    snapshot: AccountSnapshot|None = get_account_snapshot(schwab_auth, max_age=0)
+    if not snapshot:
         print(f"Error getting positions")
         return
 
-    account_positions = json.loads(resp.text)
-    positions: list = account_positions[0]["securitiesAccount"]["positions"]
-    for p in positions:
-        symbol = p["instrument"]["symbol"]
-        quantity: int = int(p["longQuantity"]) - int(p["shortQuantity"])
+    for p in list(snapshot.positions.values()):
+        symbol = p.symbol
+        quantity: int = p.quantity
         instruction = 's' if quantity > 0 else 'b'
         quantity = abs(quantity)
         resp: requests.Response = place_order(schwab_auth, instruction, symbol, quantity)
@@ -644,13 +1056,14 @@ def _do_code(parts: list[str], schwab_auth: SchwabAuth):
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
+_reference_portfolio = {
+    "IBIT": (10, 49.57),
+    "RDDT": (1, 132.94),
+    "UPRO": (10, 77.59),
+    "NVDA": (-5, 109.00),
+}
+
 def _do_reference_port(parts: list[str], schwab_auth: SchwabAuth):
-    portfolio = {
-        "IBIT": (10, 49.57),
-        "RDDT": (1, 132.94),
-        "UPRO": (10, 77.59),
-        "NVDA": (-5, 109.00),
-    }
 
 
     '''
@@ -662,36 +1075,37 @@ def _do_reference_port(parts: list[str], schwab_auth: SchwabAuth):
     }
     '''
 
-    symbols = ",".join(portfolio.keys())
     seconds: int = int(parts[1]) if len(parts) > 1 else 0
-    while True:
-        try:
-            quotes = get_quotes(symbols, schwab_auth)
-            if not quotes:
-                print("Error getting quotes")
-                return
-            total_net = 0.0
-            total_flattened_net = 0.0
-            if seconds:
-                now = datetime.now()
-                print(f"{now.hour:02}:{now.minute:02}:{now.second:02}")
-            for symbol, value in portfolio.items():
-                price = quotes[symbol]["quote"]["lastPrice"]
-                quantity = value[0]
-                flattened_price = value[1]
-                net = quantity * price
-                flattened_net = quantity * flattened_price
-                total_net += net
-                total_flattened_net += flattened_net
-                print(f"{symbol}: {quantity} @ {flattened_price:,.2f} (Current: {price:,.2f}) = {(flattened_net - net):,.2f}")
-            print("----")
-            print(f"Net value of equities: {total_flattened_net:,.2f} (Current: {total_net:,.2f}) = {(total_flattened_net - total_net):,.2f}")
-            print()
-            if not seconds:
-                break
-            time.sleep(seconds)
-        except KeyboardInterrupt:
-            break
+    if seconds:
+        _start_job(seconds, ["refport"], schwab_auth)
+    else:
+        _show_reference_port(schwab_auth)
+
+def _show_reference_port(schwab_auth: SchwabAuth):
+    portfolio: dict = _reference_portfolio
+    batch: QuoteBatch|None = get_quotes_batch(",".join(portfolio.keys()), schwab_auth)
+    if not batch:
+        print("Error getting quotes")
+        return
+    if batch.missing:
+        print(f"Unable to retrieve quotes for: {', '.join(batch.missing)}")
+    quotes: dict = batch.quotes
+    total_net = 0.0
+    total_flattened_net = 0.0
+    for symbol, value in portfolio.items():
+        if symbol not in quotes:
+            continue
+        price = quotes[symbol]["quote"]["lastPrice"]
+        quantity = value[0]
+        flattened_price = value[1]
+        net = quantity * price
+        flattened_net = quantity * flattened_price
+        total_net += net
+        total_flattened_net += flattened_net
+        print(f"{symbol}: {quantity} @ {flattened_price:,.2f} (Current: {price:,.2f}) = {(flattened_net - net):,.2f}")
+    print("----")
+    print(f"Net value of equities: {total_flattened_net:,.2f} (Current: {total_net:,.2f}) = {(total_flattened_net - total_net):,.2f}")
+    print()
 
 
 def _do_buyport(parts: list[str], schwab_auth: SchwabAuth):
@@ -0,0 +1,172 @@
+import contextvars
+import io
+import os
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+from typing import (BinaryIO)
+
+
+# Resident daemon that keeps a warm SchwabAuth, connection pool, account map and caches, so scripted one-shot commands
+# cost a local IPC hop plus one API round trip instead of a new process, auth.json load and TLS handshakes.
+#   python daemon.py serve            -- run the daemon (in the directory with auth.json and .env)
+#   python daemon.py quote AAPL       -- run one command in the daemon, streaming its output back
+#   python daemon.py                  -- enter commands at a prompt, each run in the daemon
+# Each command is one connection to a Unix domain socket:  the client sends the command line, the daemon streams what
+# the command prints (in any thread it hands work to) back until the command finishes, then closes the connection.
+# Clients are served in parallel, each command on its own thread.  Closing the client (e.g. ^C) stops a command that
+# prints, such as 'trend', at its next print.  Background jobs (e.g. 'pos 10') print in the daemon's terminal.
+# The socket is only accessible by its owner, as its commands can place orders.
+# This module imports only the standard library until the daemon is started, so the client starts quickly.
+# Status:  Beta
+
+
+DAEMON_SOCKET = os.environ.get("SCHWAB_CLI_SOCKET", "schwab_cli.sock")
+RECEIVE_SIZE = 65536
+
+
+class _DaemonOutput(io.TextIOBase):
+    """ Stands in for sys.stdout:  what a client's command prints goes to that client, the rest to the terminal """
+    def __init__(self, stdout):
+        self.stdout = stdout
+
+    def write(self, s: str) -> int:
+        client: BinaryIO | None = _client_output.get()
+        if client is None:
+            return self.stdout.write(s)
+        client.write(s.encode())
+        return len(s)
+
+    def flush(self):
+        if _client_output.get() is None:
+            self.stdout.flush()
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        from schwab_cli import (process_line)
+        from commands import (show_help)
+        from schwab_api import (pin_selected_account)
+        line: str = self.rfile.readline().decode().strip()
+        _client_output.set(self.wfile)  # this thread (and the threads it submits work to) only serves this client
+        pin_selected_account()  # another client's 'acct' applies to its later commands, not to this one
+        try:
+            if not line:
+                show_help()
+            else:
+                process_line(line, self.server.schwab_auth)
+        except SystemExit:  # 'q' ends the client's session, not the daemon
+            pass
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client went away
+        except Exception as e:
+            traceback.print_exc(file=sys.__stderr__)
+            try:
+                print(f"Error:  {type(e).__name__}: {e}")
+            except OSError:
+                pass
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, schwab_auth):
+        self.schwab_auth = schwab_auth
+        # Owner-only access:  anyone who can connect can trade
+        umask: int = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _CommandHandler)
+        finally:
+            os.umask(umask)
+
+
+def serve(socket_path: str = DAEMON_SOCKET):
+    """ Run the daemon until interrupted """
+    if os.path.exists(socket_path):
+        if _is_listening(socket_path):
+            print(f"Error:  A daemon is already running on {socket_path}")
+            return
+        os.unlink(socket_path)  # left by a daemon that didn't exit cleanly
+
+    from schwab_auth import (SchwabAuth)
+    from schwab_api import (get_account_snapshot, get_my_account_number)
+    from schwab_cli import (InitSchwabAuth)
+    schwab_auth: SchwabAuth | None = InitSchwabAuth()
+    if not schwab_auth:
+        return
+
+    # Warm up:  token, account map, and a pooled connection
+    print(f"Refresh token expected expiration:  {schwab_auth.refresh_token_expected_expiration_time()}")
+    schwab_auth.headers()
+    get_my_account_number(schwab_auth)
+    get_account_snapshot(schwab_auth)
+
+    sys.stdout = _DaemonOutput(sys.stdout)
+    server = DaemonServer(socket_path, schwab_auth)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # e.g. kill:  remove the socket too
+    print(f"Serving commands on {socket_path}; press ^C to stop")
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+
+
+def send_command(line: str, socket_path: str = DAEMON_SOCKET) -> bool:
+    """ Run a command line in the daemon, streaming its output to stdout; False if the daemon isn't running """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+        sock.sendall(f"{line.strip()}\n".encode())
+        while chunk := sock.recv(RECEIVE_SIZE):
+            sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
+    return True
+
+
+def _is_listening(socket_path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+            return True
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+
+
+def _client(initial_line: str | None):
+    not_running: str = f"Error:  The daemon isn't running on {DAEMON_SOCKET}; start it with:  python daemon.py serve"
+    if initial_line:
+        if not send_command(initial_line):
+            print(not_running)
+            sys.exit(1)
+        return
+    while True:
+        print()
+        try:
+            line: str = input("Enter a command (leave blank for help) then press Return> ")
+        except EOFError:
+            print()
+            return
+        if line.strip() == "q":
+            return
+        if not send_command(line):
+            print(not_running)
+
+
+_client_output: contextvars.ContextVar[BinaryIO | None] = contextvars.ContextVar("client_output", default=None)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["serve"]:
+        serve()
+    else:
+        try:
+            _client(" ".join(sys.argv[1:]) or None)
+        except KeyboardInterrupt:
+            print()
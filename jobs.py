@@ -0,0 +1,169 @@
+import io
+import sys
+import threading
+import time
+from concurrent.futures import (ThreadPoolExecutor)
+from dataclasses import (dataclass, field)
+from datetime import (datetime)
+from typing import (Callable)
+
+from schwab_api import (get_quotes)
+from schwab_auth import (SchwabAuth)
+from tracing import (span)
+
+
+# Scheduler for repeating commands (bal, pos, refport, quote, trend) run as background jobs, so the prompt stays free.
+# Jobs that fall due together run together on a thread pool:  the quotes all of them need are fetched first in one
+# request, and the quote cache and account snapshot then serve every job from that one fetch.  What a job prints is
+# collected and printed as one block when it finishes, so the output of jobs running at once doesn't interleave.
+# Status:  Beta
+
+
+JOB_WORKERS = 4
+ALIGN_SECONDS = 0.5     # jobs due within this long of each other are run together, sharing fetched data
+
+
+@dataclass
+class Job:
+    id: int
+    command: str
+    interval: float                 # seconds
+    function: Callable[[], None]    # runs the command once
+    symbols: list[str]              # symbols the command will quote, fetched for all due jobs at once
+    next_run: float = 0.0           # time.monotonic()
+    runs: int = 0
+    errors: int = 0
+    running: bool = False
+    last_run: datetime | None = None
+    killed: bool = field(default=False, repr=False)
+
+
+class _JobOutput(io.TextIOBase):
+    """ Stands in for sys.stdout:  what a job's thread prints goes to that job's buffer, the rest passes through """
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self._local = threading.local()
+
+    def write(self, s: str) -> int:
+        buffer: io.StringIO | None = getattr(self._local, "buffer", None)
+        return (buffer if buffer is not None else self.stdout).write(s)
+
+    def flush(self):
+        self.stdout.flush()
+
+    def capture(self, buffer: io.StringIO | None):
+        self._local.buffer = buffer
+
+
+class JobScheduler:
+    def __init__(self, schwab_auth: SchwabAuth, workers: int = JOB_WORKERS):
+        self.schwab_auth: SchwabAuth = schwab_auth
+        self.quote_requests: int = 0    # prefetches of the due jobs' quotes
+        self._jobs: dict[int, Job] = {}
+        self._next_id: int = 1
+        self._lock = threading.Lock()
+        self._print_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._output: _JobOutput | None = None
+        self._thread: threading.Thread | None = None
+
+    def add(self, command: str, interval: float, function: Callable[[], None], symbols: list[str]) -> Job:
+        with self._lock:
+            job = Job(self._next_id, command, interval, function, symbols, time.monotonic())
+            self._jobs[job.id] = job
+            self._next_id += 1
+        if not self._thread:
+            if not isinstance(sys.stdout, _JobOutput):
+                sys.stdout = _JobOutput(sys.stdout)
+            self._output = sys.stdout
+            self._thread = threading.Thread(target=self._run, name="job-scheduler", daemon=True)
+            self._thread.start()
+        self._wake.set()
+        return job
+
+    def kill(self, job_id: int) -> Job | None:
+        """ Remove a job; a run in progress finishes """
+        with self._lock:
+            job: Job | None = self._jobs.pop(job_id, None)
+            if job:
+                job.killed = True
+            return job
+
+    def jobs(self) -> list[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    #####
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            now: float = time.monotonic()
+            with self._lock:
+                due: list[Job] = [job for job in self._jobs.values()
+                                  if job.next_run <= now + ALIGN_SECONDS and not job.running]
+                for job in due:
+                    job.running = True
+                    job.next_run = max(job.next_run + job.interval, now)  # skip runs missed while busy
+            if due:
+                self._run_due(due)
+            with self._lock:
+                next_runs: list[float] = [job.next_run for job in self._jobs.values() if not job.running]
+            self._wake.wait(max(0.0, min(next_runs) - time.monotonic()) if next_runs else None)
+
+    def _run_due(self, due: list[Job]):
+        symbols: list[str] = list(dict.fromkeys(symbol for job in due for symbol in job.symbols))
+        if symbols:
+            self.quote_requests += 1
+            self._executor.submit(self._prefetch_then_run, symbols, due)
+        else:
+            for job in due:
+                self._executor.submit(self._run_job, job)
+
+    def _prefetch_then_run(self, symbols: list[str], due: list[Job]):
+        try:
+            get_quotes(",".join(symbols), self.schwab_auth, max_age=0)  # the jobs' own get_quotes() are then cached
+        except Exception as e:  # the jobs still run (and report their own errors), so none is left marked running
+            with self._print_lock:
+                self._output.stdout.write(f"Error prefetching quotes for {', '.join(symbols)}:  {e}\n")
+                self._output.stdout.flush()
+        for job in due[1:]:
+            self._executor.submit(self._run_job, job)
+        self._run_job(due[0])
+
+    def _run_job(self, job: Job):
+        buffer = io.StringIO()
+        self._output.capture(buffer)
+        try:
+            with span(f"job {job.command}", job_id=job.id):
+                job.function()
+        except Exception as e:
+            job.errors += 1
+            print(f"Error:  {e}")
+        finally:
+            self._output.capture(None)
+            job.runs += 1
+            job.last_run = datetime.now()
+            job.running = False
+            self._wake.set()
+        if not job.killed:
+            now: datetime = job.last_run
+            with self._print_lock:
+                self._output.stdout.write(f"[{job.id}] {now.hour:02}:{now.minute:02}:{now.second:02}: {job.command}\n"
+                                          f"{buffer.getvalue()}")
+                self._output.stdout.flush()
+
+
+_scheduler: JobScheduler | None = None  # Access with get_job_scheduler()
+
+
+def get_job_scheduler(schwab_auth: SchwabAuth) -> JobScheduler:
+    global _scheduler
+    if not _scheduler:
+        _scheduler = JobScheduler(schwab_auth)
+    return _scheduler
+
+
+def get_active_scheduler() -> JobScheduler | None:
+    return _scheduler
@@ -0,0 +1,206 @@
+import os
+import re
+import threading
+import time
+from collections import (Counter)
+from dataclasses import (dataclass, field)
+from typing import (TYPE_CHECKING)
+from urllib.parse import (urlparse)
+
+if TYPE_CHECKING:
+    from http.server import (ThreadingHTTPServer)
+
+
+# Latency histograms, byte counts and status code counts of every Schwab API request (including token refreshes),
+# per endpoint.  Shown by the 'stats' command, and exportable in the Prometheus text format, either to a file
+# rewritten periodically (for node_exporter's textfile collector) or from a /metrics HTTP endpoint.
+# Status:  Beta
+
+
+# Upper bounds in seconds (the last bucket is +Inf); fine around typical round trips, so the quantiles are close
+LATENCY_BUCKETS = (0.0025, 0.005, 0.0075, 0.01, 0.015, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+METRICS_FILE_INTERVAL = 15  # seconds between rewrites of the metrics file
+METRICS_FILE = "metrics.prom"   # default for 'stats file'
+METRICS_PORT = 9464             # default for 'stats serve'
+ERROR_STATUS = "error"      # status of a request that got no response, e.g. a timeout
+
+
+@dataclass
+class EndpointStats:
+    bucket_counts: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    count: int = 0
+    total_seconds: float = 0.0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    statuses: Counter = field(default_factory=Counter)  # e.g. "200" -> count
+
+    def observe(self, status: str, seconds: float, bytes_sent: int, bytes_received: int):
+        i: int = 0
+        while i < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[i]:
+            i += 1
+        self.bucket_counts[i] += 1
+        self.count += 1
+        self.total_seconds += seconds
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+        self.statuses[status] += 1
+
+    @property
+    def errors(self) -> int:
+        """ Requests that got no response, or a 4xx/5xx response """
+        return sum(count for status, count in self.statuses.items() if status == ERROR_STATUS or status >= "400")
+
+    def quantile(self, q: float) -> float:
+        """ Estimate of the q quantile (0..1) of the latency, interpolating within its bucket """
+        if not self.count:
+            return 0.0
+        rank: float = q * self.count
+        seen: int = 0
+        for i, bucket_count in enumerate(self.bucket_counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower: float = LATENCY_BUCKETS[i - 1] if i > 0 else 0.0
+                upper: float = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else lower * 2
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return LATENCY_BUCKETS[-1]
+
+    def copy(self) -> "EndpointStats":
+        return EndpointStats(list(self.bucket_counts), self.count, self.total_seconds, self.bytes_sent,
+                             self.bytes_received, Counter(self.statuses))
+
+
+class Metrics:
+    def __init__(self):
+        self.started_at: float = time.time()
+        self._endpoints: dict[str, EndpointStats] = {}  # e.g. "GET /trader/v1/accounts/{account_hash}" -> stats
+        self._lock = threading.Lock()
+
+    def record(self, method: str, url: str, status: str, seconds: float, bytes_sent: int = 0,
+               bytes_received: int = 0):
+        endpoint: str = endpoint_name(method, url)
+        with self._lock:
+            stats: EndpointStats | None = self._endpoints.get(endpoint)
+            if not stats:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.observe(status, seconds, bytes_sent, bytes_received)
+
+    def endpoints(self) -> dict[str, EndpointStats]:
+        """ A copy of the stats of each endpoint, sorted by endpoint """
+        with self._lock:
+            return {endpoint: self._endpoints[endpoint].copy() for endpoint in sorted(self._endpoints)}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self.started_at = time.time()
+
+    def to_prometheus(self) -> str:
+        lines: list[str] = [
+            "# HELP schwab_api_request_duration_seconds Schwab API request latency",
+            "# TYPE schwab_api_request_duration_seconds histogram",
+        ]
+        endpoints: dict[str, EndpointStats] = self.endpoints()
+        for endpoint, stats in endpoints.items():
+            label: str = f'endpoint="{_escape(endpoint)}"'
+            cumulative: int = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS + ("+Inf",), stats.bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'schwab_api_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"schwab_api_request_duration_seconds_sum{{{label}}} {stats.total_seconds}")
+            lines.append(f"schwab_api_request_duration_seconds_count{{{label}}} {stats.count}")
+        lines += ["# HELP schwab_api_requests_total Schwab API requests by response status",
+                  "# TYPE schwab_api_requests_total counter"]
+        for endpoint, stats in endpoints.items():
+            for status, count in sorted(stats.statuses.items()):
+                lines.append(f'schwab_api_requests_total{{endpoint="{_escape(endpoint)}",status="{status}"}} {count}')
+        for name, attribute, help_text in (("schwab_api_request_bytes_total", "bytes_sent", "Bytes sent in request bodies"),
+                                           ("schwab_api_response_bytes_total", "bytes_received", "Bytes received in response bodies")):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for endpoint, stats in endpoints.items():
+                lines.append(f'{name}{{endpoint="{_escape(endpoint)}"}} {getattr(stats, attribute)}')
+        return "\n".join(lines) + "\n"
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """ e.g. "DELETE /trader/v1/accounts/{account_hash}/orders/{order_id}", so requests to every account and order
+    are counted together """
+    path: str = urlparse(url).path
+    path = re.sub(r"/accounts/(?!accountNumbers(/|$))[^/]+", "/accounts/{account_hash}", path)
+    path = re.sub(r"/orders/\d+", "/orders/{order_id}", path)
+    return f"{method} {path}"
+
+
+def write_prometheus_file(filename: str):
+    temp_filename: str = f"{filename}.tmp"
+    with open(temp_filename, 'w') as f:
+        f.write(get_metrics().to_prometheus())
+    os.replace(temp_filename, filename)
+
+
+def start_metrics_file(filename: str, interval: float = METRICS_FILE_INTERVAL):
+    """ Rewrite filename with the metrics every `interval` seconds, in the background; replaces a previous filename """
+    global _metrics_filename
+    write_prometheus_file(filename)  # fail now if it can't be written
+    started: bool = _metrics_filename is not None
+    _metrics_filename = filename
+    if started:
+        return
+
+    def write_periodically():
+        while True:
+            time.sleep(interval)
+            try:
+                write_prometheus_file(_metrics_filename)
+            except OSError as e:
+                print(f"Error writing metrics to {_metrics_filename}: {e}")
+    threading.Thread(target=write_periodically, name="metrics-file", daemon=True).start()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+    """ Serve the metrics at http://host:port/metrics, in the background """
+    from http.server import (BaseHTTPRequestHandler, ThreadingHTTPServer)  # only imported if metrics are served
+    global _metrics_server
+    if _metrics_server:
+        _metrics_server.shutdown()
+        _metrics_server.server_close()
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            data: bytes = get_metrics().to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # quiet
+
+    _metrics_server = ThreadingHTTPServer((host, port), Handler)
+    _metrics_server.daemon_threads = True
+    threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _metrics_server
+
+
+def get_metrics_file() -> str | None:
+    return _metrics_filename
+
+
+def get_metrics_server() -> "ThreadingHTTPServer | None":
+    return _metrics_server
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+_metrics: Metrics = Metrics()  # Access with get_metrics()
+_metrics_filename: str | None = None  # Access with get_metrics_file()
+_metrics_server: "ThreadingHTTPServer | None" = None  # Access with get_metrics_server()
+
+
+def get_metrics() -> Metrics:
+    return _metrics
@@ -0,0 +1,516 @@
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from collections import (Counter)
+from dataclasses import (dataclass)
+from datetime import (datetime, timedelta, timezone)
+from http.server import (BaseHTTPRequestHandler, ThreadingHTTPServer)
+from typing import (Callable)
+from urllib.parse import (parse_qs, urlparse)
+
+from websockets.asyncio.server import (serve, Server, ServerConnection)
+from websockets.exceptions import (ConnectionClosed)
+
+
+# Local stand-in for the Schwab API endpoints used by schwab_api.py and schwab_auth.py (accounts, accountNumbers,
+# quotes, price history, orders, transactions, user preferences and oauth/token), for measuring commands without a
+# brokerage account.  Every response is delayed by a configurable latency, a configurable fraction fail with a 500,
+# and the number of accounts, positions, working orders and transactions is configurable.
+# Positions don't change when orders fill, so a benchmark can repeat 'flatten'.
+# MockStreamerServer stands in for the streamer (level one equity quotes over a WebSocket).  MockSchwabServer runs one
+# and advertises its URL in the user preferences, so 'stream on' works against the mock; it can also be used alone,
+# e.g. to test schwab_streamer.py with SCHWAB_STREAMER_URL, and can drop its connections on demand.
+#
+# Run it, then point the CLI at it:
+#   python mock_schwab_server.py --port 8700 --latency 30
+#   SCHWAB_API_ROOT=http://localhost:8700 python schwab_cli.py
+# Status:  Beta
+
+
+DEFAULT_PORT = 8700
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "AVGO", "RDDT", "IBIT", "UPRO", "SPY", "QQQ",
+           "AMD", "NFLX", "COST", "PLTR", "CRM", "ORCL", "ADBE"]
+
+
+STREAMER_TICK_INTERVAL = 0.5        # seconds between ticks of every subscribed symbol
+STREAMER_HEARTBEAT_INTERVAL = 10.0  # seconds between heartbeat notifications
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 20.0        # mean delay before each response
+    jitter_ms: float = 5.0          # standard deviation of the delay
+    error_rate: float = 0.0         # fraction of requests answered with a 500
+    accounts: int = 1
+    positions: int = 10             # per account
+    working_orders: int = 5         # per account, at start
+    transactions: int = 20          # per symbol requested
+    seed: int = 1
+
+
+class MockSchwabServer:
+    def __init__(self, config: MockConfig | None = None, port: int = 0, host: str = "127.0.0.1",
+                 streamer_port: int = 0):
+        config = config if config else MockConfig()
+        self.config: MockConfig = config
+        self.request_counts: Counter = Counter()   # "GET /trader/v1/accounts/{hash}" -> requests
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._prices: dict[str, float] = {}
+        self._accounts: dict[str, str] = {f"{10000000 + i}": f"HASH{i:04}" for i in range(config.accounts)}  # number -> hash
+        self._positions: dict[str, list[dict]] = {account_hash: self._make_positions(i)
+                                                  for i, account_hash in enumerate(self._accounts.values())}
+        self._orders: dict[str, dict[int, dict]] = {account_hash: {} for account_hash in self._accounts.values()}
+        self._next_order_id: int = 1000000000
+        for account_hash in self._accounts.values():
+            for i in range(config.working_orders):
+                self._add_order(account_hash, self._symbol(i), "BUY", 10, "LIMIT",
+                                round(self._price(self._symbol(i)) * 0.9, 2))
+        routes: list[tuple[str, str, Callable]] = [
+            ("POST", r"/v1/oauth/token", self._token),
+            ("GET", r"/trader/v1/accounts/accountNumbers", self._account_numbers),
+            ("GET", r"/trader/v1/accounts", self._all_accounts),
+            ("GET", r"/trader/v1/accounts/(?P<account_hash>[^/]+)", self._account),
+            ("GET", r"/trader/v1/accounts/(?P<account_hash>[^/]+)/orders", self._get_orders),
+            ("POST", r"/trader/v1/accounts/(?P<account_hash>[^/]+)/orders", self._place_order),
+            ("DELETE", r"/trader/v1/accounts/(?P<account_hash>[^/]+)/orders/(?P<order_id>\d+)", self._cancel_order),
+            ("GET", r"/trader/v1/accounts/(?P<account_hash>[^/]+)/transactions", self._transactions),
+            ("GET", r"/trader/v1/userPreference", self._user_preference),
+            ("GET", r"/marketdata/v1/quotes", self._quotes),
+            ("GET", r"/marketdata/v1/pricehistory", self._price_history),
+        ]
+        # (method, pattern, endpoint name for request_counts, e.g. "GET /trader/v1/accounts/{account_hash}", handler)
+        self._routes: list[tuple[str, re.Pattern, str, Callable]] = [
+            (method, re.compile(pattern), f"{method} {re.sub(r'[(][?]P<(\w+)>[^)]*[)]', r'{\1}', pattern)}", function)
+            for method, pattern, function in routes]
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+        self.streamer = MockStreamerServer(self._streamer_price, streamer_port, host)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockSchwabServer":
+        self.streamer.start()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-schwab-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self.streamer.stop()
+
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts.clear()
+
+    def total_requests(self) -> int:
+        with self._lock:
+            return sum(self.request_counts.values())
+
+    def handle(self, method: str, path: str, query: dict, body: str) -> tuple[int, object, dict]:
+        """ Returns status, JSON body (None: empty) and extra headers """
+        for route_method, pattern, endpoint, function in self._routes:
+            match = pattern.fullmatch(path)
+            if match and method == route_method:
+                with self._lock:
+                    self.request_counts[endpoint] += 1
+                    fail: bool = self._random.random() < self.config.error_rate
+                    delay: float = max(0.0, self._random.gauss(self.config.latency_ms, self.config.jitter_ms)) / 1000
+                time.sleep(delay)
+                if fail:
+                    return 500, {"errors": [{"title": "Simulated error"}]}, {}
+                with self._lock:
+                    return function(query=query, body=body, **match.groupdict())
+        return 404, {"errors": [{"title": f"No such endpoint: {method} {path}"}]}, {}
+
+    #####
+
+    def _symbol(self, i: int) -> str:
+        return SYMBOLS[i] if i < len(SYMBOLS) else f"SYM{i:04}"
+
+    def _price(self, symbol: str) -> float:
+        """ Random walk per symbol, moving a little on every request """
+        price: float = self._prices.get(symbol) or 20 + self._random.random() * 480
+        price = round(max(1.0, price + self._random.gauss(0, price * 0.0005)), 2)
+        self._prices[symbol] = price
+        return price
+
+    def _streamer_price(self, symbol: str) -> float:
+        with self._lock:
+            return self._price(symbol)
+
+    def _make_positions(self, account_index: int) -> list[dict]:
+        positions: list[dict] = []
+        for i in range(self.config.positions):
+            symbol: str = self._symbol(i + account_index)
+            quantity: int = self._random.randint(1, 100)
+            short: bool = self._random.random() < 0.2
+            price: float = self._price(symbol)
+            positions.append({"instrument": {"symbol": symbol, "assetType": "EQUITY"},
+                              "longQuantity": 0 if short else quantity, "shortQuantity": quantity if short else 0,
+                              "averageShortPrice" if short else "averageLongPrice": price,
+                              "marketValue": (-1 if short else 1) * quantity * price})
+        return positions
+
+    def _add_order(self, account_hash: str, symbol: str, instruction: str, quantity: float, order_type: str,
+                   price: float | None) -> int:
+        order_id: int = self._next_order_id
+        self._next_order_id += 1
+        order: dict = {"orderId": order_id, "status": "WORKING", "orderType": order_type,
+                       "orderStrategyType": "SINGLE", "enteredTime": _format_time(datetime.now(timezone.utc)),
+                       "orderLegCollection": [{"legId": 1, "instruction": instruction, "quantity": quantity,
+                                               "instrument": {"symbol": symbol, "assetType": "EQUITY"}}]}
+        if order_type == "STOP":
+            order["stopPrice"] = price
+        elif price is not None:
+            order["price"] = price
+        self._orders[account_hash][order_id] = order
+        return order_id
+
+    def _securities_account(self, account_number: str, account_hash: str, positions: bool) -> dict:
+        account: dict = {"accountNumber": account_number,
+                         "currentBalances": {"equity": round(100000 + sum(p["marketValue"] for p in self._positions[account_hash]), 2),
+                                             "cashBalance": 100000.0, "buyingPower": 200000.0}}
+        if positions:
+            account["positions"] = self._positions[account_hash]
+        return {"securitiesAccount": account}
+
+    def _token(self, query: dict, body: str) -> tuple[int, object, dict]:
+        return 200, {"access_token": f"mock-access-token-{time.time():.0f}", "token_type": "Bearer", "expires_in": 1800,
+                     "refresh_token": "mock-refresh-token", "scope": "api", "id_token": "mock-id-token"}, {}
+
+    def _account_numbers(self, query: dict, body: str) -> tuple[int, object, dict]:
+        return 200, [{"accountNumber": number, "hashValue": account_hash}
+                     for number, account_hash in self._accounts.items()], {}
+
+    def _all_accounts(self, query: dict, body: str) -> tuple[int, object, dict]:
+        positions: bool = "positions" in query.get("fields", "")
+        return 200, [self._securities_account(number, account_hash, positions)
+                     for number, account_hash in self._accounts.items()], {}
+
+    def _account(self, query: dict, body: str, account_hash: str) -> tuple[int, object, dict]:
+        number: str | None = next((number for number, h in self._accounts.items() if h == account_hash), None)
+        if not number:
+            return 404, {"errors": [{"title": "No such account"}]}, {}
+        return 200, self._securities_account(number, account_hash, "positions" in query.get("fields", "")), {}
+
+    def _get_orders(self, query: dict, body: str, account_hash: str) -> tuple[int, object, dict]:
+        status: str | None = query.get("status")
+        return 200, [order for order in self._orders.get(account_hash, {}).values()
+                     if not status or order["status"] == status], {}
+
+    def _place_order(self, query: dict, body: str, account_hash: str) -> tuple[int, object, dict]:
+        if account_hash not in self._orders:
+            return 404, {"errors": [{"title": "No such account"}]}, {}
+        order: dict = json.loads(body)
+        leg: dict = order["orderLegCollection"][0]
+        if order["orderType"] == "MARKET":
+            order_id: int = self._next_order_id  # filled at once, so never working
+            self._next_order_id += 1
+        else:
+            order_id = self._add_order(account_hash, leg["instrument"]["symbol"], leg["instruction"], leg["quantity"],
+                                       order["orderType"], order.get("stopPrice", order.get("price")))
+        return 201, None, {"Location": f"/trader/v1/accounts/{account_hash}/orders/{order_id}"}
+
+    def _cancel_order(self, query: dict, body: str, account_hash: str, order_id: str) -> tuple[int, object, dict]:
+        if not self._orders.get(account_hash, {}).pop(int(order_id), None):
+            return 404, {"errors": [{"title": "No such order"}]}, {}
+        return 200, None, {}
+
+    def _transactions(self, query: dict, body: str, account_hash: str) -> tuple[int, object, dict]:
+        """ Pairs of opening and closing trades of the requested symbol, spread over the requested time range """
+        symbol: str = query.get("symbol", "AAPL")
+        start: datetime = datetime.strptime(query["startDate"], "%Y-%m-%dT%H:%M:%S.000Z").replace(tzinfo=timezone.utc)
+        end: datetime = datetime.strptime(query["endDate"], "%Y-%m-%dT%H:%M:%S.000Z").replace(tzinfo=timezone.utc)
+        count: int = self.config.transactions - self.config.transactions % 2
+        step: timedelta = (end - start) / (count + 1)
+        transactions: list[dict] = []
+        for i in range(count):
+            opening: bool = i % 2 == 0
+            transactions.append({"activityId": 90000000 + i, "type": "TRADE", "tradeDate": _format_time(start + step * (i + 1)),
+                                 "transferItems": [{"instrument": {"symbol": symbol, "assetType": "EQUITY"},
+                                                    "amount": 10 if opening else -10, "price": self._price(symbol),
+                                                    "positionEffect": "OPENING" if opening else "CLOSING"}]})
+        return 200, transactions, {}
+
+    def _user_preference(self, query: dict, body: str) -> tuple[int, object, dict]:
+        return 200, {"streamerInfo": [{"streamerSocketUrl": self.streamer.url, "schwabClientCustomerId": "mock",
+                                       "schwabClientCorrelId": "mock", "schwabClientChannel": "N9",
+                                       "schwabClientFunctionId": "APIAPP"}]}, {}
+
+    def _quotes(self, query: dict, body: str) -> tuple[int, object, dict]:
+        now_ms: int = int(time.time() * 1000)
+        quotes: dict = {}
+        for symbol in query.get("symbols", "").split(","):
+            if not symbol:
+                continue
+            last: float = self._price(symbol)
+            quotes[symbol] = {"symbol": symbol, "quote": {"lastPrice": last, "bidPrice": round(last - 0.01, 2),
+                                                          "askPrice": round(last + 0.01, 2), "totalVolume": 1000000,
+                                                          "quoteTime": now_ms},
+                              "reference": {"description": f"{symbol} mock", "exchange": "Q"}}
+        return 200, quotes, {}
+
+    def _price_history(self, query: dict, body: str) -> tuple[int, object, dict]:
+        symbol: str = query.get("symbol", "AAPL")
+        frequency_type: str = query.get("frequencyType", "daily")
+        frequency: int = int(query.get("frequency", 1))
+        step: timedelta = {"minute": timedelta(minutes=frequency), "daily": timedelta(days=1),
+                           "weekly": timedelta(weeks=1), "monthly": timedelta(days=30)}[frequency_type]
+        time_ms: int = int(query["startDate"])
+        end_ms: int = int(query["endDate"])
+        candles: list[dict] = []
+        while time_ms <= end_ms:
+            close: float = self._price(symbol)
+            candles.append({"datetime": time_ms, "open": close, "high": round(close * 1.002, 2),
+                            "low": round(close * 0.998, 2), "close": close, "volume": 10000})
+            time_ms += int(step.total_seconds() * 1000)
+        return 200, {"symbol": symbol, "empty": not candles, "candles": candles}, {}
+
+
+class MockStreamerServer:
+    """
+    LEVELONE_EQUITIES stand-in:  answers ADMIN LOGIN and SUBS/ADD/UNSUBS, sends a full quote for each newly subscribed
+    symbol, then ticks of every subscribed symbol every `tick_interval` seconds (None:  only those sent with
+    push_tick()) and heartbeats every `heartbeat_interval` seconds.
+    """
+    def __init__(self, price: Callable[[str], float] | None = None, port: int = 0, host: str = "127.0.0.1",
+                 tick_interval: float | None = STREAMER_TICK_INTERVAL,
+                 heartbeat_interval: float = STREAMER_HEARTBEAT_INTERVAL):
+        self.host: str = host
+        self.port: int = port
+        self.tick_interval: float | None = tick_interval
+        self.heartbeat_interval: float = heartbeat_interval
+        self.requests: Counter = Counter()  # command, e.g. "LOGIN" or "ADD" -> requests
+        self._price: Callable[[str], float] = price if price else _RandomWalk().price
+        self._connections: dict[ServerConnection, set[str]] = {}  # logged in connection -> its subscribed symbols
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server: Server | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    def start(self) -> "MockStreamerServer":
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mock-schwab-streamer", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def subscriptions(self) -> set[str]:
+        """ Symbols subscribed by any connection """
+        return asyncio.run_coroutine_threadsafe(self._subscriptions(), self._loop).result()
+
+    def push_tick(self, symbol: str, fields: dict):
+        """ Send a tick, e.g. {"3": 101.5} (just the last price), to the connections subscribed to symbol """
+        asyncio.run_coroutine_threadsafe(self._send_ticks({symbol: fields}), self._loop).result()
+
+    def drop_connections(self):
+        """ Close every connection, as when the network or Schwab drops it """
+        asyncio.run_coroutine_threadsafe(self._drop_connections(), self._loop).result()
+
+    #####
+
+    async def _start(self):
+        self._server = await serve(self._handle, self.host, self.port)
+        self._tasks.append(asyncio.create_task(self._heartbeats()))
+        if self.tick_interval:
+            self._tasks.append(asyncio.create_task(self._ticks()))
+
+    async def _stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _subscriptions(self) -> set[str]:
+        return set().union(*self._connections.values())
+
+    async def _drop_connections(self):
+        for connection in list(self._connections):
+            await connection.close()
+
+    async def _handle(self, connection: ServerConnection):
+        symbols: set[str] = set()
+        try:
+            async for message in connection:
+                for request in json.loads(message).get("requests", []):
+                    await self._handle_request(connection, symbols, request)
+        except ConnectionClosed:
+            pass
+        finally:
+            self._connections.pop(connection, None)
+
+    async def _handle_request(self, connection: ServerConnection, symbols: set[str], request: dict):
+        service: str = request.get("service", "")
+        command: str = request.get("command", "")
+        parameters: dict = request.get("parameters", {})
+        self.requests[command] += 1
+        if service == "ADMIN" and command == "LOGIN":
+            if not parameters.get("Authorization"):
+                await connection.send(_streamer_response(request, 3, "Login denied"))
+                return
+            self._connections[connection] = symbols
+            await connection.send(_streamer_response(request, 0, "server=mock;status=NP"))
+        elif connection not in self._connections:
+            await connection.send(_streamer_response(request, 3, "Not logged in"))
+        elif service == "LEVELONE_EQUITIES" and command in ("SUBS", "ADD", "UNSUBS"):
+            keys: set[str] = {key.upper() for key in parameters.get("keys", "").split(",") if key}
+            new_symbols: set[str] = keys - symbols if command != "UNSUBS" else set()
+            if command == "SUBS":
+                symbols.clear()
+            if command == "UNSUBS":
+                symbols.difference_update(keys)
+            else:
+                symbols.update(keys)
+            await connection.send(_streamer_response(request, 0, f"{command} command succeeded"))
+            if new_symbols:  # a full quote first; later ticks carry only the changed fields
+                await self._send(connection, [self._quote(symbol) for symbol in sorted(new_symbols)])
+        else:
+            await connection.send(_streamer_response(request, 22, f"Unsupported: {service} {command}"))
+
+    def _quote(self, symbol: str) -> dict:
+        last: float = self._price(symbol)
+        return {"key": symbol, "1": round(last - 0.01, 2), "2": round(last + 0.01, 2), "3": last, "8": 1000000}
+
+    async def _send(self, connection: ServerConnection, content: list[dict]):
+        data: dict = {"service": "LEVELONE_EQUITIES", "timestamp": int(time.time() * 1000), "command": "SUBS",
+                      "content": content}
+        try:
+            await connection.send(json.dumps({"data": [data]}))
+        except ConnectionClosed:
+            pass
+
+    async def _send_ticks(self, ticks: dict[str, dict]):
+        for connection, symbols in list(self._connections.items()):
+            content: list[dict] = [{"key": symbol, **fields} for symbol, fields in ticks.items() if symbol in symbols]
+            if content:
+                await self._send(connection, content)
+
+    async def _ticks(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            symbols: set[str] = await self._subscriptions()
+            await self._send_ticks({symbol: self._quote(symbol) for symbol in sorted(symbols)})
+
+    async def _heartbeats(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            message: str = json.dumps({"notify": [{"heartbeat": str(int(time.time() * 1000))}]})
+            for connection in list(self._connections):
+                try:
+                    await connection.send(message)
+                except ConnectionClosed:
+                    pass
+
+
+class _RandomWalk:
+    """ Prices of a MockStreamerServer run on its own """
+    def __init__(self, seed: int = 1):
+        self._random = random.Random(seed)
+        self._prices: dict[str, float] = {}
+
+    def price(self, symbol: str) -> float:
+        price: float = self._prices.get(symbol) or 20 + self._random.random() * 480
+        price = round(max(1.0, price + self._random.gauss(0, price * 0.0005)), 2)
+        self._prices[symbol] = price
+        return price
+
+
+def _streamer_response(request: dict, code: int, message: str) -> str:
+    return json.dumps({"response": [{"service": request.get("service"), "command": request.get("command"),
+                                     "requestid": request.get("requestid"), "timestamp": int(time.time() * 1000),
+                                     "content": {"code": code, "msg": message}}]})
+
+
+def _format_time(time_utc: datetime) -> str:
+    return time_utc.strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+
+def _make_handler(server: MockSchwabServer) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep connections alive, as Schwab does
+        disable_nagle_algorithm = True  # else the body, written after the headers, waits for a delayed ACK
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_POST(self):
+            self._respond("POST")
+
+        def do_DELETE(self):
+            self._respond("DELETE")
+
+        def log_message(self, format, *args):
+            pass  # quiet
+
+        def _respond(self, method: str):
+            url = urlparse(self.path)
+            query: dict = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            length: int = int(self.headers.get("Content-Length", 0))
+            body: str = self.rfile.read(length).decode() if length else ""
+            status, content, headers = server.handle(method, url.path, query, body)
+            data: bytes = json.dumps(content).encode() if content is not None else b""
+            self.send_response(status)
+            if "Location" in headers:
+                headers["Location"] = f"{server.url}{headers['Location']}"
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if data:
+                self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def parse_config(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(args.latency, args.jitter, args.error_rate, args.accounts, args.positions, args.working_orders,
+                      args.transactions, args.seed)
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    defaults = MockConfig()
+    parser.add_argument("--latency", type=float, default=defaults.latency_ms, help="mean response delay (ms)")
+    parser.add_argument("--jitter", type=float, default=defaults.jitter_ms, help="std. deviation of the delay (ms)")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="fraction of requests failing")
+    parser.add_argument("--accounts", type=int, default=defaults.accounts)
+    parser.add_argument("--positions", type=int, default=defaults.positions, help="positions per account")
+    parser.add_argument("--working-orders", type=int, default=defaults.working_orders, help="per account, at start")
+    parser.add_argument("--transactions", type=int, default=defaults.transactions, help="per symbol requested")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Schwab API")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--streamer-port", type=int, default=0, help="streamer WebSocket port (default: any free)")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    mock_server = MockSchwabServer(parse_config(args), args.port, streamer_port=args.streamer_port).start()
+    print(f"Mock Schwab API listening on {mock_server.url}, streamer on {mock_server.streamer.url}; press ^C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock_server.stop()
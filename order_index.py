@@ -0,0 +1,109 @@
+import json
+import threading
+from dataclasses import (asdict)
+from datetime import (datetime, timedelta)
+
+from orders import (find_working_orders, WorkingOrder)
+
+
+# Persistent local index of working orders, keyed by order id and symbol, so finding the working orders for a symbol
+# is a lookup rather than a scan of a year of orders.  The index is kept current by incremental syncs (see
+# schwab_api.get_working_order_index()) and by recording our own order placements and cancellations.
+# Status:  Beta
+
+
+WORKING_ORDERS_FILE = "working_orders_{}.json"   # formatted with the start of the account hash
+WORKING_STATUSES = ("WORKING", "PENDING_ACTIVATION")
+FULL_SYNC_DAYS = 365                        # how far back a full sync looks for working orders
+FULL_SYNC_INTERVAL = timedelta(days=1)      # do a full sync at least this often, to drop orders filled elsewhere
+SYNC_OVERLAP = timedelta(minutes=5)         # re-read a little before the last sync, in case of clock skew
+
+
+def working_orders_filename(account_number: str) -> str:
+    return WORKING_ORDERS_FILE.format(account_number[:8])
+
+
+class WorkingOrderIndex:
+    def __init__(self, account_number: str, filename: str):
+        self.account_number: str = account_number
+        self.filename: str = filename
+        self.last_sync: datetime | None = None
+        self.last_full_sync: datetime | None = None
+        self._orders: dict[str, list[WorkingOrder]] = {}    # order id -> one WorkingOrder per leg
+        self._symbols: dict[str, set[str]] = {}             # symbol -> order ids
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.filename, 'r') as f:
+                saved: dict = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if saved.get("account_number") != self.account_number:
+            return  # index belongs to another account; start over
+        self.last_sync = datetime.fromisoformat(saved["last_sync"]) if saved.get("last_sync") else None
+        self.last_full_sync = datetime.fromisoformat(saved["last_full_sync"]) if saved.get("last_full_sync") else None
+        for order in saved.get("orders", []):
+            self._add(WorkingOrder(**order))
+
+    def save(self):
+        with self._lock:
+            saved = {
+                "account_number": self.account_number,
+                "last_sync": self.last_sync.isoformat() if self.last_sync else None,
+                "last_full_sync": self.last_full_sync.isoformat() if self.last_full_sync else None,
+                "orders": [asdict(order) for legs in self._orders.values() for order in legs],
+            }
+        with open(self.filename, 'w') as f:
+            json.dump(saved, f, indent=4)
+
+    def needs_full_sync(self, now: datetime) -> bool:
+        return not self.last_full_sync or now - self.last_full_sync > FULL_SYNC_INTERVAL
+
+    def sync_start(self, now: datetime) -> datetime:
+        """ Earliest entered time that a sync at `now` needs to read orders from """
+        if not self.last_sync or self.needs_full_sync(now):
+            return now - timedelta(days=FULL_SYNC_DAYS)
+        return self.last_sync - SYNC_OVERLAP
+
+    def apply_sync(self, raw_orders: list, now: datetime, full: bool):
+        """ Merge orders returned by the server (already filtered to WORKING_STATUSES) into the index """
+        working_orders: list[WorkingOrder] = find_working_orders(raw_orders)
+        with self._lock:
+            if full:
+                self._orders.clear()
+                self._symbols.clear()
+                self.last_full_sync = now
+            for order_id in {str(order.order_id) for order in working_orders}:
+                self._remove(order_id)
+            for order in working_orders:
+                self._add(order)
+            self.last_sync = now
+
+    def find(self, symbol: str | None = None) -> list[WorkingOrder]:
+        with self._lock:
+            order_ids = self._symbols.get(symbol, set()) if symbol else self._orders.keys()
+            return [order for order_id in order_ids for order in self._orders[order_id]]
+
+    def add(self, order: WorkingOrder):
+        with self._lock:
+            self._add(order)
+
+    def remove(self, order_id: str):
+        with self._lock:
+            self._remove(order_id)
+
+    def _add(self, order: WorkingOrder):
+        order.order_id = str(order.order_id)  # the server returns an int; the Location header of a new order a str
+        self._orders.setdefault(order.order_id, []).append(order)
+        self._symbols.setdefault(order.symbol, set()).add(order.order_id)
+
+    def _remove(self, order_id: str):
+        order_id = str(order_id)
+        for order in self._orders.pop(order_id, []):
+            order_ids = self._symbols.get(order.symbol)
+            if order_ids:
+                order_ids.discard(order_id)
+                if not order_ids:
+                    del self._symbols[order.symbol]
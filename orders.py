@@ -1,5 +1,4 @@
 from datetime import datetime
-from tzlocal import get_localzone
 from dataclasses import dataclass
 
 # Functionality surrounding Schwab orders
@@ -12,6 +11,7 @@ class Order:
 
     def __init__(self, order = None):
         if order:
+            from tzlocal import get_localzone  # imported on first use, as it is slow to import
             trade_date_utc: datetime = datetime.strptime(order["tradeDate"], "%Y-%m-%dT%H:%M:%S%z")
             self.trade_date_local = trade_date_utc.astimezone(get_localzone())
 
@@ -0,0 +1,237 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from abc import (ABC, abstractmethod)
+from collections import (Counter)
+from contextlib import (contextmanager)
+from datetime import (datetime)
+from typing import (Callable)
+
+
+# Profiles one command execution in place, or only the first N iterations of a strategy loop (trend, buylow/sellhigh,
+# breakout/oscillate), so reports aren't swamped by time spent waiting at the prompt or between polls.
+#   cprofile:  deterministic; writes <name>.txt (hot functions by cumulative and own time) and <name>.pstats
+#   sample:    a background thread samples the command's stack every SAMPLE_INTERVAL seconds, cheap enough for
+#              multi-hour loops; writes <name>.txt (hot functions by own and inclusive samples) and <name>.folded
+#              (collapsed stacks for flamegraph.pl or speedscope)
+# Time the loops spend waiting for the next price (see quote_sources.py) isn't profiled.  Only the command's own
+# thread is profiled, not the worker threads it hands requests to.
+# Status:  Beta
+
+
+PROFILES_DIRECTORY = "profiles"
+SAMPLE_INTERVAL = 0.005     # seconds between stack samples
+REPORT_LINES = 30           # functions listed in each section of a report
+SUMMARY_LINES = 10          # functions printed when the profile finishes
+
+# Modes
+CPROFILE = "cprofile"
+SAMPLE = "sample"
+
+
+class CommandProfiler(ABC):
+    """ Profiles the thread that creates it, until finish(), or until `iterations` loop iterations have run """
+    def __init__(self, name: str, iterations: int | None = None, directory: str = PROFILES_DIRECTORY):
+        self.name: str = name
+        self.iterations: int | None = iterations
+        self.directory: str = directory
+        self.thread_id: int = threading.get_ident()
+        self.iterations_run: int = 0
+        self.finished: bool = False
+        self.filenames: list[str] = []
+        self._started_at: float = 0.0
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._start()
+
+    def iteration(self):
+        """ A loop iteration ended; finishes the profile once `iterations` have run """
+        self.iterations_run += 1
+        if self.iterations and self.iterations_run >= self.iterations and not self.finished:
+            self.finish()
+
+    def finish(self):
+        """ Stop profiling, write the reports and print the hottest functions """
+        self.finished = True
+        self._stop()
+        elapsed: float = time.perf_counter() - self._started_at
+        os.makedirs(self.directory, exist_ok=True)
+        base: str = os.path.join(self.directory, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')[:-3]}-{self.name}")
+        report: str = self._report(REPORT_LINES)
+        with open(f"{base}.txt", 'w') as f:
+            f.write(report)
+        self.filenames = [f"{base}.txt", self._write_data(base)]
+        iterations: str = f"; {self.iterations_run} iterations" if self.iterations_run else ""
+        print(f"Profiled {elapsed:.2f} seconds{iterations}:")
+        print(self._report(SUMMARY_LINES, summary=True), end='')
+        print(f"Profile written to {', '.join(self.filenames)}")
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    #####
+
+    @abstractmethod
+    def _start(self):
+        ...
+
+    @abstractmethod
+    def _stop(self):
+        ...
+
+    @abstractmethod
+    def _report(self, lines: int, summary: bool = False) -> str:
+        ...
+
+    @abstractmethod
+    def _write_data(self, base: str) -> str:
+        """ Write the raw profile data next to the report; returns its filename """
+
+
+class CProfileProfiler(CommandProfiler):
+    def __init__(self, name: str, iterations: int | None = None, directory: str = PROFILES_DIRECTORY):
+        super().__init__(name, iterations, directory)
+        self.profile = cProfile.Profile()
+
+    def pause(self):
+        if not self.finished:
+            self.profile.disable()
+
+    def resume(self):
+        if not self.finished:
+            self.profile.enable()
+
+    def _start(self):
+        self.profile.enable()
+
+    def _stop(self):
+        self.profile.disable()
+
+    def _report(self, lines: int, summary: bool = False) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream).strip_dirs()
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(lines)
+        if not summary:
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(lines)
+        return stream.getvalue()
+
+    def _write_data(self, base: str) -> str:
+        self.profile.dump_stats(f"{base}.pstats")
+        return f"{base}.pstats"
+
+
+class SamplingProfiler(CommandProfiler):
+    def __init__(self, name: str, iterations: int | None = None, directory: str = PROFILES_DIRECTORY,
+                 interval: float = SAMPLE_INTERVAL):
+        super().__init__(name, iterations, directory)
+        self.interval: float = interval
+        self.stacks: Counter = Counter()    # "outermost;...;innermost" -> samples
+        self.samples: int = 0
+        self.waiting_samples: int = 0       # taken while the loop was waiting for a price
+        self._paused: bool = False
+        self._labels: dict = {}             # code object -> "function (file:line)"
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def pause(self):
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+
+    def _stop(self):
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _sample(self):
+        while not self._stop_event.wait(self.interval):
+            if self._paused:
+                self.waiting_samples += 1
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            labels: list[str] = []
+            while frame:
+                code = frame.f_code
+                label: str | None = self._labels.get(code)
+                if not label:
+                    label = self._labels[code] = \
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                labels.append(label)
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+                self.samples += 1
+
+    def _report(self, lines: int, summary: bool = False) -> str:
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, count in self.stacks.items():
+            functions: list[str] = stack.split(";")
+            own[functions[-1]] += count
+            for function in set(functions):
+                inclusive[function] += count
+        total: int = max(self.samples, 1)
+        report: str = (f"{self.samples} samples every {self.interval * 1000:g} ms "
+                       f"({self.waiting_samples} more while waiting for prices)\n")
+        sections: list[tuple[str, Counter]] = [("own", own)] if summary else [("own", own), ("inclusive", inclusive)]
+        for title, counts in sections:
+            report += f"\n{'samples':>8} {'%':>6}  function, by {title} samples\n"
+            for function, count in counts.most_common(lines):
+                report += f"{count:>8} {count / total:>6.1%}  {function}\n"
+        return report
+
+    def _write_data(self, base: str) -> str:
+        with open(f"{base}.folded", 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        return f"{base}.folded"
+
+
+def profile_command(function: Callable[[], None], name: str, mode: str = CPROFILE,
+                    iterations: int | None = None) -> CommandProfiler | None:
+    """ Run function under a profiler, writing the reports when it returns (or after `iterations` loop iterations) """
+    global _active
+    if _active:
+        print("Error:  A command is already being profiled")
+        return None
+    profiler: CommandProfiler = SamplingProfiler(name, iterations) if mode == SAMPLE else CProfileProfiler(name, iterations)
+    _active = profiler
+    profiler.start()
+    try:
+        function()
+    finally:
+        _active = None
+        if not profiler.finished:
+            profiler.finish()
+    return profiler
+
+
+@contextmanager
+def loop_wait():
+    """ Wraps a strategy loop's wait for the next price:  not profiled, and counted as the end of an iteration """
+    profiler: CommandProfiler | None = _active
+    if not profiler or profiler.finished or profiler.thread_id != threading.get_ident():
+        yield
+        return
+    profiler.pause()
+    try:
+        yield
+    finally:
+        profiler.iteration()
+        profiler.resume()
+
+
+_active: CommandProfiler | None = None  # the profile in progress, if any
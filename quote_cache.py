@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import (OrderedDict)
+from concurrent.futures import (Future)
+from dataclasses import (dataclass)
+from typing import (Callable)
+
+
+# Quote cache keyed by symbol, with single-flight coalescing of concurrent fetches
+# Status:  Beta
+
+
+DEFAULT_MAX_AGE = 1.0       # seconds a cached quote is considered fresh
+DEFAULT_MAX_SIZE = 1000     # number of symbols kept before the least recently used are evicted
+
+QuoteFetcher = Callable[[list[str]], dict | None]  # returns {symbol: quote} for the symbols, or None on error
+
+
+@dataclass
+class CachedQuote:
+    quote: dict
+    fetched_at: float  # time.monotonic()
+
+
+class QuoteCache:
+    """
+    Returns cached quotes that are younger than max_age, and fetches the rest.  When several threads ask for
+    overlapping symbols at the same time, each symbol is fetched by only one of them and the others wait for,
+    and share, that in-flight result.
+    """
+    def __init__(self, max_age: float = DEFAULT_MAX_AGE, max_size: int = DEFAULT_MAX_SIZE):
+        self.max_age: float = max_age
+        self.max_size: int = max_size
+        self.hits: int = 0
+        self.misses: int = 0
+        self.coalesced: int = 0     # misses satisfied by another caller's in-flight fetch
+        self.evictions: int = 0
+        self._quotes: OrderedDict[str, CachedQuote] = OrderedDict()    # least recently used first
+        self._in_flight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbols: list[str], fetch: QuoteFetcher, max_age: float | None = None) -> dict | None:
+        """ Return {symbol: quote} for `symbols` (upper case, no duplicates), or None if a fetch failed """
+        max_age = self.max_age if max_age is None else max_age
+        quotes: dict = {}
+        to_fetch: list[str] = []
+        to_wait: dict[str, Future] = {}
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                cached: CachedQuote | None = self._quotes.get(symbol)
+                if cached and now - cached.fetched_at <= max_age:
+                    self._quotes.move_to_end(symbol)
+                    quotes[symbol] = cached.quote
+                    self.hits += 1
+                elif symbol in self._in_flight:
+                    to_wait[symbol] = self._in_flight[symbol]
+                    self.coalesced += 1
+                else:
+                    to_fetch.append(symbol)
+                    self.misses += 1
+            if to_fetch:
+                future = Future()
+                for symbol in to_fetch:
+                    self._in_flight[symbol] = future
+
+        if to_fetch:
+            fetched: dict | None = None
+            try:
+                fetched = fetch(to_fetch)
+            finally:
+                self._complete(to_fetch, future, fetched)
+            if fetched is None:
+                return None
+            quotes.update({symbol: fetched[symbol] for symbol in to_fetch if symbol in fetched})
+
+        for symbol, future in to_wait.items():
+            fetched = future.result()
+            if fetched is None:
+                return None
+            if symbol in fetched:
+                quotes[symbol] = fetched[symbol]
+        return quotes
+
+    def _complete(self, symbols: list[str], future: Future, fetched: dict | None):
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                self._in_flight.pop(symbol, None)
+                if fetched and symbol in fetched:
+                    self._quotes[symbol] = CachedQuote(fetched[symbol], now)
+                    self._quotes.move_to_end(symbol)
+            while len(self._quotes) > self.max_size:
+                self._quotes.popitem(last=False)
+                self.evictions += 1
+        future.set_result(fetched)
+
+    def clear(self):
+        with self._lock:
+            self._quotes.clear()
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.coalesced = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._quotes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,237 @@
+import bisect
+import json
+import time
+from abc import (ABC, abstractmethod)
+from dataclasses import (dataclass)
+from datetime import (datetime)
+from typing import (TYPE_CHECKING)
+
+from profiler import (loop_wait)
+from schwab_api import (get_quotes, place_order_fast, CancelResult, OrderResult)
+from schwab_auth import (SchwabAuth)
+from tick_recorder import (TickLog, TICK_FILE_EXTENSION)
+
+if TYPE_CHECKING:
+    from schwab_streamer import (SchwabStreamer)  # imported by the 'stream' command, as asyncio is slow to import
+
+
+# Where the strategy loops (trend, buylow/sellhigh, breakout/oscillate) get their prices and their sense of time:
+# polling the quotes endpoint, Schwab's streaming quotes, or a recorded tick file replayed against a virtual clock.
+# A replay also simulates the orders the strategy places, so a day of ticks can be run through a strategy in seconds.
+#
+# Tick files are either .ticks files written by the recorder (see tick_recorder.py) or JSON lines:
+#   {"time": <epoch seconds>, "symbol": "AAPL", "bid": 1.0, "ask": 1.1, "last": 1.05}
+# Status:  Beta
+
+
+TICK_TIMEOUT = 30  # seconds to wait for a price change before returning anyway (so time-based rules still run)
+STREAMED_QUOTE_MAX_AGE = 5  # seconds; older streamed quotes (or any while disconnected) are polled instead
+
+
+class ReplayFinished(Exception):
+    """
+    This exception is thrown when a replayed strategy asks for a price after the last recorded tick.
+    """
+    def __init__(self, message: str = "End of replay"):
+        super().__init__(message)
+
+
+class QuoteSource(ABC):
+    """ Prices and time for a strategy loop; by default real time, with orders sent to Schwab """
+    simulated: bool = False     # True if orders are simulated rather than sent to Schwab
+
+    def __init__(self, schwab_auth: SchwabAuth | None):
+        self.schwab_auth: SchwabAuth | None = schwab_auth
+
+    @abstractmethod
+    def get_quotes(self, symbol: str) -> dict | None:
+        """ Latest quote for symbol, shaped like schwab_api.get_quotes():  {symbol: {"quote": {...}}} """
+
+    def get_all_quotes(self, symbols: list[str]) -> dict | None:
+        """ Latest quotes for all of symbols; symbols without a quote are left out """
+        quotes: dict = {}
+        for symbol in symbols:
+            quotes.update(self.get_quotes(symbol) or {})
+        return quotes
+
+    def wait_for_price_change(self, symbol: str, poll_seconds: float):
+        """ Return when the next price for symbol may be available """
+        self.sleep(poll_seconds)
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def sleep(self, seconds: float):
+        with loop_wait():
+            time.sleep(seconds)
+
+    def place_order(self, instruction: str, symbol: str, numshares: int,
+                    limit_or_offset_or_bid_or_ask: float | str | None = None) -> OrderResult:
+        return place_order_fast(self.schwab_auth, instruction, symbol, numshares, limit_or_offset_or_bid_or_ask)
+
+
+class PollingQuoteSource(QuoteSource):
+    """ Live prices by polling the quotes endpoint once per poll interval """
+    def get_quotes(self, symbol: str) -> dict | None:
+        return get_quotes(symbol, self.schwab_auth)
+
+    def get_all_quotes(self, symbols: list[str]) -> dict | None:
+        return get_quotes(",".join(symbols), self.schwab_auth)  # one request for all of them
+
+
+class StreamingQuoteSource(PollingQuoteSource):
+    """ Live prices from the streamer; waits for the next tick instead of a poll interval """
+    def __init__(self, schwab_auth: SchwabAuth, streamer: "SchwabStreamer"):
+        super().__init__(schwab_auth)
+        self.streamer: "SchwabStreamer" = streamer
+        self._seen_ticks: dict[str, int] = {}  # symbol -> streamer's tick count when its quote was last read
+
+    def _is_usable(self, quote: dict) -> bool:
+        """ True if a streamed quote is complete and fresh enough to trade on """
+        if not all(name in quote for name in ('lastPrice', 'askPrice', 'bidPrice')):
+            return False
+        return time.time() - quote.get('quoteTime', 0) / 1000 <= STREAMED_QUOTE_MAX_AGE
+
+    def get_quotes(self, symbol: str) -> dict | None:
+        self.streamer.subscribe([symbol])
+        self._seen_ticks[symbol] = self.streamer.tick_count(symbol)
+        if self.streamer.connected:
+            quotes: dict = self.streamer.get_quotes([symbol])
+            if quotes and self._is_usable(quotes[symbol]['quote']):
+                return quotes
+        return super().get_quotes(symbol)  # disconnected, or no complete and recent tick
+
+    def get_all_quotes(self, symbols: list[str]) -> dict | None:
+        self.streamer.subscribe(symbols)
+        quotes: dict = {}
+        if self.streamer.connected:
+            quotes = {symbol: quote for symbol, quote in self.streamer.get_quotes(symbols).items()
+                      if self._is_usable(quote['quote'])}
+        missing: list[str] = [symbol for symbol in symbols if symbol not in quotes]
+        if missing:  # disconnected, or no complete and recent tick
+            polled: dict | None = super().get_all_quotes(missing)
+            if polled is None and not quotes:
+                return None
+            quotes.update(polled or {})
+        return quotes
+
+    def wait_for_price_change(self, symbol: str, poll_seconds: float):
+        if self.streamer.connected and symbol in self._seen_ticks:
+            with loop_wait():
+                self.streamer.wait_for_tick(symbol, TICK_TIMEOUT, self._seen_ticks[symbol])
+        else:
+            self.sleep(poll_seconds)
+
+
+@dataclass
+class Tick:
+    time: float         # epoch seconds
+    symbol: str
+    bid: float
+    ask: float
+    last: float
+
+    @classmethod
+    def from_json(cls, tick: dict) -> "Tick":
+        return cls(float(tick["time"]), tick["symbol"].upper(), float(tick["bid"]), float(tick["ask"]),
+                   float(tick["last"]))
+
+
+@dataclass
+class SimulatedOrder:
+    time: datetime
+    instruction: str
+    symbol: str
+    numshares: int
+    price: float | None     # fill price for buys and sells; stop price (or trailing offset) for stops
+
+    def __str__(self):
+        price: str = f" @ {self.price:.2f}" if self.price is not None else ""
+        return f"{self.time.strftime('%H:%M:%S')}: {self.instruction} {self.symbol} {self.numshares}{price}"
+
+
+class SimulatedResponse:
+    """ Stands in for the requests.Response of an order that was accepted """
+    ok: bool = True
+    status_code: int = 201
+    text: str = ""
+    headers: dict = {}
+
+
+class ReplayQuoteSource(QuoteSource):
+    """
+    Prices from a tick file, replayed on a virtual clock at `speed` times real time (None: as fast as possible).
+    Waiting for a price change jumps the clock to the symbol's next tick; orders are simulated at the current bid/ask.
+    """
+    simulated: bool = True
+
+    def __init__(self, ticks: list[Tick], speed: float | None = None):
+        super().__init__(None)
+        self.ticks: list[Tick] = sorted(ticks, key=lambda tick: tick.time)
+        self.speed: float | None = speed
+        self.orders: list[SimulatedOrder] = []
+        self._clock: float = self.ticks[0].time if self.ticks else 0.0
+        self._index: int = 0                            # next tick to apply
+        self._quotes: dict[str, dict] = {}              # symbol -> latest quote as of the clock
+        self._symbol_times: dict[str, list[float]] = {}  # symbol -> times of its ticks, for finding the next one
+        for tick in self.ticks:
+            self._symbol_times.setdefault(tick.symbol, []).append(tick.time)
+
+    @classmethod
+    def from_file(cls, filename: str, speed: float | None = None) -> "ReplayQuoteSource":
+        if filename.endswith(TICK_FILE_EXTENSION):
+            log = TickLog(filename)
+            return cls([Tick(float(record["time"]), log.symbols[record["symbol_id"]], float(record["bid"]),
+                             float(record["ask"]), float(record["last"])) for record in log.ticks], speed)
+        with open(filename, 'r') as f:
+            return cls([Tick.from_json(json.loads(line)) for line in f if line.strip()], speed)
+
+    def get_quotes(self, symbol: str) -> dict | None:
+        if not self.ticks or (self._index >= len(self.ticks) and self._clock > self.ticks[-1].time):
+            raise ReplayFinished()
+        self._apply_ticks()
+        quote: dict | None = self._quotes.get(symbol)
+        return {symbol: {"quote": dict(quote)}} if quote else None
+
+    def wait_for_price_change(self, symbol: str, poll_seconds: float):
+        times: list[float] = self._symbol_times.get(symbol, [])
+        i: int = bisect.bisect_right(times, self._clock)
+        if i >= len(times):
+            raise ReplayFinished()
+        self._advance(min(times[i], self._clock + TICK_TIMEOUT))
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self._clock)
+
+    def sleep(self, seconds: float):
+        self._advance(self._clock + seconds)
+
+    def place_order(self, instruction: str, symbol: str, numshares: int,
+                    limit_or_offset_or_bid_or_ask: float | str | None = None) -> OrderResult:
+        quote: dict = self._quotes.get(symbol, {})
+        if isinstance(limit_or_offset_or_bid_or_ask, float | int):
+            price: float | None = float(limit_or_offset_or_bid_or_ask)
+        elif limit_or_offset_or_bid_or_ask in ('bid', 'ask'):
+            price = quote.get(f"{limit_or_offset_or_bid_or_ask}Price")
+        else:  # market order:  buy at the ask, sell at the bid
+            price = quote.get("askPrice" if instruction.startswith('b') else "bidPrice")
+        order = SimulatedOrder(self.now(), instruction, symbol, numshares, price)
+        self.orders.append(order)
+        print(f"Simulated order: {order}")
+        return OrderResult(SimulatedResponse(), CancelResult([], {}), {})
+
+    #####
+
+    def _apply_ticks(self):
+        while self._index < len(self.ticks) and self.ticks[self._index].time <= self._clock:
+            tick: Tick = self.ticks[self._index]
+            self._quotes[tick.symbol] = {"bidPrice": tick.bid, "askPrice": tick.ask, "lastPrice": tick.last,
+                                         "quoteTime": int(tick.time * 1000)}
+            self._index += 1
+
+    def _advance(self, clock: float):
+        with loop_wait():
+            if self.speed:
+                time.sleep(max(0.0, clock - self._clock) / self.speed)
+            self._clock = max(self._clock, clock)
+
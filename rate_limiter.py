@@ -0,0 +1,91 @@
+import threading
+import time
+
+
+# Token-bucket request scheduler that keeps all Schwab API calls under the per-minute request quota.
+# Requests wait for a token in priority order, so placing or cancelling an order is never stuck behind quote polling,
+# and 429 (Too Many Requests) responses pause every request with an adaptive backoff.
+# Status:  Beta
+
+
+PRIORITY_ORDER = 0      # placing / cancelling orders, refreshing the access token
+PRIORITY_ACCOUNT = 1    # balances, positions, order and transaction history
+PRIORITY_QUOTE = 2      # market data, e.g. quote polling
+
+DEFAULT_REQUESTS_PER_MINUTE = 120   # Schwab's documented default quota
+DEFAULT_BURST = 20                  # max requests sent back-to-back after an idle period
+
+# Tokens a request of each priority must leave in the bucket, so lower priorities can't drain the last few tokens
+# that an order needs
+RESERVED_TOKENS = {
+    PRIORITY_ORDER: 0,
+    PRIORITY_ACCOUNT: 1,
+    PRIORITY_QUOTE: 2,
+}
+
+MIN_BACKOFF = 1.0       # seconds to pause after the first 429
+MAX_BACKOFF = 60.0      # longest pause; consecutive 429s double the pause up to this
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate: float = rate             # tokens added per second
+        self.capacity: float = capacity
+        self.tokens: float = capacity
+        self._last_refill: float = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def seconds_until(self, tokens: float) -> float:
+        """ Seconds until the bucket holds `tokens` tokens """
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+
+class RequestScheduler:
+    def __init__(self, requests_per_minute: int = DEFAULT_REQUESTS_PER_MINUTE, burst: int = DEFAULT_BURST):
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self.throttled_count: int = 0       # number of 429 responses received
+        self._paused_until: float = 0.0     # time.monotonic() before which no request may be sent
+        self._backoff: float = 0.0
+        self._waiting: dict[int, int] = {priority: 0 for priority in RESERVED_TOKENS}
+        self._condition = threading.Condition()
+
+    def acquire(self, priority: int = PRIORITY_ACCOUNT):
+        """ Block until a request of the given priority may be sent """
+        with self._condition:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.bucket.refill(now)
+                    # A bucket smaller than the reservation could never hold enough:  then priority order alone applies
+                    needed: float = min(1 + RESERVED_TOKENS[priority], self.bucket.capacity)
+                    higher_priority_waiting: bool = any(count for p, count in self._waiting.items() if p < priority)
+                    if now >= self._paused_until and not higher_priority_waiting and self.bucket.tokens >= needed:
+                        self.bucket.tokens -= 1
+                        return
+                    delay: float = max(self._paused_until - now, self.bucket.seconds_until(needed))
+                    # Wake at least when the next token arrives; a notify (e.g. higher priority request done) may
+                    # wake us earlier
+                    self._condition.wait(timeout=delay if delay > 0 else 1.0 / self.bucket.rate)
+            finally:
+                self._waiting[priority] -= 1
+                self._condition.notify_all()
+
+    def throttled(self, retry_after: float | None = None) -> float:
+        """ Record a 429 response; pause all requests and return the number of seconds paused """
+        with self._condition:
+            self.throttled_count += 1
+            self._backoff = min(MAX_BACKOFF, self._backoff * 2 if self._backoff else MIN_BACKOFF)
+            pause: float = retry_after if retry_after is not None else self._backoff
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self.bucket.tokens = 0  # the server thinks we're over quota, so stop bursting
+            return pause
+
+    def succeeded(self):
+        """ Record a non-429 response, resetting the backoff """
+        if self._backoff:
+            with self._condition:
+                self._backoff = 0.0
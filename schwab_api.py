@@ -1,42 +1,237 @@
+import contextvars
 import json
+import re
+import threading
 import time
-from datetime import (datetime, timedelta)
+from concurrent.futures import (Future, ThreadPoolExecutor, wait)
+from dataclasses import (dataclass)
+from datetime import (date, datetime, timedelta)
+from typing import (TYPE_CHECKING)
 from zoneinfo import (ZoneInfo)
 
 import requests
-from tzlocal import (get_localzone)
 
-from orders import (find_working_orders, WorkingOrder)
+from account import (AccountRegistry, AccountSnapshot, ALL_ACCOUNTS, combine_snapshots)
+from order_index import (WorkingOrderIndex, FULL_SYNC_DAYS, WORKING_STATUSES, working_orders_filename)
+from orders import (WorkingOrder)
+from quote_cache import (QuoteCache)
 from schwab_auth import (SchwabAuth)
+from schwab_http import (get_http_client, API_ROOT)
+from tick_recorder import (get_tick_recorder, TickRecorder)
+from tracing import (parse_json, span, ContextThreadPoolExecutor)
+
+if TYPE_CHECKING:
+    from candle_cache import (CandleCache, Candles)
+
+TRADER_API_ROOT = f"{API_ROOT}/trader/v1"
+MARKETDATA_API_ROOT = f"{API_ROOT}/marketdata/v1"
+
+ACCOUNT_SNAPSHOT_MAX_AGE = 2.0          # seconds an account snapshot is re-used by bal, pos, flatten...
+WORKING_ORDER_INDEX_MAX_AGE = timedelta(seconds=30)  # re-sync the working order index if older than this
+ORDER_GONE_STATUSES = (400, 404, 409)   # cancel responses meaning the order is no longer working (not found, not cancelable)
+CANCEL_WORKERS = 8                      # max order cancellations in flight at once
+CANCEL_DEADLINE = 10.0                  # seconds to wait for all cancellations to be acknowledged
+MAX_SYMBOLS_PER_QUOTE_REQUEST = 500     # larger symbol lists are split into chunks, fetched in parallel
+PARALLEL_REQUEST_WORKERS = 4            # threads used to fan out independent requests, e.g. quote chunks
+
+# Session boundaries in Pacific Time, parsed once rather than on every order
+_PACIFIC_TZ = ZoneInfo("America/Los_Angeles")
+# _TIME_0400 = datetime.strptime("04:00", "%H:%M").time()
+# _TIME_0625 = datetime.strptime("06:25", "%H:%M").time()
+_TIME_0630 = datetime.strptime("06:30", "%H:%M").time()
+_TIME_1305 = datetime.strptime("13:05", "%H:%M").time()
+# _TIME_1330 = datetime.strptime("13:30", "%H:%M").time()
+# _TIME_1700 = datetime.strptime("17:00", "%H:%M").time()
+
+# Order body fields that depend only on the order type
+_ORDER_TEMPLATES: dict[str, dict] = {
+    "MARKET": {"orderType": "MARKET", "duration": "DAY", "orderStrategyType": "SINGLE"},
+    "LIMIT": {"orderType": "LIMIT", "duration": "DAY", "orderStrategyType": "SINGLE",
+              "complexOrderStrategyType": "NONE"},
+    "STOP": {"orderType": "STOP", "duration": "DAY", "orderStrategyType": "SINGLE",
+             "complexOrderStrategyType": "NONE"},
+    "TRAILING_STOP": {"orderType": "TRAILING_STOP", "duration": "DAY", "orderStrategyType": "SINGLE",
+                      "stopPriceLinkBasis": 'LAST', "stopPriceLinkType": 'VALUE', "stopType": 'STANDARD'},
+}
+_ORDER_PRICE_FIELDS: dict[str, str] = {"LIMIT": "price", "STOP": "stopPrice", "TRAILING_STOP": "stopPriceOffset"}
+_ORDER_INSTRUCTIONS: dict[str, str] = {
+    'b': "BUY", 'buy': "BUY", 'bs': "BUY", 'bts': "BUY",
+    's': "SELL", 'sell': "SELL", 'ss': "SELL", 'sts': "SELL",
+}
+_STOP_ORDER_TYPES: dict[str, str] = {'bs': "STOP", 'ss': "STOP", 'bts': "TRAILING_STOP", 'sts': "TRAILING_STOP"}
+
+_account_registry: AccountRegistry | None = None  # Access with get_account_registry()
+_selected_account: str | None = None  # Access with get_selected_account(); change with select_account()
+# The account a daemon command started with (see pin_selected_account()); unset in the REPL and one-shot commands
+_command_account: contextvars.ContextVar[str | None] = contextvars.ContextVar("command_account")
+_quote_cache: QuoteCache = QuoteCache()  # Access with get_quote_cache()
+_candle_cache: "CandleCache | None" = None  # Access with get_candle_cache()
+_executor: ThreadPoolExecutor | None = None  # Access with _get_executor()
+_cancel_executor: ThreadPoolExecutor | None = None
+_working_order_indexes: dict[str, WorkingOrderIndex] = {}  # account hash -> index; access with get_working_order_index()
+_account_snapshots: dict[str, AccountSnapshot] = {}  # account hash -> snapshot; access with get_account_snapshot()
+_account_snapshot_locks: dict[str, threading.Lock] = {}
+_account_snapshots_lock = threading.Lock()
+_account_snapshot_generation: int = 0  # bumped by invalidate_account_snapshot(), so fetches it overtakes aren't kept
+
+
+@dataclass
+class CancelResult:
+    ok: list[str]               # ids of cancelled orders
+    failed: dict[str, str]      # order id -> error
+
+    def all_ok(self) -> bool:
+        return not self.failed
+
+
+@dataclass
+class OrderResult:
+    response: requests.Response
+    cancel_result: CancelResult
+    timings: dict[str, float]   # seconds spent in each phase:  'cancel', 'quote', 'serialize', 'post', 'total'
+
+    def format_timings(self) -> str:
+        return ", ".join(f"{phase} {self.timings[phase] * 1000:.0f}ms"
+                         for phase in ("cancel", "quote", "serialize", "post", "total") if phase in self.timings)
+
+
+@dataclass
+class QuoteBatch:
+    quotes: dict            # {symbol: quote}
+    missing: list[str]      # requested symbols that have no quote, e.g. misspelled or delisted
+
+
+def get_quote_cache() -> QuoteCache:
+    return _quote_cache
+
+
+def get_candle_cache() -> "CandleCache":
+    """ The candle cache, created on first use:  candle_cache.py imports NumPy, which is slow to import """
+    global _candle_cache
+    if not _candle_cache:
+        from candle_cache import (CandleCache)
+        _candle_cache = CandleCache()
+    return _candle_cache
+
+
+def local_timezone():
+    """ tzlocal.get_localzone(); tzlocal is imported on first use, as it is slow to import """
+    from tzlocal import (get_localzone)
+    return get_localzone()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if not _executor:
+        _executor = ContextThreadPoolExecutor(max_workers=PARALLEL_REQUEST_WORKERS, thread_name_prefix="schwab_api")
+    return _executor
+
+
+def get_account_registry(schwab_auth: SchwabAuth, refresh: bool = False) -> AccountRegistry:
+    """ Return the account number -> hash map, loaded from accounts.json or, if not saved yet, from the server """
+    global _account_registry
+    if not _account_registry:
+        _account_registry = AccountRegistry()
+    if refresh or not _account_registry.accounts:
+        resp = get_http_client().get(f'{TRADER_API_ROOT}/accounts/accountNumbers', headers=schwab_auth.headers(), timeout=60)
+        if resp.ok:
+            _account_registry.update(parse_json(resp.text))
+    return _account_registry
 
-TRADER_API_ROOT = "https://api.schwabapi.com/trader/v1"
-MARKETDATA_API_ROOT = "https://api.schwabapi.com/marketdata/v1"
 
-_my_account_number: str | None = None  # Access with get_my_account_number()
+def get_my_account_number(schwab_auth: SchwabAuth) -> str:
+    """ Return the hash of the account that orders are placed in:  the selected account, or the primary account """
+    with span("get_my_account_number"):
+        registry: AccountRegistry = get_account_registry(schwab_auth)
+        selected: str | None = get_selected_account()
+        account_number: str | None = selected if selected != ALL_ACCOUNTS else None
+        account_hash: str | None = registry.accounts.get(account_number or registry.primary_account_number())
+        return account_hash if account_hash else "Something went wrong"
 
 
-def get_my_account_number(schwab_auth: SchwabAuth) -> str:
-    global _my_account_number
-    if not _my_account_number:
-        resp = requests.get(f'{TRADER_API_ROOT}/accounts/accountNumbers', headers=schwab_auth.headers(), timeout=60)
-        if not resp.ok:
-            return resp.text if resp.text else "Something went wrong"
-        j = json.loads(resp.text)
-        _my_account_number = j[0]["hashValue"]
+def select_account(schwab_auth: SchwabAuth, account: str) -> str | None:
+    """
+    Make `account` (an account number, its last digits, or 'all') the target of subsequent commands.
+    Returns the selected account number, or None if there is no such account.
+    """
+    global _selected_account
+    account_number: str | None = ALL_ACCOUNTS if account.lower() == ALL_ACCOUNTS \
+        else get_account_registry(schwab_auth).find(account)
+    if account_number:
+        _selected_account = account_number
+        _command_account.set(account_number)  # for the rest of this command, too
+    return account_number
 
-    return _my_account_number
+
+def pin_selected_account() -> contextvars.Token:
+    """
+    Keep the current selection for the rest of this context (e.g. one daemon command, and the work it hands to
+    other threads), so an 'acct' run concurrently by another daemon client doesn't switch the account mid-command
+    """
+    return _command_account.set(_selected_account)
+
+
+def get_selected_account() -> str | None:
+    """ Return the selected account number, ALL_ACCOUNTS, or None if the primary account is used """
+    return _command_account.get(_selected_account)
 
 
 def get_account_balance(schwab_auth: SchwabAuth):
-    params = {
-        'fields': 'positions',
-    }
-    resp = requests.get(f'{TRADER_API_ROOT}/accounts', params=params, headers=schwab_auth.headers(), timeout=60)
-    if not resp.ok:
-        return resp.text if resp.text else "Something went wrong"
-    j = json.loads(resp.text)
-    account_balance = j[0]["securitiesAccount"]["currentBalances"]["equity"]
-    return account_balance
+    snapshot: AccountSnapshot | None = get_account_snapshot(schwab_auth)
+    if not snapshot:
+        return "Something went wrong"
+    return snapshot.equity
+
+
+def get_account_snapshot(schwab_auth: SchwabAuth, max_age: float = ACCOUNT_SNAPSHOT_MAX_AGE,
+                         account_hash: str | None = None) -> AccountSnapshot | None:
+    """
+    Return balances and positions of an account (by default, the selected account) from one GET /accounts request,
+    re-using the previous snapshot if it is younger than `max_age` seconds and none of our orders have been placed or
+    cancelled since.  If all accounts are selected, their snapshots are fetched concurrently and combined.
+    Returns None on error.
+    """
+    if not account_hash and get_selected_account() == ALL_ACCOUNTS:
+        snapshots: list[AccountSnapshot | None] = get_account_snapshots(
+            schwab_auth, list(get_account_registry(schwab_auth).accounts.values()), max_age)
+        return combine_snapshots(snapshots) if snapshots and all(snapshots) else None
+
+    account_hash = account_hash if account_hash else get_my_account_number(schwab_auth)
+    with _account_snapshots_lock:
+        lock: threading.Lock = _account_snapshot_locks.setdefault(account_hash, threading.Lock())
+    with lock:  # callers arriving while a snapshot is being fetched share it
+        snapshot: AccountSnapshot | None = _account_snapshots.get(account_hash)
+        if snapshot and snapshot.age() <= max_age:
+            return snapshot
+        params = {
+            'fields': 'positions',
+        }
+        generation: int = _account_snapshot_generation
+        resp = get_http_client().get(f'{TRADER_API_ROOT}/accounts/{account_hash}', params=params,
+                                     headers=schwab_auth.headers(), timeout=60)
+        if not resp.ok:
+            return None
+        snapshot = AccountSnapshot.from_json(parse_json(resp.text))
+        with _account_snapshots_lock:
+            # An order placed or cancelled while this was being fetched may not be reflected in it
+            if generation == _account_snapshot_generation:
+                _account_snapshots[account_hash] = snapshot
+        return snapshot
+
+
+def get_account_snapshots(schwab_auth: SchwabAuth, account_hashes: list[str],
+                          max_age: float = ACCOUNT_SNAPSHOT_MAX_AGE) -> list[AccountSnapshot | None]:
+    """ Fetch the snapshots of several accounts concurrently """
+    return list(_get_executor().map(lambda account_hash: get_account_snapshot(schwab_auth, max_age, account_hash),
+                                    account_hashes))
+
+
+def invalidate_account_snapshot():
+    """ Balances and positions change when orders are placed or cancelled, so the next snapshot must be fetched """
+    global _account_snapshot_generation
+    with _account_snapshots_lock:
+        _account_snapshot_generation += 1
+        _account_snapshots.clear()
 
 
 def place_order(schwab_auth: SchwabAuth, instruction: str, symbol: str, numshares: int,
@@ -55,14 +250,44 @@ def place_order(schwab_auth: SchwabAuth, instruction: str, symbol: str, numshare
         a string -- 'bid' or 'ask',
         None -- Market order
     """
+    return place_order_fast(schwab_auth, instruction, symbol, numshares, limit_or_offset_or_bid_or_ask).response
 
-    symbol = symbol.upper()
 
-    delete_working_orders(schwab_auth, symbol)
+def place_order_fast(schwab_auth: SchwabAuth, instruction: str, symbol: str, numshares: int,
+                     limit_or_offset_or_bid_or_ask: float | str | None = None) -> OrderResult:
+    """
+    Same as place_order(), but returns an OrderResult with the time spent in each phase.
+    The quote for a 'bid'/'ask' order is fetched while the symbol's working orders are being cancelled, and the
+    order is submitted as soon as both are done.
+    """
+    start: float = time.perf_counter()
+    timings: dict[str, float] = {}
+
+    def timed(phase: str, func, *args):
+        phase_start: float = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            timings[phase] = time.perf_counter() - phase_start
 
+    symbol = symbol.upper()
+    instruction = instruction.lower()
+    # Just use B or S and the server will automatically know if it is short-related
+    order_instruction: str | None = _ORDER_INSTRUCTIONS.get(instruction)
+    assert order_instruction, f'Illegal instruction: {instruction}'
+
+    # Fetch the quote for a 'bid'/'ask' order in the background, while the working orders are being cancelled
+    quote_future: Future | None = None
     if limit_or_offset_or_bid_or_ask == 'bid' or limit_or_offset_or_bid_or_ask == 'ask':
+        quote_future = _get_executor().submit(timed, "quote", get_quotes, symbol, schwab_auth, 0)  # fresh quote
+
+    cancel_result: CancelResult = timed("cancel", delete_working_orders, schwab_auth, symbol)
+    if not cancel_result.all_ok():
+        print(f"Warning:  {len(cancel_result.failed)} working order(s) for {symbol} could not be cancelled")
+
+    if quote_future:
         # get quote of the symbol to use the current bid/ask
-        quotes: dict = get_quotes(symbol, schwab_auth)
+        quotes: dict = quote_future.result()
         q = quotes[symbol]['quote']
         limit_or_offset = q['bidPrice'] if limit_or_offset_or_bid_or_ask == 'bid' else q['askPrice']
     elif limit_or_offset_or_bid_or_ask:
@@ -70,36 +295,61 @@ def place_order(schwab_auth: SchwabAuth, instruction: str, symbol: str, numshare
     else:
         limit_or_offset = None
 
-    order_type = "TRAILING_STOP" if instruction == "bts" or instruction == 'sts' else \
-        "STOP" if instruction == 'ss' or instruction == 'bs' else \
-            "LIMIT" if limit_or_offset else "MARKET"
-    is_trailing_stop = order_type == "TRAILING_STOP"
-    is_stop = order_type == "STOP"
+    order_type: str = _STOP_ORDER_TYPES.get(instruction) or ("LIMIT" if limit_or_offset else "MARKET")
 
-    # Just use B or S and the server will automatically know if it is short-related
-    instruction = instruction.lower()
-    if instruction == 'b' or instruction == 'buy' or instruction == 'bs' or instruction == 'bts':
-        instruction = "BUY"
-    elif instruction == 's' or instruction == 'sell' or instruction == 'ss' or instruction == 'sts':
-        instruction = "SELL"
-    else:
-        assert False, f'Illegal instruction: {instruction}'
+    serialize_start: float = time.perf_counter()
+    data = {
+        **_ORDER_TEMPLATES[order_type],
+        "session": _get_session(),
+        "orderLegCollection": [
+            {
+                "orderLegType": 'EQUITY',
+                "instruction": order_instruction,
+                "quantity": numshares,
+                "quantityType": 'SHARES',
+                "instrument": {
+                    "symbol": symbol,
+                    "assetType": "EQUITY"
+                }
+            }
+        ]
+    }
+    price_field: str | None = _ORDER_PRICE_FIELDS.get(order_type)
+    if price_field:
+        data[price_field] = limit_or_offset
 
+    data = json.dumps(data)  # Must be a string, since the Content-Type is "application/json"
+    timings["serialize"] = time.perf_counter() - serialize_start
+
+    post_start: float = time.perf_counter()
+    headers = schwab_auth.headers()
+    headers["Content-Type"] = "application/json"  # necessary????
+    resp = get_http_client().post(f'{TRADER_API_ROOT}/accounts/{get_my_account_number(schwab_auth)}/orders', data=data,
+                         headers=headers, timeout=60)
+    timings["post"] = time.perf_counter() - post_start
+    if resp.ok:
+        invalidate_account_snapshot()
+
+    # Record our own order in the working order index; a market order is filled immediately so never stays working
+    location: str | None = resp.headers.get("Location") if resp.ok else None   # e.g. ".../orders/1002342432"
+    if location and order_type != "MARKET":
+        index: WorkingOrderIndex = _load_working_order_index(schwab_auth)
+        index.add(WorkingOrder(symbol, order_instruction, numshares, limit_or_offset or 0.0, order_type,
+                               location.rstrip('/').split('/')[-1]))
+        index.save()
+
+    timings["total"] = time.perf_counter() - start
+    return OrderResult(resp, cancel_result, timings)
 
-    duration: str = "DAY"
+
+def _get_session() -> str:
+    """ Trading session for an order placed now """
 
     # Documented session values from https://developer.schwab.com/products/trader-api... are:  ["NORMAL", "AM", "PM", "SEAMLESS"]
 
     # Determine the trading session based on current Pacific Time
-    now_pacific = datetime.now(ZoneInfo("America/Los_Angeles"))
-    # time_0400 = datetime.strptime("04:00", "%H:%M").time()
-    # time_0625 = datetime.strptime("06:25", "%H:%M").time()
-    time_0630 = datetime.strptime("06:30", "%H:%M").time()
-    time_1305 = datetime.strptime("13:05", "%H:%M").time()
-    # time_1330 = datetime.strptime("13:30", "%H:%M").time()
-    # time_1700 = datetime.strptime("17:00", "%H:%M").time()
-
-    if time_0630 <= now_pacific.time() <= time_1305:
+    now_pacific = datetime.now(_PACIFIC_TZ)
+    if _TIME_0630 <= now_pacific.time() <= _TIME_1305:
         session: str = "NORMAL"
     else:
         session: str = "SEAMLESS"  # requires LIMIT
@@ -114,66 +364,120 @@ def place_order(schwab_auth: SchwabAuth, instruction: str, symbol: str, numshare
     #     session: str = "DAY"  // "AM" had error "REJECTED:  An am./p.m. session order can only be submitted as a day order"
     # else:
     #     session: str = "EXTO"
+    return session
 
-    data = {
-        "orderType": order_type,
-        "session": session,
-        "duration": duration,
-        "orderStrategyType": "SINGLE",
-        "orderLegCollection": [
-            {
-                "orderLegType": 'EQUITY',
-                "instruction": instruction,
-                "quantity": numshares,
-                "quantityType": 'SHARES',
-                "instrument": {
-                    "symbol": symbol,
-                    "assetType": "EQUITY"
-                }
-            }
-        ]
-    }
-
-    if is_trailing_stop:
-        data["stopPriceLinkBasis"] = 'LAST'
-        data["stopPriceLinkType"] = 'VALUE'
-        data["stopPriceOffset"] = limit_or_offset
-        data["stopType"] = 'STANDARD'
-    elif is_stop:
-        data["complexOrderStrategyType"] = "NONE"
-        data["stopPrice"] = limit_or_offset
-    elif limit_or_offset:
-        data["complexOrderStrategyType"] = "NONE"
-        data["price"] = limit_or_offset
 
-    data = json.dumps(data)  # Must be a string, since the Content-Type is "application/json"
-
-    headers = schwab_auth.headers()
-    headers["Content-Type"] = "application/json"  # necessary????
-    resp = requests.post(f'{TRADER_API_ROOT}/accounts/{get_my_account_number(schwab_auth)}/orders', data=data,
-                         headers=headers, timeout=60)
-    return resp
+def get_quotes(symbols: str, schwab_auth: SchwabAuth, max_age: float | None = None) -> dict | None:
+    """
+    Return {symbol: quote} for the comma (or space) separated symbols, or None on error.
+    Quotes younger than `max_age` seconds (default: the quote cache's max age) are served from the cache;
+    pass max_age=0 to always fetch a fresh quote.
+    """
+    return _quote_cache.get(normalize_symbols(symbols), lambda to_fetch: _fetch_quotes(to_fetch, schwab_auth),
+                            max_age)
+
+
+def get_quotes_batch(symbols: str | list[str], schwab_auth: SchwabAuth, max_age: float | None = None) -> QuoteBatch | None:
+    """ Like get_quotes(), but also reports which of the requested symbols got no quote """
+    symbol_list: list[str] = normalize_symbols(symbols)
+    quotes: dict | None = _quote_cache.get(symbol_list, lambda to_fetch: _fetch_quotes(to_fetch, schwab_auth),
+                                           max_age)
+    if quotes is None:
+        return None
+    return QuoteBatch(quotes, [symbol for symbol in symbol_list if symbol not in quotes])
+
+
+def normalize_symbols(symbols: str | list[str]) -> list[str]:
+    """ Upper case, de-duplicated list of symbols, e.g. "aapl, nvda,AAPL" -> ['AAPL', 'NVDA'] """
+    if isinstance(symbols, str):
+        symbols = re.split(r'[\s,]+', symbols)
+    return list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()))
+
+
+def _fetch_quotes(symbols: list[str], schwab_auth: SchwabAuth) -> dict | None:
+    """ Fetch quotes in chunks of MAX_SYMBOLS_PER_QUOTE_REQUEST, in parallel, and merge them into one dict """
+    chunks: list[list[str]] = [symbols[i:i + MAX_SYMBOLS_PER_QUOTE_REQUEST]
+                               for i in range(0, len(symbols), MAX_SYMBOLS_PER_QUOTE_REQUEST)]
+    if len(chunks) == 1:
+        return _fetch_quote_chunk(chunks[0], schwab_auth)
+
+    results: list[dict | None] = list(_get_executor().map(lambda chunk: _fetch_quote_chunk(chunk, schwab_auth), chunks))
+    if all(result is None for result in results):
+        return None
+
+    # A failed chunk leaves its symbols out of the merged result, so callers see them as missing
+    quotes: dict = {}
+    for result in results:
+        if result:
+            quotes.update(result)
+    return quotes
 
 
-def get_quotes(symbols: str, schwab_auth: SchwabAuth) -> dict | None:
+def _fetch_quote_chunk(symbols: list[str], schwab_auth: SchwabAuth) -> dict | None:
     params = {
-        'symbols': symbols,
+        'symbols': ','.join(symbols),
         'fields': 'quote,reference'
     }
 
-    resp = requests.get(f'{MARKETDATA_API_ROOT}/quotes', params=params, headers=schwab_auth.headers(), timeout=60)
-    quotes: dict = json.loads(resp.text) if resp.ok else None
+    resp = get_http_client().get(f'{MARKETDATA_API_ROOT}/quotes', params=params, headers=schwab_auth.headers(), timeout=60)
+    quotes: dict = parse_json(resp.text) if resp.ok else None
+    if quotes:
+        quotes.pop("errors", None)  # e.g. {"invalidSymbols": [...]}; callers see those symbols as missing
+        recorder: TickRecorder | None = get_tick_recorder()
+        if recorder:
+            recorder.record_quotes(quotes)
     return quotes
 
 
+def get_price_history(symbol: str, schwab_auth: SchwabAuth, frequency: str = "daily", start: date | None = None,
+                      end: date | None = None) -> "Candles | None":
+    """
+    Return the candles of symbol at frequency (e.g. '1min', '5min', 'daily'; see candle_cache.FREQUENCIES) from start
+    to end inclusive (default: the last year), or None on error.
+    Candles are saved in the candle cache, so only days not fetched before are requested.
+    """
+    end = end if end else datetime.now(local_timezone()).date()
+    start = start if start else end - timedelta(days=365)
+    return get_candle_cache().get(symbol.upper(), frequency, start, end,
+                                  lambda s, f, range_start, range_end: _fetch_price_history(s, f, range_start, range_end,
+                                                                                            schwab_auth))
+
+
+def _fetch_price_history(symbol: str, frequency: str, start_date: datetime, end_date: datetime,
+                         schwab_auth: SchwabAuth) -> list | None:
+    from candle_cache import (FREQUENCIES)
+    frequency_type, frequency_number = FREQUENCIES[frequency]
+    params = {
+        'symbol': symbol,
+        'periodType': 'day' if frequency_type == 'minute' else 'year',
+        'frequencyType': frequency_type,
+        'frequency': frequency_number,
+        'startDate': int(start_date.timestamp() * 1000),
+        'endDate': int(end_date.timestamp() * 1000),
+        'needExtendedHoursData': 'false',
+    }
+    resp = get_http_client().get(f'{MARKETDATA_API_ROOT}/pricehistory', params=params, headers=schwab_auth.headers(),
+                                 timeout=60)
+    return parse_json(resp.text).get("candles", []) if resp.ok else None
+
+
 def get_account_positions(schwab_auth: SchwabAuth) -> requests.Response:
     params = {
         'fields': 'positions',
     }
-    resp: requests.Response = requests.get(f'{TRADER_API_ROOT}/accounts', params=params, headers=schwab_auth.headers(), timeout=60)
+    resp: requests.Response = get_http_client().get(f'{TRADER_API_ROOT}/accounts', params=params, headers=schwab_auth.headers(), timeout=60)
     return resp
 
 
+def get_streamer_info(schwab_auth: SchwabAuth) -> dict | None:
+    """ Return the streaming connection details (socket URL, customer id...) from the user preferences """
+    resp = get_http_client().get(f'{TRADER_API_ROOT}/userPreference', headers=schwab_auth.headers(), timeout=60)
+    if not resp.ok:
+        return None
+    streamer_info: list = parse_json(resp.text).get("streamerInfo", [])
+    return streamer_info[0] if streamer_info else None
+
+
 def get_transactions(schwab_auth: SchwabAuth, symbol: str, start_date: datetime, end_date: datetime) -> list | None:
     """Return JSON string of transactions"""
     params = {
@@ -185,52 +489,128 @@ def get_transactions(schwab_auth: SchwabAuth, symbol: str, start_date: datetime,
         'types': 'TRADE'
     }
 
-    resp = requests.get(f"{TRADER_API_ROOT}/accounts/{get_my_account_number(schwab_auth)}/transactions", params=params,
+    resp = get_http_client().get(f"{TRADER_API_ROOT}/accounts/{get_my_account_number(schwab_auth)}/transactions", params=params,
                         headers=schwab_auth.headers(), timeout=60)
-    transactions: list = json.loads(resp.text) if resp.ok else None
+    transactions: list = parse_json(resp.text) if resp.ok else None
     return transactions
 
 
-def get_orders(schwab_auth: SchwabAuth, start_date: datetime = None, end_date: datetime = None) -> list | None:
-    """Return JSON string of orders"""
+def get_orders(schwab_auth: SchwabAuth, start_date: datetime = None, end_date: datetime = None,
+               status: str | None = None) -> list | None:
+    """Return JSON string of orders, optionally only those with the specified status, e.g. 'WORKING'"""
 
-    start_date = start_date if start_date else datetime.now(get_localzone()).replace(hour=0, minute=0, second=0)
-    end_date = end_date if end_date else datetime.now(get_localzone()).replace(hour=23, minute=59, second=59)
+    start_date = start_date if start_date else datetime.now(local_timezone()).replace(hour=0, minute=0, second=0)
+    end_date = end_date if end_date else datetime.now(local_timezone()).replace(hour=23, minute=59, second=59)
     params = {
         'fromEnteredTime': start_date.astimezone(ZoneInfo('UTC')).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
         # e.g. '2024-10-03T00:00:00.000Z'
         'toEnteredTime': end_date.astimezone(ZoneInfo('UTC')).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
         # e.g. '2024-10-03T00:23:59.000Z'
     }
-
-    resp = requests.get(f"{TRADER_API_ROOT}/accounts/{get_my_account_number(schwab_auth)}/orders", params=params,
-                        headers=schwab_auth.headers(), timeout=60)
-    orders: list = json.loads(resp.text) if resp.ok else None
+    if status:
+        params['status'] = status
+
+    with span("get_orders", days=(end_date - start_date).days, status=status or "all") as orders_span:
+        resp = get_http_client().get(f"{TRADER_API_ROOT}/accounts/{get_my_account_number(schwab_auth)}/orders", params=params,
+                            headers=schwab_auth.headers(), timeout=60)
+        orders: list = parse_json(resp.text) if resp.ok else None
+        orders_span.set(orders=len(orders) if orders else 0)
     return orders
 
 
 def delete_order(schwab_auth: SchwabAuth, order_id: str) -> requests.Response:
-    return requests.delete(f"{TRADER_API_ROOT}/accounts/{get_my_account_number(schwab_auth)}/orders/{order_id}",
+    return get_http_client().delete(f"{TRADER_API_ROOT}/accounts/{get_my_account_number(schwab_auth)}/orders/{order_id}",
                            headers=schwab_auth.headers(), timeout=60)
 
 
-def delete_working_orders(schwab_auth: SchwabAuth, symbol: str):
-    """ Delete working orders for specified symbol that were placed within the past year.  This can be slow. """
-    end_date: datetime = datetime.now(get_localzone())
-    start_date = end_date - timedelta(days=365)
-    working_orders: list[WorkingOrder] = find_working_orders(get_orders(schwab_auth, start_date, end_date), symbol)
-    for order in working_orders:
-        resp: requests.Response = delete_order(schwab_auth, order.order_id)
+def get_working_order_index(schwab_auth: SchwabAuth,
+                            max_age: timedelta | None = WORKING_ORDER_INDEX_MAX_AGE) -> WorkingOrderIndex:
+    """ Return the working order index, first syncing it if it is older than `max_age` (None: only if never synced) """
+    index: WorkingOrderIndex = _load_working_order_index(schwab_auth)
+    now: datetime = datetime.now(local_timezone())
+    if not index.last_sync or index.needs_full_sync(now) or (max_age is not None and now - index.last_sync > max_age):
+        sync_working_orders(schwab_auth)
+    return index
+
+
+def _load_working_order_index(schwab_auth: SchwabAuth) -> WorkingOrderIndex:
+    account_hash: str = get_my_account_number(schwab_auth)
+    if account_hash not in _working_order_indexes:
+        _working_order_indexes[account_hash] = WorkingOrderIndex(account_hash, working_orders_filename(account_hash))
+    return _working_order_indexes[account_hash]
+
+
+def sync_working_orders(schwab_auth: SchwabAuth, full: bool = False) -> bool:
+    """
+    Bring the working order index up to date:  read only orders entered since the last sync (or the past year, for a
+    full sync), asking the server for just the working statuses.  Returns False if the server could not be read.
+    """
+    index: WorkingOrderIndex = _load_working_order_index(schwab_auth)
+    now: datetime = datetime.now(local_timezone())
+    full = full or index.needs_full_sync(now)
+    start_date: datetime = now - timedelta(days=FULL_SYNC_DAYS) if full else index.sync_start(now)
+    with span("sync working orders", full=full):
+        results: list[list | None] = list(
+            _get_executor().map(lambda status: get_orders(schwab_auth, start_date, now, status), WORKING_STATUSES))
+    if any(result is None for result in results):
+        print("Warning:  Unable to sync working orders")
+        return False
+    index.apply_sync([order for result in results for order in result], now, full)
+    index.save()
+    return True
+
+
+def delete_working_orders(schwab_auth: SchwabAuth, symbol: str, deadline: float = CANCEL_DEADLINE) -> CancelResult:
+    """
+    Cancel the working orders for specified symbol, as found in the working order index.  The cancellations are sent
+    concurrently; any not acknowledged within `deadline` seconds are reported as failed.
+    """
+    index: WorkingOrderIndex = get_working_order_index(schwab_auth)
+    working_orders: list[WorkingOrder] = index.find(symbol)
+    result = CancelResult([], {})
+    if not working_orders:
+        return result
+
+    global _cancel_executor
+    if not _cancel_executor:
+        _cancel_executor = ContextThreadPoolExecutor(max_workers=CANCEL_WORKERS, thread_name_prefix="cancel")
+    # An order with several legs is listed once per leg, but is cancelled once
+    orders: dict[str, WorkingOrder] = {order.order_id: order for order in working_orders}
+    futures: dict[Future, str] = {_cancel_executor.submit(delete_order, schwab_auth, order_id): order_id
+                                  for order_id in orders}
+    done, not_done = wait(futures, timeout=deadline)
+    for future in done:
+        order_id: str = futures[future]
+        try:
+            resp: requests.Response = future.result()
+        except Exception as e:  # e.g. a connection error or SchwabAccessTokenException; the other cancels still count
+            result.failed[order_id] = str(e)
+            continue
+        if resp.ok:
+            result.ok.append(order_id)
+            invalidate_account_snapshot()
+        else:
+            result.failed[order_id] = resp.text if resp.text else f"HTTP {resp.status_code}"
+        # The order is no longer working (e.g. it was filled or cancelled elsewhere).  Other errors, such as 401, 403
+        # or 429, say nothing about the order, so it stays in the index to be cancelled again.
+        if resp.ok or resp.status_code in ORDER_GONE_STATUSES:
+            index.remove(order_id)
+    for future in not_done:
+        result.failed[futures[future]] = f"No response within {deadline} seconds"
+    index.save()
+
+    for order_id, order in orders.items():
         print(
-            f"Deleting working order {order.order_id}:  {order.instruction} {order.symbol} {order.shares}... {"OK" if resp.ok else resp.text}")
+            f"Deleting working order {order_id}:  {order.instruction} {order.symbol} {order.shares}... {result.failed.get(order_id, "OK")}")
+    return result
 
 
 def show_working_orders(schwab_auth: SchwabAuth):
-    """ Show working orders that were placed within the past year.  This can be slow. """
-    end_date: datetime = datetime.now(get_localzone())
-    start_date = end_date - timedelta(days=365)
-    working_orders: list[WorkingOrder] = find_working_orders(get_orders(schwab_auth, start_date, end_date))
-    print("Working orders:")
-    for order in working_orders:
-        print(
-            f"  {order.order_id}:  {order.instruction} {order.symbol} {order.shares} @{order.price} {order.orderType}")
+    """ Show working orders that were placed within the past year """
+    sync_working_orders(schwab_auth, full=True)
+    working_orders: list[WorkingOrder] = _load_working_order_index(schwab_auth).find()
+    with span("format", lines=len(working_orders)):
+        print("Working orders:")
+        for order in working_orders:
+            print(
+                f"  {order.order_id}:  {order.instruction} {order.symbol} {order.shares} @{order.price} {order.orderType}")
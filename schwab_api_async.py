@@ -0,0 +1,86 @@
+import asyncio
+from concurrent.futures import (ThreadPoolExecutor)
+from datetime import (datetime)
+
+import requests
+
+import schwab_api
+from account import (AccountSnapshot)
+from schwab_auth import (SchwabAuth)
+from schwab_http import (get_http_client)
+from tracing import (ContextThreadPoolExecutor)
+
+
+# Coroutine versions of the schwab_api calls, so independent requests can be issued concurrently, e.g.
+#   resp, quotes = asyncio.run(gather(get_account_positions(schwab_auth), get_quotes("AAPL,NVDA", schwab_auth)))
+#
+# Each coroutine runs the blocking schwab_api call on an executor sized to the shared connection pool in schwab_http,
+# so every request still re-uses the same keep-alive connections and concurrency never exceeds the pool.
+# Status:  Beta
+
+
+_executor: ThreadPoolExecutor | None = None  # Access with _get_executor()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if not _executor:
+        _executor = ContextThreadPoolExecutor(max_workers=get_http_client().pool_maxsize, thread_name_prefix="schwab_api")
+    return _executor
+
+
+async def _run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+
+
+async def gather(*coroutines) -> list:
+    """ Run coroutines concurrently and return their results in order """
+    return await asyncio.gather(*coroutines)
+
+
+async def get_my_account_number(schwab_auth: SchwabAuth) -> str:
+    return await _run(schwab_api.get_my_account_number, schwab_auth)
+
+
+async def get_account_balance(schwab_auth: SchwabAuth):
+    return await _run(schwab_api.get_account_balance, schwab_auth)
+
+
+async def get_account_snapshot(schwab_auth: SchwabAuth) -> AccountSnapshot | None:
+    return await _run(schwab_api.get_account_snapshot, schwab_auth)
+
+
+async def get_account_positions(schwab_auth: SchwabAuth) -> requests.Response:
+    return await _run(schwab_api.get_account_positions, schwab_auth)
+
+
+async def get_quotes(symbols: str, schwab_auth: SchwabAuth) -> dict | None:
+    return await _run(schwab_api.get_quotes, symbols, schwab_auth)
+
+
+async def get_quotes_batch(symbols: str | list[str], schwab_auth: SchwabAuth) -> schwab_api.QuoteBatch | None:
+    return await _run(schwab_api.get_quotes_batch, symbols, schwab_auth)
+
+
+async def place_order(schwab_auth: SchwabAuth, instruction: str, symbol: str, numshares: int,
+                      limit_or_offset_or_bid_or_ask: float | str | None = None) -> requests.Response:
+    return await _run(schwab_api.place_order, schwab_auth, instruction, symbol, numshares,
+                      limit_or_offset_or_bid_or_ask)
+
+
+async def get_transactions(schwab_auth: SchwabAuth, symbol: str, start_date: datetime,
+                           end_date: datetime) -> list | None:
+    return await _run(schwab_api.get_transactions, schwab_auth, symbol, start_date, end_date)
+
+
+async def get_orders(schwab_auth: SchwabAuth, start_date: datetime = None, end_date: datetime = None) -> list | None:
+    return await _run(schwab_api.get_orders, schwab_auth, start_date, end_date)
+
+
+async def delete_order(schwab_auth: SchwabAuth, order_id: str) -> requests.Response:
+    return await _run(schwab_api.delete_order, schwab_auth, order_id)
+
+
+async def delete_orders(schwab_auth: SchwabAuth, order_ids: list[str]) -> list[requests.Response]:
+    """ Delete all specified orders concurrently; responses are returned in the same order as order_ids """
+    return await gather(*[delete_order(schwab_auth, order_id) for order_id in order_ids])
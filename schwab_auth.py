@@ -1,16 +1,24 @@
 import base64
 import json
 import os
+import threading
+import time
 from datetime import (datetime, timedelta)
 from typing import (Mapping)
 
-import dotenv
-import requests
-from dateutil import parser
+from schwab_http import (get_http_client, API_ROOT)
+from tracing import (parse_json, span)
 
 
+# Access tokens are refreshed by a background thread REFRESH_AHEAD_SECONDS before they expire, so requests (orders in
+# particular) don't wait on OAuth; a request only refreshes the token itself if it has already expired, e.g. at startup.
+# Refreshes are serialized by a lock, so concurrent threads never refresh twice.
 
-api_root = "https://api.schwabapi.com/v1"
+
+api_root = f"{API_ROOT}/v1"
+EXPIRY_MARGIN_SECONDS = 30      # a token is treated as expired this long before the server says it expires
+REFRESH_AHEAD_SECONDS = 300     # refresh this long before the token is treated as expired (tokens last 30 minutes)
+REFRESH_RETRY_SECONDS = 30      # after a failed background refresh, retry this much later
 
 
 class SchwabAccessTokenException(Exception):
@@ -25,7 +33,18 @@ class SchwabAuth:
     def __init__(self, app_key: str, app_secret: str):
         self.app_key: str = app_key
         self.app_secret: str = app_secret
-        self.auth: dict = self._load_auth()
+        self._auth: dict | None = None
+        self._token: tuple[str, float] | None = None  # authorization header, time.monotonic() when it expires
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread: threading.Thread | None = None
+        self._refresh_rejected: bool = False  # a background refresh was rejected; no more until a request's succeeds
+
+    @property
+    def auth(self) -> dict:
+        """ The contents of auth.json, read on first use, so startup doesn't wait for it """
+        if self._auth is None:
+            self._auth = self._load_auth()
+        return self._auth
 
     def _load_auth(self) -> dict:
         # Load auth.json
@@ -48,17 +67,30 @@ class SchwabAuth:
         }
         return headers
 
-    def _is_access_token_expired(self) -> bool:
+    def _load_token(self) -> tuple[str, float]:
+        """ The access token in auth.json, with its expiration as a time.monotonic() deadline """
         if not self.auth:
-            return True  # don't have an access token, so say it is expired so another is generated
-
-        expiration_origin_time = parser.parse(self.auth['expiration_origin_time'])
-
-        # Server defines when token expires (in seconds); subtract 30 seconds to request new token a bit before actual expiration
-        access_token_expiration = expiration_origin_time + timedelta(seconds=int(self.auth['expires_in']) - 30)
-        return datetime.now() > access_token_expiration
-
-    def _update_access_token(self):
+            return "", 0.0  # don't have an access token, so say it is expired so another is generated
+
+        # Written with str(datetime), so no need for dateutil's parser, which is slow to import
+        expiration_origin_time = datetime.fromisoformat(self.auth['expiration_origin_time'])
+
+        # Server defines when token expires (in seconds); subtract a margin to request new token a bit before actual expiration
+        access_token_expiration = expiration_origin_time + timedelta(seconds=int(self.auth['expires_in']) - EXPIRY_MARGIN_SECONDS)
+        expires_at: float = time.monotonic() + (access_token_expiration - datetime.now()).total_seconds()
+        return f"{self.auth['token_type']} {self.auth['access_token']}", expires_at
+
+    def _update_access_token(self, expired_token: tuple[str, float] | None):
+        """ Refresh the access token, unless another thread already replaced expired_token """
+        with self._refresh_lock:
+            if self._token is not expired_token:
+                return
+            with span("auth refresh token"):
+                self._request_access_token()
+            self._token = (f"{self.auth['token_type']} {self.auth['access_token']}",
+                           time.monotonic() + int(self.auth['expires_in']) - EXPIRY_MARGIN_SECONDS)
+
+    def _request_access_token(self):
         # Request a new access token
         print('Refreshing access token...')
         token_url = f'{api_root}/oauth/token'
@@ -67,20 +99,22 @@ class SchwabAuth:
             'grant_type': 'refresh_token',
             'refresh_token': self.auth['refresh_token'],
         }
-        response = requests.post(token_url, headers=headers, data=data, timeout=60)
+        response = get_http_client().post(token_url, headers=headers, data=data, timeout=60)
         if not response.ok:
             message = 'Fatal error:  Try running gen_refresh_token.py to update Refresh token.  Full error:'
             message += response.text
             raise SchwabAccessTokenException(message)
 
         # Merge the new auth with the old auth.json, preserving any of our app-specific fields, e.g. expiration_origin_time
-        new_auth = json.loads(response.text)
+        new_auth = parse_json(response.text)
         self.auth.update(new_auth)
 
         # Source: https://stackoverflow.com/a/13356706
         self.auth['expiration_origin_time'] = str(datetime.now())
-        with open('auth.json', 'w') as f:
+        # Replaced in one step, so a process exiting mid-write (e.g. during a background refresh) can't truncate it
+        with open('auth.json.tmp', 'w') as f:
             json.dump(self.auth, f, indent=4)
+        os.replace('auth.json.tmp', 'auth.json')
 
         return self.auth['access_token']
 
@@ -89,17 +123,51 @@ class SchwabAuth:
         Returns e.g. "Bearer <Access token>"
         '''
 
-        if self._is_access_token_expired():
-            self._update_access_token()
-
-        # Use refresh token to request new access token
-        token_type = self.auth['token_type']
-        access_token = self.auth['access_token']
-        return f"{token_type} {access_token}"
+        token: tuple[str, float] | None = self._token
+        if not token:
+            with self._refresh_lock:
+                if not self._token:
+                    self._token = self._load_token()
+            token = self._token
+        if time.monotonic() >= token[1]:
+            # Expired, e.g. at startup:  this request has to wait for a new one
+            self._update_access_token(token)
+            token = self._token
+            self._refresh_rejected = False
+        if not self._refresh_thread and not self._refresh_rejected:
+            self._start_refresh_thread()
+        return token[0]
+
+    def _start_refresh_thread(self):
+        with self._refresh_lock:
+            if not self._refresh_thread:
+                self._refresh_thread = threading.Thread(target=self._refresh_ahead, name="token-refresh", daemon=True)
+                self._refresh_thread.start()
+
+    def _refresh_ahead(self):
+        """
+        Refresh the access token REFRESH_AHEAD_SECONDS before it expires, until the server rejects the refresh token
+        """
+        while True:
+            token: tuple[str, float] = self._token
+            time.sleep(max(0.0, token[1] - REFRESH_AHEAD_SECONDS - time.monotonic()))
+            try:
+                self._update_access_token(token)
+            except SchwabAccessTokenException:
+                # Retrying won't help (e.g. the refresh token has expired):  the request that finds the token expired
+                # reports the error, and restarts this thread if its own refresh succeeds
+                with self._refresh_lock:
+                    self._refresh_rejected = True
+                    self._refresh_thread = None
+                return
+            except Exception as e:  # e.g. a network error; requests refresh it themselves once it has expired
+                print(f"Error refreshing access token: {e}")
+                time.sleep(REFRESH_RETRY_SECONDS)
 
     def headers(self) -> dict:
         # Refresh access token if necessary
-        authorization: str = self._get_schwab_authorization()
+        with span("auth headers"):
+            authorization: str = self._get_schwab_authorization()
         return {
             'Authorization': authorization
         }
@@ -112,6 +180,7 @@ if __name__ == "__main__":
     # Load environment variables from file .\.env containing sensitive info that shouldn't be committed to git
     # See .\.env.sample for sample values (which don't work as-is, substitute them with the values specified in
     # your Schwab account settings, where you set up your application
+    import dotenv
     dotenv.load_dotenv()
 
     # Data required to generate a Schwab API refresh token, which is then used to generate an Access token used in Schwab web requests
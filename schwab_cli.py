@@ -1,18 +1,20 @@
-import locale
 import os
 import sys
 from datetime import (datetime)
 
-import dotenv
-
 from commands import (show_help, get_command_prompts, get_command_prompt, exec_command)
+from profiler import (CPROFILE, SAMPLE)
 from schwab_auth import (SchwabAuth)
 
 
 # Status:  Production
 
 
-def process_line(line: str, schwab_auth: SchwabAuth) -> str|None:
+# --profile profiles each command (as if prefixed with 'profile'); --profile=sample uses the sampling profiler
+PROFILE_FLAGS = {"--profile": CPROFILE, "--profile=sample": SAMPLE}
+
+
+def process_line(line: str, schwab_auth: SchwabAuth, profile_mode: str|None = None) -> str|None:
     """Returns None if line does not contain a single command (valid or not), else returns the name of the command"""
     line = line.strip()
     parts = line.split(' ')
@@ -21,17 +23,19 @@ def process_line(line: str, schwab_auth: SchwabAuth) -> str|None:
 
     # Try executing as an advanced command first
     cmd = parts[0]
-    exec_command(cmd, parts, schwab_auth)
+    if profile_mode and cmd not in ("profile", "q"):
+        parts = ["profile"] + ([SAMPLE] if profile_mode == SAMPLE else []) + parts
+    exec_command(parts[0], parts, schwab_auth)
     return cmd
 
 
-def repl(initial_line, schwab_auth: SchwabAuth):
+def repl(initial_line, schwab_auth: SchwabAuth, profile_mode: str|None = None):
     refresh_token_expiration: datetime = schwab_auth.refresh_token_expected_expiration_time()
     delta = refresh_token_expiration - datetime.now()
     days_until: float = delta.total_seconds() / 3600 / 24  # seconds -> hours -> days
     print(f"Refresh token expected expiration:  {refresh_token_expiration}; in {days_until:.1f} days.")
     if initial_line:
-        process_line(initial_line, schwab_auth)
+        process_line(initial_line, schwab_auth, profile_mode)
 
     usage_prompt = ""
     for advanced_prompt in get_command_prompts():
@@ -39,11 +43,15 @@ def repl(initial_line, schwab_auth: SchwabAuth):
     while True:
         prompt = None
         print()
-        line = input("Enter a command (leave blank for help) then press Return> ")
+        try:
+            line = input("Enter a command (leave blank for help) then press Return> ")
+        except EOFError:  # end of piped input
+            print()
+            return
         if not line:
             show_help()
         else:
-            cmd = process_line(line, schwab_auth)
+            cmd = process_line(line, schwab_auth, profile_mode)
             '''
             if cmd:
                 cmd_prompt = get_command_prompt(cmd)
@@ -55,13 +63,13 @@ def repl(initial_line, schwab_auth: SchwabAuth):
 
 
 def InitSchwabAuth() -> SchwabAuth|None:
-    # Set the locale for currency formatting
-    locale.setlocale(locale.LC_ALL, "en_US")
-
     # Load environment variables from file .\.env containing sensitive info that shouldn't be committed to git
     # See .\.env.sample for sample values (which don't work as-is, substitute them with the values specified in
     # your Schwab account settings, where you set up your application
-    dotenv.load_dotenv()
+    # (dotenv is slow to import, so skip it if they are already set)
+    if not os.environ.get("SCHWAB_APP_KEY") or not os.environ.get("SCHWAB_APP_SECRET"):
+        import dotenv
+        dotenv.load_dotenv()
 
     # Data required to generate a Schwab API refresh token, which is then used to generate an Access token used in Schwab web requests
     app_key = os.environ.get("SCHWAB_APP_KEY")              # e.g. "lL5apjgztC82RsFDaoJLeH7FqnHz5rnL"
@@ -76,8 +84,11 @@ def InitSchwabAuth() -> SchwabAuth|None:
 
 def main(schwab_auth: SchwabAuth):
     args = sys.argv[1:]  # all but program name
+    profile_mode: str|None = PROFILE_FLAGS.get(args[0]) if args else None
+    if profile_mode:
+        args = args[1:]
     initial_line = " ".join(args) if len(args) > 0 else None
-    repl(initial_line, schwab_auth)
+    repl(initial_line, schwab_auth, profile_mode)
 
 
 if __name__ == "__main__":
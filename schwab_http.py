@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import (HTTPAdapter)
+from urllib3.util.retry import (Retry)
+
+from metrics import (endpoint_name, get_metrics, ERROR_STATUS)
+from rate_limiter import (RequestScheduler, DEFAULT_BURST, DEFAULT_REQUESTS_PER_MINUTE, PRIORITY_ACCOUNT,
+                          PRIORITY_ORDER, PRIORITY_QUOTE)
+from tracing import (span, SPAN_KIND_CLIENT)
+
+
+# Shared, pooled keep-alive HTTP session used for every call to the Schwab API
+#
+# Set SCHWAB_API_ROOT (e.g. http://localhost:8700) to send every request to a local stand-in server, such as
+# mock_schwab_server.py, instead of Schwab.
+# Status:  Beta
+
+
+API_ROOT = os.environ.get("SCHWAB_API_ROOT", "https://api.schwabapi.com")
+
+DEFAULT_POOL_CONNECTIONS = 4        # number of hosts to keep a connection pool for (api.schwabapi.com, ...)
+DEFAULT_POOL_MAXSIZE = 10           # max keep-alive connections kept open to a single host
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.3        # seconds; sleeps 0.3, 0.6, 1.2... between retries
+DEFAULT_TIMEOUT = 60                # seconds
+DEFAULT_THROTTLE_RETRIES = 3        # times a request rejected with 429 (Too Many Requests) is re-sent
+
+# Only idempotent requests are retried -- retrying a POST could place the same order twice
+RETRY_METHODS = frozenset({"GET", "DELETE"})
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class SchwabHttpClient:
+    """
+    Holds a single requests.Session whose connections are kept alive and re-used, so steady-state requests
+    cost one round trip instead of a TCP + TLS handshake each time.
+    Every request first waits its turn in a RequestScheduler, which keeps us under Schwab's request quota.
+    """
+    def __init__(self, pool_connections: int = DEFAULT_POOL_CONNECTIONS, pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 retries: int = DEFAULT_RETRIES, backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+                 timeout: float = DEFAULT_TIMEOUT, requests_per_minute: int = DEFAULT_REQUESTS_PER_MINUTE,
+                 burst: int = DEFAULT_BURST, throttle_retries: int = DEFAULT_THROTTLE_RETRIES):
+        self.pool_maxsize: int = pool_maxsize
+        self.timeout: float = timeout
+        self.throttle_retries: int = throttle_retries
+        self.scheduler = RequestScheduler(requests_per_minute, burst)
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries, backoff_factor=backoff_factor,
+                      status_forcelist=RETRY_STATUSES, allowed_methods=RETRY_METHODS, raise_on_status=False)
+        # pool_block=True caps the number of simultaneous connections per host at pool_maxsize
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry,
+                              pool_block=True)
+        self.session: requests.Session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method: str, url: str, priority: int | None = None, **kwargs) -> requests.Response:
+        """ priority is one of rate_limiter.PRIORITY_*; by default it is derived from the method and url """
+        kwargs.setdefault("timeout", self.timeout)
+        priority = priority if priority is not None else _default_priority(method, url)
+        attempt: int = 0
+        with span(f"http {endpoint_name(method, url)}", SPAN_KIND_CLIENT) as http_span:
+            while True:
+                with span("rate limit wait"):
+                    self.scheduler.acquire(priority)
+                resp: requests.Response = self._timed_request(method, url, **kwargs)
+                http_span.set(status=resp.status_code, response_bytes=len(resp.content), attempts=attempt + 1)
+                if resp.status_code != 429:
+                    self.scheduler.succeeded()
+                    return resp
+                # A 429 means the request was rejected without being processed, so even an order can be re-sent
+                pause: float = self.scheduler.throttled(_retry_after(resp))
+                attempt += 1
+                if attempt > self.throttle_retries:
+                    return resp
+                print(f"Rate limited by Schwab; waiting {pause:.1f} seconds...")
+
+    def _timed_request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """ Send the request, recording its latency, sizes and status in metrics.get_metrics() """
+        start: float = time.perf_counter()
+        try:
+            resp: requests.Response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            get_metrics().record(method, url, ERROR_STATUS, time.perf_counter() - start)
+            raise
+        body = resp.request.body
+        get_metrics().record(method, url, str(resp.status_code), time.perf_counter() - start,
+                             len(body) if body else 0, len(resp.content))
+        return resp
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def _default_priority(method: str, url: str) -> int:
+    if method != "GET":
+        return PRIORITY_ORDER   # placing/cancelling an order, or refreshing the access token
+    if "/marketdata/" in url:
+        return PRIORITY_QUOTE
+    return PRIORITY_ACCOUNT
+
+
+def _retry_after(resp: requests.Response) -> float | None:
+    """ Seconds the server asked us to wait, if it said """
+    try:
+        return float(resp.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+_http_client: SchwabHttpClient | None = None  # Access with get_http_client()
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> SchwabHttpClient:
+    """ Returns the shared client, creating it with default settings on first use """
+    global _http_client
+    if not _http_client:
+        with _http_client_lock:
+            if not _http_client:
+                _http_client = SchwabHttpClient()
+    return _http_client
+
+
+def configure_http_client(**kwargs) -> SchwabHttpClient:
+    """ Replace the shared client with one using the specified settings (see SchwabHttpClient.__init__) """
+    global _http_client
+    with _http_client_lock:
+        if _http_client:
+            _http_client.close()
+        _http_client = SchwabHttpClient(**kwargs)
+    return _http_client
@@ -0,0 +1,259 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import (Callable)
+
+from websockets.asyncio.client import (connect, ClientConnection)
+from websockets.exceptions import (WebSocketException)
+
+from schwab_auth import (SchwabAuth)
+from tick_recorder import (get_tick_recorder, TickRecorder)
+
+
+# Client for Schwab's streaming (WebSocket) level one equity quotes.  Runs its own asyncio event loop on a background
+# thread, keeps the latest quote per symbol, and calls listeners on every tick.  Reconnects (logging in and
+# re-subscribing) automatically if the connection drops or goes quiet.
+#
+# Set SCHWAB_STREAMER_URL (e.g. ws://localhost:8765) to connect to a local stand-in server instead of Schwab.
+# Status:  Beta
+
+
+# LEVELONE_EQUITIES field numbers -> the names used by the quotes REST endpoint, so ticks look like get_quotes() results
+LEVELONE_FIELDS = {
+    "1": "bidPrice",
+    "2": "askPrice",
+    "3": "lastPrice",
+    "8": "totalVolume",
+}
+LEVELONE_FIELD_LIST = "0," + ",".join(LEVELONE_FIELDS)
+
+HEARTBEAT_TIMEOUT = 30.0        # seconds without any message (the server sends heartbeats) before reconnecting
+MIN_RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 60.0
+
+TickListener = Callable[[str, dict], None]  # called with (symbol, quote), quote like {"lastPrice": ..., ...}
+
+
+class SchwabStreamerException(Exception):
+    """
+    This exception is thrown when the streamer could not log in.
+    """
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class SchwabStreamer:
+    def __init__(self, schwab_auth: SchwabAuth, streamer_info: dict, url: str | None = None):
+        """
+        streamer_info is the "streamerInfo" entry of GET /userPreference: streamerSocketUrl, schwabClientCustomerId,
+        schwabClientCorrelId, schwabClientChannel and schwabClientFunctionId
+        """
+        self.schwab_auth: SchwabAuth = schwab_auth
+        self.streamer_info: dict = streamer_info
+        self.url: str = url if url else streamer_info["streamerSocketUrl"]
+        self.connected: bool = False
+        self.reconnects: int = 0
+        self._quotes: dict[str, dict] = {}          # symbol -> latest quote
+        self._tick_counts: dict[str, int] = {}      # symbol -> number of ticks received
+        self._symbols: set[str] = set()             # subscribed symbols
+        self._listeners: list[TickListener] = []
+        self._condition = threading.Condition()     # notified on every tick
+        self._request_id: int = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._websocket: ClientConnection | None = None
+        self._thread: threading.Thread | None = None
+        self._stopping: bool = False
+
+    def start(self):
+        if self._thread:
+            return
+        self._stopping = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self._run(),), daemon=True,
+                                        name="schwab_streamer")
+        self._thread.start()
+
+    def stop(self):
+        if not self._thread:
+            return
+        self._stopping = True
+        if self._websocket:
+            asyncio.run_coroutine_threadsafe(self._websocket.close(), self._loop)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def add_listener(self, listener: TickListener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: TickListener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def subscribe(self, symbols: list[str]):
+        new_symbols: list[str] = [symbol.upper() for symbol in symbols if symbol.upper() not in self._symbols]
+        if new_symbols:
+            self._symbols.update(new_symbols)
+            self._send_threadsafe("ADD", new_symbols)
+
+    def unsubscribe(self, symbols: list[str]):
+        old_symbols: list[str] = [symbol.upper() for symbol in symbols if symbol.upper() in self._symbols]
+        if old_symbols:
+            self._symbols.difference_update(old_symbols)
+            self._send_threadsafe("UNSUBS", old_symbols)
+
+    def get_quotes(self, symbols: list[str]) -> dict:
+        """ Latest streamed quotes, shaped like get_quotes():  {symbol: {"quote": {...}}} """
+        with self._condition:
+            return {symbol: {"quote": dict(self._quotes[symbol])} for symbol in symbols if symbol in self._quotes}
+
+    def tick_count(self, symbol: str) -> int:
+        """ Number of ticks received for `symbol`; pass to wait_for_tick() to not miss ticks arriving in between """
+        with self._condition:
+            return self._tick_counts.get(symbol, 0)
+
+    def wait_for_tick(self, symbol: str, timeout: float, seen_ticks: int | None = None) -> bool:
+        """
+        Block until a tick for `symbol` arrives after the first `seen_ticks` (default: after now);
+        returns False if none arrived within `timeout` seconds
+        """
+        with self._condition:
+            count: int = seen_ticks if seen_ticks is not None else self._tick_counts.get(symbol, 0)
+            return self._condition.wait_for(lambda: self._tick_counts.get(symbol, 0) != count, timeout)
+
+    #####
+
+    def _next_request_id(self) -> int:
+        self._request_id += 1
+        return self._request_id
+
+    def _request(self, service: str, command: str, parameters: dict) -> dict:
+        return {
+            "service": service,
+            "command": command,
+            "requestid": self._next_request_id(),
+            "SchwabClientCustomerId": self.streamer_info.get("schwabClientCustomerId", ""),
+            "SchwabClientCorrelId": self.streamer_info.get("schwabClientCorrelId", ""),
+            "parameters": parameters,
+        }
+
+    def _subscription_request(self, command: str, symbols: list[str]) -> dict:
+        return self._request("LEVELONE_EQUITIES", command, {"keys": ",".join(symbols), "fields": LEVELONE_FIELD_LIST})
+
+    def _send_threadsafe(self, command: str, symbols: list[str]):
+        """ Send a subscription change from any thread; if not connected, it is sent on (re)connect """
+        if self.connected and self._loop:
+            message: str = json.dumps({"requests": [self._subscription_request(command, symbols)]})
+            asyncio.run_coroutine_threadsafe(self._websocket.send(message), self._loop)
+
+    async def _run(self):
+        delay: float = MIN_RECONNECT_DELAY
+        while not self._stopping:
+            try:
+                async with connect(self.url) as websocket:
+                    self._websocket = websocket
+                    await self._login(websocket)
+                    self.connected = True
+                    delay = MIN_RECONNECT_DELAY
+                    if self._symbols:
+                        await websocket.send(json.dumps(
+                            {"requests": [self._subscription_request("SUBS", sorted(self._symbols))]}))
+                    await self._receive(websocket)
+            except (OSError, ValueError, WebSocketException, asyncio.TimeoutError, SchwabStreamerException) as e:
+                if not self._stopping:
+                    print(f"Streamer disconnected ({e}); reconnecting in {delay:.0f} seconds...")
+            except Exception as e:  # e.g. SchwabAccessTokenException while logging in; keep the streamer thread alive
+                if not self._stopping:
+                    print(f"Streamer error ({type(e).__name__}: {e}); reconnecting in {delay:.0f} seconds...")
+            finally:
+                self.connected = False
+                self._websocket = None
+            if self._stopping:
+                break
+            await asyncio.sleep(delay)
+            delay = min(MAX_RECONNECT_DELAY, delay * 2)
+            self.reconnects += 1
+
+    async def _login(self, websocket: ClientConnection):
+        # headers() may refresh the token over HTTP, so keep it off the event loop
+        headers: dict = await asyncio.get_running_loop().run_in_executor(None, self.schwab_auth.headers)
+        access_token: str = headers["Authorization"].split(" ", 1)[-1]  # "Bearer <token>"
+        login = self._request("ADMIN", "LOGIN", {
+            "Authorization": access_token,
+            "SchwabClientChannel": self.streamer_info.get("schwabClientChannel", ""),
+            "SchwabClientFunctionId": self.streamer_info.get("schwabClientFunctionId", ""),
+        })
+        await websocket.send(json.dumps({"requests": [login]}))
+        while True:
+            message: dict = json.loads(await asyncio.wait_for(websocket.recv(), HEARTBEAT_TIMEOUT))
+            for response in message.get("response", []):
+                if response.get("command") == "LOGIN":
+                    content: dict = response.get("content", {})
+                    if content.get("code", 0) != 0:
+                        raise SchwabStreamerException(f"Login failed: {content.get('msg')}")
+                    return
+
+    async def _receive(self, websocket: ClientConnection):
+        while True:
+            # Any message, including the server's heartbeat notifications, proves the connection is alive
+            message: dict = json.loads(await asyncio.wait_for(websocket.recv(), HEARTBEAT_TIMEOUT))
+            for data in message.get("data", []):
+                if data.get("service") == "LEVELONE_EQUITIES":
+                    for content in data.get("content", []):
+                        try:
+                            self._on_tick(content)
+                        except Exception as e:  # a malformed tick must not take down the connection
+                            print(f"Streamer: ignoring tick {content}: {type(e).__name__}: {e}")
+
+    def _on_tick(self, content: dict):
+        symbol: str = content["key"]
+        with self._condition:
+            # Ticks carry only the fields that changed, so merge them into the latest quote
+            quote: dict = self._quotes.setdefault(symbol, {})
+            for field_number, name in LEVELONE_FIELDS.items():
+                if field_number in content:
+                    quote[name] = content[field_number]
+            quote["quoteTime"] = int(time.time() * 1000)  # epoch milliseconds, as in REST quotes
+            self._tick_counts[symbol] = self._tick_counts.get(symbol, 0) + 1
+            self._condition.notify_all()
+            quote = dict(quote)
+        recorder: TickRecorder | None = get_tick_recorder()
+        if recorder:
+            recorder.record(symbol, quote)
+        for listener in list(self._listeners):
+            try:
+                listener(symbol, quote)
+            except Exception as e:  # one failing listener must not starve the others or kill the streamer
+                print(f"Streamer: tick listener failed for {symbol}: {type(e).__name__}: {e}")
+
+
+_streamer: SchwabStreamer | None = None  # Access with get_streamer()
+
+
+def get_streamer(schwab_auth: SchwabAuth, streamer_info_loader: Callable[[SchwabAuth], dict | None]) -> SchwabStreamer | None:
+    """
+    Return the shared streamer, creating and starting it on first use.  `streamer_info_loader` returns the
+    "streamerInfo" user preference (see schwab_api.get_streamer_info); it is not called if SCHWAB_STREAMER_URL is set.
+    """
+    global _streamer
+    if not _streamer:
+        url: str | None = os.environ.get("SCHWAB_STREAMER_URL")
+        streamer_info: dict | None = {} if url else streamer_info_loader(schwab_auth)
+        if streamer_info is None:
+            return None
+        _streamer = SchwabStreamer(schwab_auth, streamer_info, url)
+        _streamer.start()
+    return _streamer
+
+
+def get_active_streamer() -> SchwabStreamer | None:
+    """ Return the shared streamer if streaming has been turned on, without starting it """
+    return _streamer
+
+
+def stop_streamer():
+    global _streamer
+    if _streamer:
+        _streamer.stop()
+        _streamer = None
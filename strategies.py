@@ -0,0 +1,16 @@
+# Parameters shared by the buylow/sellhigh and breakout/oscillate strategies, whether run live, replayed or backtested
+# Status:  Beta
+
+
+NO_EXTREME = -1
+NO_LIMIT = -1
+EXTREME_EXPIRATION_SECONDS = 60 * 30  # 30 minutes
+STOP_DELAY_SECONDS = 5  # wait after the fill before placing the stop
+
+
+def parse_target_change(change_or_percent_change: str, last: float) -> float:
+    """ Target amount of change:  the change itself, or if ending with '%', that percentage of the last price """
+    if change_or_percent_change.endswith('%'):
+        target_change_percent: float = float(change_or_percent_change[:-1])
+        return last * target_change_percent
+    return float(change_or_percent_change)
@@ -0,0 +1,270 @@
+import sys
+import threading
+from abc import (ABC, abstractmethod)
+from datetime import (datetime, timedelta)
+
+import requests
+
+from quote_sources import (QuoteSource)
+from schwab_api import (OrderResult)
+from strategies import (parse_target_change, EXTREME_EXPIRATION_SECONDS, NO_EXTREME, NO_LIMIT, STOP_DELAY_SECONDS)
+
+
+# Runs many buylow/sellhigh and breakout/oscillate instances at once, on a background thread.  Each instance is a state
+# machine advanced by the quotes of its symbol; every poll interval the engine fetches the quotes of all the instances'
+# symbols in one request and hands each instance its quote, so API calls don't grow with the number of instances.
+# The rules are the same as the live loops in commands.py; only events (orders, stops, errors) are printed.
+# Status:  Beta
+
+
+POLL_SECONDS = 1
+
+# Strategy states
+WATCHING = "watching"           # waiting for the target (or limit) to be hit
+STOP_PENDING = "stop pending"   # filled; placing the stop once STOP_DELAY_SECONDS have passed
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+class Strategy(ABC):
+    """ A strategy instance:  a state machine advanced by on_quote() with each quote of its symbol """
+    def __init__(self, symbol: str, numshares: int):
+        self.id: int = 0            # set by the engine
+        self.symbol: str = symbol.upper()
+        self.numshares: int = numshares
+        self.state: str = WATCHING
+        self.last: float | None = None
+        self.quotes: int = 0        # quotes seen
+        self.busy: bool = False     # in on_quote(), which runs outside the engine's lock as it may place orders
+        self.cancel_requested: bool = False  # cancelled while busy; takes effect when on_quote() returns
+
+    @property
+    def active(self) -> bool:
+        return self.state in (WATCHING, STOP_PENDING)
+
+    @abstractmethod
+    def on_quote(self, quote: dict, now: datetime, quote_source: QuoteSource):
+        ...
+
+    @abstractmethod
+    def describe(self) -> str:
+        ...
+
+    def _log(self, now: datetime, message: str):
+        print(f"[{self.id}] {now.hour:02}:{now.minute:02}:{now.second:02}: {self.symbol}: {message}")
+
+    def _place_order(self, now: datetime, quote_source: QuoteSource, instruction: str,
+                     limit: float | None = None) -> bool:
+        """ Place an order for the instance's symbol and shares; True if it was accepted """
+        result: OrderResult = quote_source.place_order(instruction, self.symbol, self.numshares, limit)
+        resp: requests.Response = result.response
+        limit_str: str = f" {limit}" if limit is not None else ""
+        self._log(now, f"{instruction} {self.symbol} {self.numshares}{limit_str}: "
+                       f"{resp.text if resp.text else 'OK' if resp.ok else 'Error placing order'}")
+        return resp.ok and not resp.text
+
+
+class BuyLowSellHigh(Strategy):
+    """ The buylow/sellhigh rules of commands._buylow_sellhigh() """
+    def __init__(self, islow: bool, symbol: str, numshares: int, change_or_percent_change: str,
+                 known_extreme: float = NO_EXTREME, limit: float = NO_LIMIT):
+        super().__init__(symbol, numshares)
+        self.islow: bool = islow
+        self.change_or_percent_change: str = change_or_percent_change
+        self.limit: float = limit
+        self.hold_extreme: float | None = known_extreme if known_extreme != NO_EXTREME else None
+        self.extreme: float = self.hold_extreme if self.hold_extreme else sys.float_info.max if islow else 0
+        self.time_extreme: datetime | None = None
+        self.target_change: float | None = None if change_or_percent_change.endswith('%') else float(change_or_percent_change)
+        self._stop_time: datetime | None = None
+
+    def on_quote(self, quote: dict, now: datetime, quote_source: QuoteSource):
+        if self.state == STOP_PENDING:
+            if now >= self._stop_time:
+                self._place_order(now, quote_source, 'ss' if self.islow else 'bs', self.limit)
+                self.state = DONE
+            return
+
+        last, ask, bid = quote['lastPrice'], quote['askPrice'], quote['bidPrice']
+        if self.quotes == 0 and self.hold_extreme:
+            self.time_extreme = now
+        self.last = last
+        self.quotes += 1
+        if not self.target_change:
+            self.target_change = parse_target_change(self.change_or_percent_change, last)
+
+        # Update extremes if current price exceeds
+        price: float = ask if self.islow else bid
+        if self.hold_extreme:
+            if price >= self.hold_extreme:  # current price validates hold_extreme (it isn't a one-off)
+                self.extreme = self.hold_extreme
+                self.time_extreme = now
+            else:
+                self.hold_extreme = self.extreme  # reset to previously validated extreme
+        if self.islow:
+            if not self.hold_extreme or ask < self.hold_extreme:
+                self.hold_extreme = ask
+        else:
+            if not self.hold_extreme or bid > self.hold_extreme:
+                self.hold_extreme = bid
+
+        # Exercise limit (checked on the first quote only, as the live loop does)
+        if self.limit > 0:
+            is_limit_hit: bool = last > self.limit if self.islow else last < self.limit
+            if is_limit_hit:
+                self._log(now, f"Limit {self.limit} hit")
+                self._place_order(now, quote_source, 'b' if self.islow else 's')
+            self.state = DONE
+            return
+
+        target: float = self.extreme + self.target_change if self.islow else self.extreme - self.target_change
+        if (ask > target) if self.islow else (bid < target):
+            self._log(now, f"Target {target:.2f} hit")
+            if self._place_order(now, quote_source, 'b' if self.islow else 's'):
+                stop: float = (bid - self.target_change if self.islow else bid + self.target_change) \
+                    if self.limit == 0 else self.limit
+                if stop > 0:  # is specified
+                    self.limit = round(stop, 2)
+                    self._stop_time = now + timedelta(seconds=STOP_DELAY_SECONDS)
+                    self.state = STOP_PENDING
+                    return
+            self.state = DONE
+            return
+
+        # Expire hold_extreme, as it has decayed and is no longer valid
+        if self.time_extreme and (now - self.time_extreme) > timedelta(seconds=EXTREME_EXPIRATION_SECONDS):
+            self.time_extreme = self.hold_extreme = None
+            self.extreme = sys.float_info.max if self.islow else 0
+
+    def describe(self) -> str:
+        extreme: str = f"{self.extreme:.2f}" if 0 < self.extreme < sys.float_info.max else "none"
+        return (f"{'buylow' if self.islow else 'sellhigh'} {self.symbol} {self.numshares} "
+                f"{self.change_or_percent_change}; extreme {extreme}; limit {self.limit}")
+
+
+class EnterPosition(Strategy):
+    """ The breakout/oscillate rules of commands.enter_position() """
+    def __init__(self, symbol: str, numshares: int, low_target: float, high_target: float, breakout: bool):
+        super().__init__(symbol, numshares)
+        self.low_target: float = low_target
+        self.high_target: float = high_target
+        self.breakout: bool = breakout
+
+    def on_quote(self, quote: dict, now: datetime, quote_source: QuoteSource):
+        last: float = quote['lastPrice']
+        self.last = last
+        self.quotes += 1
+        if last < self.low_target or last > self.high_target:
+            if self.breakout:
+                instruction: str = 'b' if last > self.high_target else 's'
+            else:  # oscillate
+                instruction = 's' if last > self.high_target else 'b'
+            self._log(now, f"{'Breakout' if self.breakout else 'Oscillate'} target met at {last:.2f}")
+            self._place_order(now, quote_source, instruction)
+            self.state = DONE
+
+    def describe(self) -> str:
+        return (f"{'breakout' if self.breakout else 'oscillate'} {self.symbol} {self.numshares} "
+                f"{self.low_target} {self.high_target}")
+
+
+class StrategyEngine:
+    def __init__(self, quote_source: QuoteSource, poll_seconds: float = POLL_SECONDS):
+        self.quote_source: QuoteSource = quote_source
+        self.poll_seconds: float = poll_seconds
+        self.quote_requests: int = 0
+        self.quote_errors: int = 0
+        self._strategies: dict[int, Strategy] = {}
+        self._next_id: int = 1
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, strategy: Strategy) -> Strategy:
+        with self._lock:
+            strategy.id = self._next_id
+            self._next_id += 1
+            self._strategies[strategy.id] = strategy
+        if not self._thread or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="strategy-engine", daemon=True)
+            self._thread.start()
+        return strategy
+
+    def cancel(self, strategy_id: int) -> Strategy | None:
+        """ Stop running an instance (an order already placed is not cancelled) """
+        with self._lock:
+            strategy: Strategy | None = self._strategies.get(strategy_id)
+            if strategy and strategy.active:
+                if strategy.busy:
+                    strategy.cancel_requested = True
+                else:
+                    strategy.state = CANCELLED
+            return strategy
+
+    def strategies(self) -> list[Strategy]:
+        with self._lock:
+            return list(self._strategies.values())
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def tick(self):
+        """ Fetch the quotes of every active instance's symbol in one request and advance each instance """
+        with self._lock:
+            active: list[Strategy] = [strategy for strategy in self._strategies.values() if strategy.active]
+        if not active:
+            return
+        symbols: list[str] = list(dict.fromkeys(strategy.symbol for strategy in active))
+        self.quote_requests += 1
+        quotes: dict | None = self.quote_source.get_all_quotes(symbols)
+        if quotes is None:
+            self.quote_errors += 1
+            return
+        now: datetime = self.quote_source.now()
+        for strategy in active:
+            quote: dict | None = quotes.get(strategy.symbol, {}).get('quote')
+            if not quote or not all(name in quote for name in ('lastPrice', 'askPrice', 'bidPrice')):
+                continue
+            with self._lock:
+                if not strategy.active:  # cancelled meanwhile
+                    continue
+                strategy.busy = True
+            # Not under the lock:  orders can take a while, and 'strat list/add/cancel' must not wait for them
+            try:
+                strategy.on_quote(quote, now, self.quote_source)
+            except Exception as e:
+                strategy.state = FAILED
+                print(f"[{strategy.id}] Error:  {strategy.symbol}: {e}")
+            with self._lock:
+                strategy.busy = False
+                if strategy.cancel_requested and strategy.active:
+                    strategy.state = CANCELLED
+
+    #####
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.tick()
+            self._stop_event.wait(self.poll_seconds)
+
+
+_engine: StrategyEngine | None = None  # Access with get_strategy_engine()
+
+
+def get_strategy_engine(quote_source: QuoteSource) -> StrategyEngine:
+    """ The engine, created on first use; quote_source replaces the engine's (e.g. after streaming is turned on) """
+    global _engine
+    if not _engine:
+        _engine = StrategyEngine(quote_source)
+    else:
+        _engine.quote_source = quote_source
+    return _engine
+
+
+def get_active_engine() -> StrategyEngine | None:
+    return _engine
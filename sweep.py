@@ -0,0 +1,164 @@
+import csv
+import math
+import os
+from concurrent.futures import (as_completed, ProcessPoolExecutor)
+from dataclasses import (dataclass)
+from datetime import (datetime, timezone)
+from itertools import (product)
+from zoneinfo import (ZoneInfo)
+
+import numpy as np
+
+from backtest import (backtest_buylow_sellhigh, backtest_runs, load_tick_file, BacktestResult, TickArrays)
+from strategies import (NO_LIMIT)
+
+
+# Parameter sweep for tuning buylow/sellhigh:  backtests every combination of change, extreme expiration and stop
+# offset against every symbol and day, spread across a pool of processes.
+# Each symbol/day's ticks are saved once as a .npy file that the workers memory-map, so they share the pages rather
+# than each receiving a pickled copy.  Results are written to a CSV file as they arrive.
+# Status:  Beta
+
+
+RESULTS_FILE = "sweep_results.csv"
+SHARDS_PER_WORKER = 8   # more, smaller shards keep every worker busy until the end
+SECONDS_PER_HOUR = 60 * 60
+SECONDS_PER_DAY = 24 * SECONDS_PER_HOUR
+MARKET_TZ = ZoneInfo("America/New_York")  # a session's extended hours run past midnight UTC
+NO_STOP = "none"
+DEFAULT_STOP = "default"  # stop at the target change, as the live strategy does
+
+
+@dataclass(frozen=True)
+class SweepParams:
+    change_or_percent_change: str
+    expiration_seconds: float
+    stop_offset: str            # NO_STOP, DEFAULT_STOP, or the stop's distance from the fill's bid
+
+    def backtest_kwargs(self) -> dict:
+        kwargs: dict = {"change_or_percent_change": self.change_or_percent_change,
+                        "expiration_seconds": self.expiration_seconds}
+        if self.stop_offset == NO_STOP:
+            kwargs["limit"] = NO_LIMIT
+        else:
+            kwargs["limit"] = 0
+            kwargs["stop_offset"] = None if self.stop_offset == DEFAULT_STOP else float(self.stop_offset)
+        return kwargs
+
+    def __str__(self):
+        return (f"change {self.change_or_percent_change}, expiration {self.expiration_seconds / 60:g} min, "
+                f"stop {self.stop_offset}")
+
+
+@dataclass
+class Dataset:
+    symbol: str
+    day: str                    # YYYY-MM-DD, the trading day in America/New_York
+    filename: str               # .npy of a (4, n) array:  times, bid, ask, last
+    length: int
+
+
+@dataclass
+class SweepShard:
+    dataset: Dataset
+    params: list[SweepParams]
+    islow: bool
+    numshares: int
+
+
+@dataclass
+class SweepResult:
+    symbol: str
+    day: str
+    params: SweepParams
+    runs: int
+    trades: int
+    pnl: float
+
+
+def make_grid(changes: list[str], expiration_minutes: list[float], stop_offsets: list[str]) -> list[SweepParams]:
+    return [SweepParams(change, minutes * 60, stop_offset)
+            for change, minutes, stop_offset in product(changes, expiration_minutes, stop_offsets)]
+
+
+def prepare_datasets(tick_filename: str, symbols: list[str], directory: str) -> list[Dataset]:
+    """ Split each symbol's ticks into days, saving each day to `directory` for the workers to memory-map """
+    datasets: list[Dataset] = []
+    for symbol in symbols:
+        ticks: TickArrays = load_tick_file(tick_filename, symbol)
+        days: np.ndarray = _market_days(ticks.times)
+        boundaries: np.ndarray = np.flatnonzero(np.diff(days)) + 1
+        for begin, end in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(ticks)]))):
+            if begin == end:
+                continue
+            day: str = datetime.fromtimestamp(days[begin] * SECONDS_PER_DAY, timezone.utc).strftime('%Y-%m-%d')
+            filename: str = os.path.join(directory, f"{symbol}_{day}.npy")
+            np.save(filename, np.vstack((ticks.times[begin:end], ticks.bid[begin:end], ticks.ask[begin:end],
+                                         ticks.last[begin:end])))
+            datasets.append(Dataset(symbol, day, filename, int(end - begin)))
+    return datasets
+
+
+def _market_days(times: np.ndarray) -> np.ndarray:
+    """ Day number (days since the epoch) of each epoch time, in MARKET_TZ """
+    # UTC offsets only change on the hour, so look them up once per distinct hour
+    hours, inverse = np.unique((times // SECONDS_PER_HOUR).astype(np.int64), return_inverse=True)
+    offsets: np.ndarray = np.array([datetime.fromtimestamp(start, MARKET_TZ).utcoffset().total_seconds()
+                                    for start in (hours * SECONDS_PER_HOUR).tolist()], dtype=np.float64)
+    return ((times + offsets[inverse]) // SECONDS_PER_DAY).astype(np.int64)
+
+
+def run_sweep(datasets: list[Dataset], grid: list[SweepParams], islow: bool, numshares: int,
+              results_filename: str = RESULTS_FILE, workers: int | None = None) -> dict[SweepParams, SweepResult]:
+    """
+    Backtest every parameter combination on every dataset, writing one CSV row per combination and dataset.
+    Returns the results totalled across datasets, keyed by parameters.
+    """
+    workers = workers if workers else os.cpu_count()
+    shards: list[SweepShard] = _make_shards(datasets, grid, islow, numshares, workers * SHARDS_PER_WORKER)
+    totals: dict[SweepParams, SweepResult] = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor, open(results_filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["symbol", "day", "change", "expiration_minutes", "stop_offset", "runs", "trades", "pnl"])
+        for future in as_completed([executor.submit(_run_shard, shard) for shard in shards]):
+            for result in future.result():
+                params: SweepParams = result.params
+                writer.writerow([result.symbol, result.day, params.change_or_percent_change,
+                                 f"{params.expiration_seconds / 60:g}", params.stop_offset, result.runs, result.trades,
+                                 f"{result.pnl:.2f}"])
+                total: SweepResult = totals.setdefault(params, SweepResult("*", "*", params, 0, 0, 0.0))
+                total.runs += result.runs
+                total.trades += result.trades
+                total.pnl += result.pnl
+    return totals
+
+
+def best_params(totals: dict[SweepParams, SweepResult], count: int = 10) -> list[SweepResult]:
+    return sorted(totals.values(), key=lambda total: total.pnl, reverse=True)[:count]
+
+
+#####
+
+
+def _make_shards(datasets: list[Dataset], grid: list[SweepParams], islow: bool, numshares: int,
+                 target_shards: int) -> list[SweepShard]:
+    """ Split each dataset's share of the grid so there are about target_shards shards, largest datasets first """
+    pieces_per_dataset: int = max(1, math.ceil(target_shards / max(1, len(datasets))))
+    params_per_shard: int = max(1, math.ceil(len(grid) / pieces_per_dataset))
+    return [SweepShard(dataset, grid[i:i + params_per_shard], islow, numshares)
+            for dataset in sorted(datasets, key=lambda dataset: dataset.length, reverse=True)
+            for i in range(0, len(grid), params_per_shard)]
+
+
+def _run_shard(shard: SweepShard) -> list[SweepResult]:
+    """ Runs in a worker process """
+    data: np.ndarray = np.load(shard.dataset.filename, mmap_mode='r')
+    ticks = TickArrays(data[0], data[1], data[2], data[3])
+    results: list[SweepResult] = []
+    for params in shard.params:
+        runs: list[BacktestResult] = backtest_runs(ticks, backtest_buylow_sellhigh, islow=shard.islow,
+                                                   numshares=shard.numshares, **params.backtest_kwargs())
+        trades: int = sum(1 for run in runs if run.trigger_index is not None)
+        results.append(SweepResult(shard.dataset.symbol, shard.dataset.day, params, len(runs), trades,
+                                   sum(run.pnl for run in runs)))
+    return results
@@ -0,0 +1,15 @@
+import threading
+
+import pytest
+
+from rate_limiter import (RequestScheduler, PRIORITY_ACCOUNT, PRIORITY_ORDER, PRIORITY_QUOTE)
+
+
+@pytest.mark.parametrize("burst", [1, 2])
+@pytest.mark.parametrize("priority", [PRIORITY_ORDER, PRIORITY_ACCOUNT, PRIORITY_QUOTE])
+def test_small_burst_does_not_block_forever(burst, priority):
+    scheduler = RequestScheduler(requests_per_minute=6000, burst=burst)
+    thread = threading.Thread(target=lambda: [scheduler.acquire(priority) for _ in range(3)], daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
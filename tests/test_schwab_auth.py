@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+import schwab_auth
+from schwab_auth import (SchwabAuth, SchwabAccessTokenException)
+
+
+def _auth(expires_in: float) -> SchwabAuth:
+    auth = SchwabAuth("key", "secret")
+    auth._auth = {"token_type": "Bearer", "access_token": "old", "expires_in": 1800}
+    auth._token = ("Bearer old", time.monotonic() + expires_in)
+    return auth
+
+
+def _reject():
+    raise SchwabAccessTokenException("refresh token expired")
+
+
+def _join_refresh_thread(auth: SchwabAuth):
+    thread = auth._refresh_thread
+    if thread:
+        thread.join(timeout=5)
+
+
+def test_rejected_background_refresh_is_not_retried_by_every_request(monkeypatch):
+    auth = _auth(200)  # already within REFRESH_AHEAD_SECONDS, so the background thread refreshes at once
+    attempts: list[float] = []
+
+    def reject():
+        attempts.append(time.monotonic())
+        _reject()
+
+    monkeypatch.setattr(auth, "_request_access_token", reject)
+    assert auth.headers() == {"Authorization": "Bearer old"}
+    _join_refresh_thread(auth)
+    for _ in range(20):
+        assert auth.headers() == {"Authorization": "Bearer old"}  # the token is still valid
+        _join_refresh_thread(auth)
+    assert len(attempts) == 1
+    assert auth._refresh_thread is None
+
+
+def test_rejected_refresh_resumes_after_a_request_refreshes(monkeypatch):
+    auth = _auth(200)
+    monkeypatch.setattr(auth, "_request_access_token", _reject)
+    auth.headers()
+    _join_refresh_thread(auth)
+    assert auth._refresh_rejected
+
+    # Expired:  the request refreshes the token itself, and reports the error if it can't
+    auth._token = ("Bearer old", time.monotonic() - 1)
+    with pytest.raises(SchwabAccessTokenException):
+        auth.headers()
+    assert auth._refresh_thread is None
+
+    def accept():
+        auth.auth.update({"access_token": "new", "expires_in": 1800})
+    monkeypatch.setattr(auth, "_request_access_token", accept)
+    monkeypatch.setattr(schwab_auth, "REFRESH_AHEAD_SECONDS", 0)  # keep the restarted thread asleep
+    assert auth.headers() == {"Authorization": "Bearer new"}
+    assert not auth._refresh_rejected
+    assert auth._refresh_thread is not None
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+import schwab_streamer
+from mock_schwab_server import (MockConfig, MockSchwabServer, MockStreamerServer)
+from schwab_streamer import (SchwabStreamer)
+
+
+class _StaticAuth:
+    def headers(self) -> dict:
+        return {"Authorization": "Bearer mock-access-token"}
+
+
+def _wait_until(condition, timeout: float = 5.0):
+    deadline: float = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def server():
+    server = MockStreamerServer(tick_interval=None).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def streamer(server, monkeypatch):
+    monkeypatch.setattr(schwab_streamer, "MIN_RECONNECT_DELAY", 0.05)
+    streamer = SchwabStreamer(_StaticAuth(), {}, server.url)
+    streamer.start()
+    _wait_until(lambda: streamer.connected)
+    yield streamer
+    streamer.stop()
+
+
+def test_login_and_subscribe(server, streamer):
+    assert server.requests["LOGIN"] == 1
+    streamer.subscribe(["aapl"])
+    _wait_until(lambda: server.subscriptions() == {"AAPL"})
+    streamer.subscribe(["AAPL", "MSFT"])  # only MSFT is added
+    _wait_until(lambda: server.subscriptions() == {"AAPL", "MSFT"})
+    streamer.unsubscribe(["AAPL"])
+    _wait_until(lambda: server.subscriptions() == {"MSFT"})
+    assert (server.requests["ADD"], server.requests["UNSUBS"]) == (2, 1)
+    _wait_until(lambda: streamer.tick_count("MSFT") == 1)  # the full quote sent on subscribing
+    quote: dict = streamer.get_quotes(["MSFT"])["MSFT"]["quote"]
+    assert all(name in quote for name in ("bidPrice", "askPrice", "lastPrice", "totalVolume", "quoteTime"))
+
+
+def test_ticks_are_merged(server, streamer):
+    streamer.subscribe(["AAPL"])
+    _wait_until(lambda: streamer.tick_count("AAPL") == 1)
+    server.push_tick("AAPL", {"1": 100.0, "2": 100.2, "3": 100.1})
+    assert streamer.wait_for_tick("AAPL", 5, 1)
+    server.push_tick("AAPL", {"3": 100.15})  # only the last price changed
+    assert streamer.wait_for_tick("AAPL", 5, 2)
+    quote: dict = streamer.get_quotes(["AAPL"])["AAPL"]["quote"]
+    assert (quote["bidPrice"], quote["askPrice"], quote["lastPrice"]) == (100.0, 100.2, 100.15)
+
+
+def test_reconnects_and_resubscribes(server, streamer):
+    streamer.subscribe(["AAPL", "MSFT"])
+    _wait_until(lambda: server.subscriptions() == {"AAPL", "MSFT"})
+    server.drop_connections()
+    _wait_until(lambda: server.requests["LOGIN"] == 2 and streamer.connected)
+    _wait_until(lambda: server.subscriptions() == {"AAPL", "MSFT"})
+    assert server.requests["SUBS"] == 1  # all symbols again, in one request
+    assert streamer.reconnects == 1
+    server.push_tick("AAPL", {"3": 99.0})
+    _wait_until(lambda: streamer.get_quotes(["AAPL"])["AAPL"]["quote"]["lastPrice"] == 99.0)
+
+
+def test_mock_schwab_server_advertises_its_streamer():
+    server = MockSchwabServer(MockConfig(latency_ms=0, jitter_ms=0)).start()
+    try:
+        status, preferences, _ = server.handle("GET", "/trader/v1/userPreference", {}, "")
+        assert status == 200
+        streamer = SchwabStreamer(_StaticAuth(), preferences["streamerInfo"][0])
+        assert streamer.url == server.streamer.url
+        streamer.start()
+        try:
+            streamer.subscribe(["AAPL"])
+            _wait_until(lambda: streamer.tick_count("AAPL") > 0)
+        finally:
+            streamer.stop()
+    finally:
+        server.stop()
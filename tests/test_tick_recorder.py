@@ -0,0 +1,20 @@
+import os
+import time
+from datetime import (datetime)
+
+from tick_recorder import (TickLog, TickRecorder, TICK_FILE_EXTENSION)
+
+
+def test_stale_quote_time_goes_to_todays_file(tmp_path):
+    recorder = TickRecorder(str(tmp_path))
+    yesterday: float = time.time() - 24 * 60 * 60  # e.g. a pre-market poll:  the previous session's last trade
+    recorder.record("AAPL", {"bidPrice": 1.0, "askPrice": 1.2, "lastPrice": 1.1, "quoteTime": yesterday * 1000})
+    recorder.record("AAPL", {"bidPrice": 1.0, "askPrice": 1.2, "lastPrice": 1.15})
+    recorder.close()
+
+    today: str = datetime.now().strftime('%Y-%m-%d')
+    assert sorted(os.listdir(tmp_path)) == [f"{today}.symbols", f"{today}{TICK_FILE_EXTENSION}"]
+    ticks = TickLog(os.path.join(tmp_path, today + TICK_FILE_EXTENSION)).symbol_ticks("AAPL")
+    assert len(ticks) == 2
+    assert ticks["time"][0] == yesterday  # the quote's own time is kept
+    assert datetime.fromtimestamp(ticks["time"][1]).date() == datetime.now().date()
@@ -0,0 +1,150 @@
+import json
+import os
+import struct
+import threading
+import time
+from datetime import (datetime, timedelta)
+from typing import (TYPE_CHECKING)
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# Append-only recorder of every quote the program sees, polled or streamed, for replaying and backtesting later.
+# Each day's ticks go to <directory>/<YYYY-MM-DD>.ticks as fixed-width little-endian records (see TICK_FIELDS), with
+# the symbols they refer to by id listed in <YYYY-MM-DD>.symbols.  The day is that of the wall clock when the quote is
+# recorded:  a quote's own time may be from an earlier session, e.g. pre-market or for a halted symbol.  TickLog memory-maps a day's file and returns the
+# ticks of a symbol as NumPy arrays.  NumPy is imported only by TickLog, so recording doesn't slow down startup.
+# Status:  Beta
+
+
+TICKS_DIRECTORY = "ticks"
+TICK_FILE_EXTENSION = ".ticks"
+SYMBOLS_FILE_EXTENSION = ".symbols"
+FLUSH_INTERVAL = 1.0    # seconds between flushes of buffered records to the file
+
+TICK_FIELDS = [("time", "<f8"), ("symbol_id", "<u4"), ("bid", "<f8"), ("ask", "<f8"), ("last", "<f8"),
+               ("volume", "<f8")]  # NumPy dtype of a record
+_TICK_STRUCT = struct.Struct("<dIdddd")  # same layout as TICK_FIELDS
+
+
+class TickRecorder:
+    def __init__(self, directory: str = TICKS_DIRECTORY):
+        self.directory: str = directory
+        self.records: int = 0
+        self._file = None
+        self._day_end: float = 0.0              # time at which the current file is rotated
+        self._symbol_ids: dict[str, int] = {}   # symbol -> id, for the current file
+        self._symbols_filename: str | None = None
+        self._last_flush: float = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, symbol: str, quote: dict):
+        """ Record a quote, shaped like the "quote" of a get_quotes() result """
+        bid, ask, last = quote.get("bidPrice"), quote.get("askPrice"), quote.get("lastPrice")
+        if bid is None or ask is None or last is None:
+            return
+        now: float = time.time()
+        tick_time: float = quote["quoteTime"] / 1000 if quote.get("quoteTime") else now
+        with self._lock:
+            if now >= self._day_end or not self._file:
+                self._open(now)
+            symbol_id: int | None = self._symbol_ids.get(symbol)
+            if symbol_id is None:
+                symbol_id = self._add_symbol(symbol)
+            self._file.write(_TICK_STRUCT.pack(tick_time, symbol_id, bid, ask, last, quote.get("totalVolume", 0)))
+            self.records += 1
+            flush_time: float = time.monotonic()
+            if flush_time - self._last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._last_flush = flush_time
+
+    def record_quotes(self, quotes: dict):
+        """ Record every quote of a get_quotes() result """
+        for symbol, quote in quotes.items():
+            if "quote" in quote:
+                self.record(symbol, quote["quote"])
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    #####
+
+    def _open(self, now: float):
+        """ Open (or re-open, after a restart) the file of the day of `now` """
+        if self._file:
+            self._file.close()
+        day: datetime = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        self._day_end = (day + timedelta(days=1)).timestamp()
+        base: str = os.path.join(self.directory, day.strftime('%Y-%m-%d'))
+        self._symbols_filename = base + SYMBOLS_FILE_EXTENSION
+        self._symbol_ids = {symbol: i for i, symbol in enumerate(_load_symbols(self._symbols_filename))}
+        self._file = open(base + TICK_FILE_EXTENSION, 'ab')
+        # Drop a partly written record, e.g. from a crash, so later records stay aligned
+        size: int = self._file.tell()
+        if size % _TICK_STRUCT.size:
+            self._file.truncate(size - size % _TICK_STRUCT.size)
+
+    def _add_symbol(self, symbol: str) -> int:
+        symbol_id: int = len(self._symbol_ids)
+        self._symbol_ids[symbol] = symbol_id
+        with open(self._symbols_filename, 'w') as f:
+            json.dump(list(self._symbol_ids), f)
+        return symbol_id
+
+
+class TickLog:
+    """ Read-only, memory-mapped view of a day of recorded ticks """
+    def __init__(self, filename: str):
+        import numpy as np
+        self.filename: str = filename
+        self.symbols: list[str] = _load_symbols(filename[:-len(TICK_FILE_EXTENSION)] + SYMBOLS_FILE_EXTENSION)
+        self.dtype: np.dtype = np.dtype(TICK_FIELDS)
+        records: int = os.path.getsize(filename) // self.dtype.itemsize
+        self.ticks: np.ndarray = (np.memmap(filename, dtype=self.dtype, mode='r', shape=(records,)) if records
+                                  else np.empty(0, dtype=self.dtype))
+
+    def __len__(self) -> int:
+        return len(self.ticks)
+
+    def symbol_ticks(self, symbol: str) -> "np.ndarray":
+        """ The ticks (TICK_FIELDS records) of symbol, in time order """
+        import numpy as np
+        if symbol not in self.symbols:
+            return np.empty(0, dtype=self.dtype)
+        ticks: np.ndarray = self.ticks[self.ticks["symbol_id"] == self.symbols.index(symbol)]
+        return ticks[np.argsort(ticks["time"], kind="stable")]  # polled and streamed quotes may interleave
+
+
+_recorder: TickRecorder | None = None  # Access with get_tick_recorder()
+
+
+def get_tick_recorder() -> TickRecorder | None:
+    """ The recorder, if recording is turned on """
+    return _recorder
+
+
+def start_recording(directory: str = TICKS_DIRECTORY) -> TickRecorder:
+    global _recorder
+    if not _recorder:
+        _recorder = TickRecorder(directory)
+    return _recorder
+
+
+def stop_recording():
+    global _recorder
+    if _recorder:
+        _recorder.close()
+        _recorder = None
+
+
+def _load_symbols(filename: str) -> list[str]:
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
@@ -0,0 +1,253 @@
+import contextvars
+import json
+import random
+import sys
+import threading
+import time
+from collections import (defaultdict)
+from concurrent.futures import (Future, ThreadPoolExecutor)
+from dataclasses import (dataclass, field)
+
+
+# Lightweight tracing of where a command's time goes.  Each command is a span (opened in commands.exec_command), with
+# nested child spans for its auth, HTTP, JSON parse and output formatting steps.  While tracing is on, each finished
+# trace is appended to a JSON-lines file:  one span per line, or (otlp=True) one OTLP/JSON ExportTraceServiceRequest per
+# line, which OpenTelemetry collectors and viewers accept.  While it is off, span() costs one global lookup.
+#   python tracing.py traces.jsonl > traces.folded   -- collapsed stacks for flamegraph.pl or speedscope
+# Status:  Beta
+
+
+TRACES_FILENAME = "traces.jsonl"
+SERVICE_NAME = "schwab_cli"
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_ERROR = 2
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str                   # 32 hex digits
+    span_id: str                    # 16 hex digits
+    parent_id: str | None
+    start_ns: int                   # time.time_ns()
+    end_ns: int = 0
+    attributes: dict = field(default_factory=dict)
+    error: str | None = None
+    kind: int = SPAN_KIND_INTERNAL
+    _start_perf_ns: int = field(default=0, repr=False)  # durations are measured with perf_counter_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def rename(self, name: str):
+        self.name = name
+
+    def to_json(self) -> dict:
+        span: dict = {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                      "name": self.name, "start_ns": self.start_ns, "duration_ms": round(self.duration_ms, 3),
+                      "attributes": self.attributes}
+        if self.error:
+            span["error"] = self.error
+        return span
+
+    def to_otlp(self) -> dict:
+        span: dict = {"traceId": self.trace_id, "spanId": self.span_id, "name": self.name, "kind": self.kind,
+                      "startTimeUnixNano": str(self.start_ns), "endTimeUnixNano": str(self.end_ns),
+                      "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+                      "status": {"code": STATUS_CODE_ERROR, "message": self.error} if self.error else {}}
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoSpan:
+    """ What span() returns while tracing is off """
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def rename(self, name: str):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _ActiveSpan:
+    def __init__(self, tracer: "Tracer", name: str, kind: int, attributes: dict):
+        self.tracer: Tracer = tracer
+        self.name: str = name
+        self.kind: int = kind
+        self.attributes: dict = attributes
+        self.span: Span | None = None
+        self._token: contextvars.Token | None = None
+
+    def __enter__(self) -> Span:
+        parent: Span | None = _current_span.get()
+        self.span = Span(self.name, parent.trace_id if parent else f"{random.getrandbits(128):032x}",
+                         f"{random.getrandbits(64):016x}", parent.span_id if parent else None, time.time_ns(),
+                         attributes=self.attributes, kind=self.kind, _start_perf_ns=time.perf_counter_ns())
+        self._token = _current_span.set(self.span)
+        self.tracer._started(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        span: Span = self.span
+        span.end_ns = span.start_ns + time.perf_counter_ns() - span._start_perf_ns
+        if exc_type and issubclass(exc_type, Exception):
+            span.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.tracer._finished(span)
+        return False
+
+
+class Tracer:
+    """ Collects the spans of each trace until its root span finishes, then appends the trace to the file """
+    def __init__(self, filename: str = TRACES_FILENAME, otlp: bool = False):
+        self.filename: str = filename
+        self.otlp: bool = otlp
+        self.traces: int = 0
+        self._open_traces: dict[str, list[Span]] = {}   # trace id -> finished spans, while its root is open
+        self._lock = threading.Lock()
+        self._file = open(filename, 'a')
+
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> _ActiveSpan:
+        return _ActiveSpan(self, name, kind, attributes)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _started(self, span: Span):
+        if not span.parent_id:
+            with self._lock:
+                self._open_traces[span.trace_id] = []
+
+    def _finished(self, span: Span):
+        with self._lock:
+            spans: list[Span] | None = self._open_traces.get(span.trace_id)
+            if spans is None:  # e.g. a background fetch that outlived its command
+                self._write([span])
+                return
+            spans.append(span)
+            if not span.parent_id:
+                del self._open_traces[span.trace_id]
+                self._write(spans)
+
+    def _write(self, spans: list[Span]):
+        if self._file.closed:
+            return
+        self.traces += 1
+        if self.otlp:
+            request: dict = {"resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [span.to_otlp() for span in spans]}]}]}
+            self._file.write(json.dumps(request) + "\n")
+        else:
+            self._file.writelines(json.dumps(span.to_json()) + "\n" for span in spans)
+        self._file.flush()
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ Runs each task with the submitter's context, so spans opened by the task are children of the submitter's span """
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> _ActiveSpan | _NoSpan:
+    """ with span("name", attribute=value) as s:  ...  -- a child of the current span, if any """
+    return _tracer.span(name, kind, **attributes) if _tracer else _NO_SPAN
+
+
+def parse_json(text: str):
+    """ json.loads(), traced """
+    if not _tracer:
+        return json.loads(text)
+    with _tracer.span("parse json", bytes=len(text)):
+        return json.loads(text)
+
+
+def start_tracing(filename: str = TRACES_FILENAME, otlp: bool = False) -> Tracer:
+    global _tracer
+    stop_tracing()
+    _tracer = Tracer(filename, otlp)
+    return _tracer
+
+
+def stop_tracing():
+    global _tracer
+    if _tracer:
+        tracer: Tracer = _tracer
+        _tracer = None
+        tracer.close()
+
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+
+def collapse_stacks(filename: str) -> dict[str, int]:
+    """ Self time in microseconds of each stack of span names ("command pos;http GET ...") in a traces file """
+    spans: dict[str, dict] = {}
+    for line in open(filename, 'r'):
+        if not line.strip():
+            continue
+        record: dict = json.loads(line)
+        if "resourceSpans" in record:
+            for resource_spans in record["resourceSpans"]:
+                for scope_spans in resource_spans["scopeSpans"]:
+                    for otlp_span in scope_spans["spans"]:
+                        spans[otlp_span["spanId"]] = {
+                            "name": otlp_span["name"], "parent_id": otlp_span.get("parentSpanId"),
+                            "duration_us": (int(otlp_span["endTimeUnixNano"]) - int(otlp_span["startTimeUnixNano"])) // 1000}
+        else:
+            spans[record["span_id"]] = {"name": record["name"], "parent_id": record["parent_id"],
+                                        "duration_us": int(record["duration_ms"] * 1000)}
+    children_us: dict[str, int] = defaultdict(int)
+    for s in spans.values():
+        if s["parent_id"]:
+            children_us[s["parent_id"]] += s["duration_us"]
+    stacks: dict[str, int] = defaultdict(int)
+    for span_id, s in spans.items():
+        names: list[str] = []
+        ancestor: dict | None = s
+        while ancestor:
+            names.append(ancestor["name"].replace(";", ","))
+            ancestor = spans.get(ancestor["parent_id"]) if ancestor["parent_id"] else None
+        # Children running concurrently can add up to more than their parent
+        stacks[";".join(reversed(names))] += max(0, s["duration_us"] - children_us[span_id])
+    return stacks
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+_tracer: Tracer | None = None  # Access with get_tracer()
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar("current_span", default=None)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage:  python tracing.py <traces file>   (prints collapsed stacks, for flamegraph.pl or speedscope)")
+        sys.exit(1)
+    for stack, microseconds in sorted(collapse_stacks(sys.argv[1]).items()):
+        print(f"{stack} {microseconds}")